@@ -0,0 +1,60 @@
+"""
+bench_extraction.py
+
+Measures listing_extractor throughput in pages/sec over the saved page corpus
+in benchmarks/fixtures/pages. No browser or network is involved, so this is
+the parsing cost alone.
+
+    python benchmarks/bench_extraction.py --rounds 2000
+"""
+
+import os
+import sys
+import time
+import glob
+import argparse
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from scraper_modules.listing_extractor import extract_availability, extract_listing_page, extract_search_cards
+
+PAGES_DIR = os.path.join(os.path.dirname(__file__), "fixtures", "pages")
+
+def load_corpus(kind):
+    pages = []
+    for path in sorted(glob.glob(os.path.join(PAGES_DIR, kind, "*.html"))):
+        with open(path, "rb") as f:
+            pages.append((os.path.basename(path), f.read()))
+    return pages
+
+def bench(label, pages, fn, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for name, body in pages:
+            fn(name, body)
+    elapsed = time.perf_counter() - start
+    total = rounds * len(pages)
+    print(f"{label:<16} {total:>8} pages  {elapsed:8.3f}s  {total / elapsed:12,.0f} pages/sec")
+    return total / elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=1000, help="Passes over the corpus (default 1000).")
+    args = parser.parse_args()
+
+    search_pages = load_corpus("search")
+    listing_pages = load_corpus("listings")
+
+    for name, body in listing_pages:
+        print(f"{name}: {extract_listing_page(body, '/rooms/' + name.split('.')[0])[0]}, "
+              f"{len(extract_availability(body))} calendar days")
+    for name, body in search_pages:
+        cards = extract_search_cards(body)
+        print(f"{name}: {len(cards)} cards, {sum(card.get('price') is not None for card in cards.values())} priced")
+
+    # The same calls the scrapers make per page: cards from a search page, fields and calendar from a listing.
+    bench("search pages", search_pages, lambda name, body: extract_search_cards(body), args.rounds)
+    bench("listing pages", listing_pages,
+          lambda name, body: (extract_listing_page(body, "/rooms/" + name.split(".")[0]),
+                              extract_availability(body)), args.rounds)
+
+if __name__ == "__main__":
+    main()
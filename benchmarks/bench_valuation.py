@@ -0,0 +1,111 @@
+"""
+bench_valuation.py
+
+Load generator for the valuation service. Client threads fire single valuation
+requests as fast as they can, drawing feature tuples from a fixed pool so some
+repeat (as real traffic does), and the run reports p50/p99 latency and
+throughput for:
+- direct:  every request calls model.predict on its own row,
+- service: requests go through ValuationService (micro-batching + LRU cache),
+- service, no cache: micro-batching alone.
+
+Uses the latest model from regression_model_modules/models, or trains a small
+one on synthetic data into a temp dir if none is registered.
+
+    python benchmarks/bench_valuation.py --clients 32 --requests 500
+"""
+
+import os
+import sys
+import time
+import tempfile
+import argparse
+import threading
+import numpy as np
+import pandas as pd
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from regression_model_modules.train import FEATURES, TARGET, load_model, train
+from regression_model_modules.valuation import ValuationService
+
+def synthetic_training_data(rows=2000, seed=0):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        "Nightly Price": rng.uniform(50, 600, rows),
+        "Bedrooms": rng.integers(0, 6, rows),
+        "Bathrooms": rng.integers(1, 4, rows),
+        "Occupancy Rate": rng.uniform(0.2, 0.95, rows),
+    })
+    df[TARGET] = (df["Nightly Price"] * 365 * df["Occupancy Rate"] * 8 + df["Bedrooms"] * 45_000
+                  + rng.normal(0, 25_000, rows))
+    return df
+
+def request_pool(size, seed=1):
+    rng = np.random.default_rng(seed)
+    return list(zip(np.round(rng.uniform(50, 600, size), 2), rng.integers(0, 6, size),
+                    rng.integers(1, 4, size), np.round(rng.uniform(0.2, 0.95, size), 2)))
+
+def run_load(label, call, pool, clients, requests_per_client, seed=2):
+    """Runs `clients` threads, each making requests_per_client calls; prints and returns the summary."""
+    latencies = [[] for _ in range(clients)]
+
+    def client(i):
+        rng = np.random.default_rng(seed + i)
+        # Zipf-like draws: a few tuples are requested far more often than the rest.
+        picks = np.minimum(rng.zipf(1.3, requests_per_client) - 1, len(pool) - 1)
+        out = latencies[i]
+        for pick in picks:
+            started = time.perf_counter()
+            call(*pool[pick])
+            out.append(time.perf_counter() - started)
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+    all_latencies = np.concatenate([np.asarray(l) for l in latencies]) * 1000
+    summary = {
+        "label": label,
+        "requests": int(all_latencies.size),
+        "p50_ms": float(np.percentile(all_latencies, 50)),
+        "p99_ms": float(np.percentile(all_latencies, 99)),
+        "throughput_rps": all_latencies.size / elapsed,
+    }
+    print(f"{label:<20} {summary['requests']:>8} req  p50 {summary['p50_ms']:8.2f} ms  "
+          f"p99 {summary['p99_ms']:8.2f} ms  {summary['throughput_rps']:10,.0f} req/s")
+    return summary
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=300, help="Requests per client (default 300).")
+    parser.add_argument("--distinct", type=int, default=5000, help="Distinct feature tuples (default 5000).")
+    parser.add_argument("--max-batch", type=int, default=256)
+    parser.add_argument("--max-wait-ms", type=float, default=2.0)
+    args = parser.parse_args()
+
+    model, entry = load_model()
+    if model is None:
+        models_dir = tempfile.mkdtemp(prefix="bench-models-")
+        print(f"No registered model; training a synthetic one into {models_dir}")
+        train(synthetic_training_data(), iterations=4, cv=3, models_dir=models_dir)
+        model, entry = load_model(models_dir=models_dir)
+    pool = request_pool(args.distinct)
+
+    def direct(price, bedrooms, bathrooms, occupancy):
+        return model.predict(pd.DataFrame([(price, bedrooms, bathrooms, occupancy)], columns=FEATURES))[0]
+
+    results = [run_load("direct", direct, pool, args.clients, args.requests)]
+    for label, cache_size in (("service", 50_000), ("service, no cache", 0)):
+        with ValuationService(model, max_batch=args.max_batch, max_wait_ms=args.max_wait_ms,
+                              cache_size=cache_size) as service:
+            results.append(run_load(label, service.value, pool, args.clients, args.requests))
+            stats = service.stats
+            print(f"{'':<20} {stats['batches']} predict calls, {stats['batched_rows'] / max(stats['batches'], 1):.1f} "
+                  f"rows/call, cache hits {service.cache.hits}")
+    return results
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+standin_server.py
+
+A local HTTP stand-in for airbnb.com that serves saved pages, so the scraper
+backends can be run and measured without touching the live site.
+
+    python benchmarks/standin_server.py --port 8765
+    AIRBNB_BASE_URL=http://127.0.0.1:8765 python scraper_modules/listing_scraper.py --backend http
+
+Routes (query strings are ignored):
+  /s/<zip>/homes  -> fixtures/pages/search/<zip>.html, else search/default.html
+  /rooms/<id>     -> fixtures/pages/listings/<id>.html, else listings/default.html
+"""
+
+import os
+import re
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse
+
+PAGES_DIR = os.path.join(os.path.dirname(__file__), "fixtures", "pages")
+
+ROUTES = [
+    (re.compile(r"^/s/([^/]+)/homes/?$"), "search"),
+    (re.compile(r"^/rooms/(\d+)/?$"), "listings"),
+]
+
+def resolve_page(path, pages_dir=PAGES_DIR):
+    """Maps a request path to a saved page on disk, or None if nothing matches."""
+    for pattern, folder in ROUTES:
+        m = pattern.match(path)
+        if not m:
+            continue
+        for name in (f"{m.group(1)}.html", "default.html"):
+            candidate = os.path.join(pages_dir, folder, name)
+            if os.path.exists(candidate):
+                return candidate
+    return None
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    pages_dir = PAGES_DIR
+    _cache = {}
+
+    def do_GET(self):
+        page = resolve_page(urlparse(self.path).path, self.pages_dir)
+        if page is None:
+            self.send_error(404)
+            return
+        body = self._cache.get(page)
+        if body is None:
+            with open(page, "rb") as f:
+                body = self._cache[page] = f.read()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_standin_server(host="127.0.0.1", port=0, pages_dir=PAGES_DIR):
+    """Starts the stand-in on a background thread. Returns (server, base_url); call server.shutdown() to stop."""
+    handler = type("BoundStandInHandler", (StandInHandler,), {"pages_dir": pages_dir, "_cache": {}})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve saved Airbnb pages locally.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--pages-dir", default=PAGES_DIR)
+    args = parser.parse_args()
+    handler = type("BoundStandInHandler", (StandInHandler,), {"pages_dir": args.pages_dir, "_cache": {}})
+    print(f"🧪 Serving {args.pages_dir} on http://{args.host}:{args.port}")
+    ThreadingHTTPServer((args.host, args.port), handler).serve_forever()
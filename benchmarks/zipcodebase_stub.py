@@ -0,0 +1,151 @@
+"""
+zipcodebase_stub.py
+
+A local HTTP stand-in for the ZipcodeBase API, so the zipcodebase client can be
+run and measured without spending API credits.
+
+    python benchmarks/zipcodebase_stub.py --port 8766
+    ZIPCODEBASE_BASE_URL=http://127.0.0.1:8766/api/v1 python scraper_modules/zipcodebase_extended.py
+
+Every postal code gets a synthetic but stable centroid: codes listed in
+scraper_modules/cities_and_zipcodes.json are scattered around a centre for
+their city, any other code lands somewhere in the continental US. Responses
+follow the real API's shapes, and the stub counts the requests it served.
+"""
+
+import os
+import json
+import math
+import zlib
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+CITY_ZIP_FILE = os.path.join(os.path.dirname(__file__), "..", "scraper_modules", "cities_and_zipcodes.json")
+EARTH_RADIUS_KM = 6371.0088
+
+
+def _unit(seed):
+    """Stable pseudo-random float in [0, 1) for a string."""
+    return zlib.crc32(seed.encode()) / 2 ** 32
+
+def load_city_zipcodes(path=CITY_ZIP_FILE):
+    with open(path) as f:
+        return json.load(f)
+
+def build_centroids(city_zipcodes):
+    """Returns {code: (lat, lon, city, state_code)} for every code in the city file."""
+    centroids = {}
+    for city, codes in city_zipcodes.items():
+        name, _, state_code = city.partition(", ")
+        center_lat = 26.0 + 22.0 * _unit(city)
+        center_lon = -122.0 + 50.0 * _unit(city[::-1])
+        for code in codes:
+            centroids[code] = (center_lat + 0.4 * (_unit(code) - 0.5),
+                               center_lon + 0.5 * (_unit(code[::-1]) - 0.5), name, state_code)
+    return centroids
+
+def haversine_km(a, b):
+    lat1, lon1, lat2, lon2 = map(math.radians, (a[0], a[1], b[0], b[1]))
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(h))
+
+
+class ZipcodebaseStubHandler(BaseHTTPRequestHandler):
+    centroids = {}
+    stats = {}
+
+    def centroid(self, code):
+        if code in self.centroids:
+            return self.centroids[code]
+        return (25.0 + 24.0 * _unit(code), -124.0 + 57.0 * _unit(code[::-1]), f"Town {code}", "ZZ")
+
+    def place(self, code, country):
+        lat, lon, city, state_code = self.centroid(code)
+        return {"postal_code": code, "country_code": country, "latitude": f"{lat:.8f}",
+                "longitude": f"{lon:.8f}", "city": city, "state": state_code, "state_code": state_code,
+                "province": None, "province_code": None}
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        q = {k: v[0] for k, v in parse_qs(url.query).items()}
+        endpoint = url.path.rstrip("/").split("/api/v1/", 1)[-1]
+        country = q.get("country", "US")
+        with self._lock:
+            self.stats[endpoint] = self.stats.get(endpoint, 0) + 1
+        if endpoint == "search":
+            codes = [c for c in q.get("codes", "").split(",") if c]
+            results = {code: [self.place(code, country)] for code in codes}
+            body = {"query": {"codes": codes, "country": country}, "results": results}
+        elif endpoint == "distance":
+            compare = [c for c in q.get("compare", "").split(",") if c]
+            base = self.centroid(q.get("code", ""))
+            results = {code: round(haversine_km(base, self.centroid(code)), 3) for code in compare}
+            body = {"query": {"code": q.get("code"), "compare": compare, "country": country, "unit": "km"},
+                    "results": results}
+        elif endpoint == "radius":
+            base = self.centroid(q.get("code", ""))
+            radius = float(q.get("radius", 0))
+            results = []
+            for code, centroid in self.centroids.items():
+                distance = haversine_km(base, centroid)
+                if distance <= radius:
+                    results.append({"code": code, "city": centroid[2], "state": centroid[3],
+                                    "distance": round(distance, 3)})
+            results.sort(key=lambda r: r["distance"])
+            body = {"query": {"code": q.get("code"), "radius": q.get("radius"), "country": country},
+                    "results": results}
+        elif endpoint == "code/city":
+            city = q.get("city", "").lower()
+            state = q.get("state_name", "").upper()
+            results = [code for code, c in self.centroids.items()
+                       if c[2].lower() == city and (not state or c[3] == state)]
+            body = {"query": {"city": q.get("city"), "country": country}, "results": results[:int(q.get("limit", 10 ** 6))]}
+        elif endpoint == "code/state":
+            state = q.get("state_name", "").upper()
+            results = [code for code, c in self.centroids.items() if c[3] == state]
+            body = {"query": {"state_name": q.get("state_name"), "country": country},
+                    "results": results[:int(q.get("limit", 10 ** 6))]}
+        elif endpoint == "country/province":
+            body = {"query": {"country": country},
+                    "results": sorted({c[3] for c in self.centroids.values()})}
+        else:
+            self.send_error(404)
+            return
+        payload = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _bound_handler(city_file):
+    return type("BoundZipcodebaseStubHandler", (ZipcodebaseStubHandler,), {
+        "centroids": build_centroids(load_city_zipcodes(city_file)),
+        "stats": {},
+        "_lock": threading.Lock(),
+    })
+
+def start_zipcodebase_stub(host="127.0.0.1", port=0, city_file=CITY_ZIP_FILE):
+    """
+    Starts the stub on a background thread. Returns (server, base_url); the per-endpoint request
+    counts are in server.RequestHandlerClass.stats. Call server.shutdown() to stop.
+    """
+    server = ThreadingHTTPServer((host, port), _bound_handler(city_file))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/api/v1/"
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve a stand-in ZipcodeBase API locally.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--city-file", default=CITY_ZIP_FILE)
+    args = parser.parse_args()
+    print(f"🧪 Serving a stub ZipcodeBase API on http://{args.host}:{args.port}/api/v1/")
+    ThreadingHTTPServer((args.host, args.port), _bound_handler(args.city_file)).serve_forever()
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+cli.py
+
+One entry point for the project's commands:
+
+    python cli.py scrape --workers 4 --headless     # walk every ZIP again
+    python cli.py resume --workers 4 --headless     # continue from the crawl state checkpoint
+    python cli.py control pause                     # pause/resume/throttle/workers a running crawl
+    python cli.py sync                              # push a --storage local crawl to Postgres
+    python cli.py train --data sample_airbnb_data.csv
+    python cli.py value --property 185 2 1 0.72
+
+Each command's module is imported only when that command runs, so the CLI
+starts without loading Selenium, psycopg2 or scikit-learn, and no browser
+opens until a crawl actually needs one. `python cli.py <command> --help`
+shows the command's own options.
+"""
+
+import os
+import sys
+import argparse
+import importlib
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+
+# command -> (module with a main(argv, prog) function, arguments prepended, help)
+COMMANDS = {
+    "scrape": ("scraper_modules.listing_scraper", ["--restart"],
+               "Crawl every ZIP from the start (listing TTLs still apply)."),
+    "resume": ("scraper_modules.listing_scraper", [],
+               "Continue the crawl from the crawl state, skipping finished ZIPs."),
+    "control": ("scraper_modules.control", [], "Pause, resume, throttle or resize a running crawl."),
+    "sync": ("database_modules.local_store", [], "Sync a local listing store into Postgres."),
+    "train": ("regression_model_modules.train", [], "Train and register a property value model."),
+    "value": ("regression_model_modules.valuation", [], "Value properties with a registered model."),
+}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="cli.py", description="Airbnb scraping and valuation commands.",
+        epilog="\n".join(f"  {name:<8} {help_text}" for name, (_, _, help_text) in COMMANDS.items()),
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("command", choices=COMMANDS, metavar="command", help="One of: " + ", ".join(COMMANDS))
+    parser.add_argument("args", nargs=argparse.REMAINDER, help="Options for the command (see <command> --help).")
+    args = parser.parse_args(argv)
+
+    module_name, extra_args, _ = COMMANDS[args.command]
+    if args.command == "resume" and "--restart" in args.args:
+        parser.error("resume continues the last crawl; use 'scrape' to start over")
+    module = importlib.import_module(module_name)
+    return module.main(extra_args + args.args, prog=f"cli.py {args.command}")
+
+if __name__ == "__main__":
+    raise SystemExit(main())
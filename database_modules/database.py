@@ -1,6 +1,11 @@
 import os
+import time
+from datetime import date
 import psycopg2
+from psycopg2.extras import Json, execute_values
+from psycopg2.pool import ThreadedConnectionPool
 from dotenv import load_dotenv
+from metrics import inc, observe
 
 # Load .env from the root directory
 load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), "../.env"))
@@ -25,6 +30,20 @@ def get_db_connection():
     )
     return conn
 
+def get_connection_pool(minconn=1, maxconn=4):
+    """Create a thread-safe pool of Supabase PostgreSQL connections."""
+    return ThreadedConnectionPool(
+        minconn,
+        maxconn,
+        host=DB_HOST,
+        port=DB_PORT,
+        dbname=DB_NAME,
+        user=DB_USER,
+        password=DB_PASSWORD,
+        connect_timeout=5,
+        sslmode='require'
+    )
+
 def create_table(conn):
     """Create the listings table if it doesn't exist."""
     cur = conn.cursor()
@@ -40,33 +59,394 @@ def create_table(conn):
             price NUMERIC NOT NULL,
             timestamp TIMESTAMP DEFAULT NOW()
         );
+        -- timestamp is when the listing was scraped; written_at is when this database last wrote the
+        -- row, which the feature cache reads incrementally by (a synced row can be scraped long before).
+        ALTER TABLE listings ADD COLUMN IF NOT EXISTS written_at TIMESTAMP NOT NULL DEFAULT NOW();
+        CREATE INDEX IF NOT EXISTS listings_timestamp_idx ON listings (timestamp, listing_id);
+        CREATE INDEX IF NOT EXISTS listings_written_at_idx ON listings (written_at, listing_id);
+        CREATE INDEX IF NOT EXISTS listings_zipcode_idx ON listings (city, zipcode);
+
+        -- Append-only history: one row per write, partitioned by month of timestamp.
+        CREATE TABLE IF NOT EXISTS listing_snapshots (
+            listing_id TEXT NOT NULL,
+            city TEXT NOT NULL,
+            zipcode TEXT NOT NULL,
+            room_type TEXT,
+            bedroom_count INTEGER NOT NULL,
+            bathroom_count INTEGER NOT NULL,
+            price NUMERIC NOT NULL,
+            price_samples JSONB,
+            timestamp TIMESTAMP NOT NULL DEFAULT NOW()
+        ) PARTITION BY RANGE (timestamp);
+        CREATE TABLE IF NOT EXISTS listing_snapshots_default PARTITION OF listing_snapshots DEFAULT;
+        CREATE INDEX IF NOT EXISTS listing_snapshots_zipcode_idx ON listing_snapshots (city, zipcode, timestamp);
+        CREATE INDEX IF NOT EXISTS listing_snapshots_listing_idx ON listing_snapshots (listing_id, timestamp);
+
+        -- Per-ZIP aggregates over the current listings, refreshed by every write.
+        CREATE TABLE IF NOT EXISTS zipcode_stats (
+            city TEXT NOT NULL,
+            zipcode TEXT NOT NULL,
+            listings INTEGER NOT NULL,
+            snapshots BIGINT NOT NULL DEFAULT 0,
+            median_price NUMERIC,
+            avg_price NUMERIC,
+            studios INTEGER NOT NULL,
+            one_bedroom INTEGER NOT NULL,
+            two_bedroom INTEGER NOT NULL,
+            three_bedroom INTEGER NOT NULL,
+            four_plus_bedroom INTEGER NOT NULL,
+            updated_at TIMESTAMP NOT NULL DEFAULT NOW(),
+            PRIMARY KEY (city, zipcode)
+        );
+
+        -- Batches loaded by local_store.sync_to_postgres, so a re-run never applies one twice.
+        CREATE TABLE IF NOT EXISTS sync_batches (
+            batch_id TEXT PRIMARY KEY,
+            records INTEGER NOT NULL,
+            synced_at TIMESTAMP NOT NULL DEFAULT NOW()
+        );
     """)
     conn.commit()
     cur.close()
+    ensure_snapshot_partitions(conn)
+
+SNAPSHOT_MONTHS_AHEAD = 3
+
+def ensure_snapshot_partitions(conn, months_ahead=SNAPSHOT_MONTHS_AHEAD, today=None):
+    """
+    Creates the monthly listing_snapshots partitions from this month through months_ahead months
+    from now. Rows outside every monthly partition land in listing_snapshots_default, so creating
+    partitions ahead of time keeps that one empty (Postgres refuses to add a partition whose range
+    already has rows in the default one).
+    """
+    today = today or date.today()
+    cur = conn.cursor()
+    for offset in range(months_ahead + 1):
+        year, month = divmod(today.month - 1 + offset, 12)
+        start = date(today.year + year, month + 1, 1)
+        year, month = divmod(start.month, 12)
+        end = date(start.year + year, month + 1, 1)
+        try:
+            cur.execute(f"""
+                CREATE TABLE IF NOT EXISTS listing_snapshots_{start:%Y_%m}
+                PARTITION OF listing_snapshots FOR VALUES FROM ('{start}') TO ('{end}');
+            """)
+            conn.commit()
+        except psycopg2.Error as e:
+            conn.rollback()
+            print(f"⚠️ Could not create snapshot partition for {start:%Y-%m}: {str(e).strip()}")
+    cur.close()
 
 def insert_listing(conn, listing_data):
     """
     Insert a listing into the database or update it if it already exists.
     listing_data should be a dictionary containing:
     - listing_id, city, zipcode, listing_url, room_type, bedroom_count, bathroom_count
+    and optionally timestamp, the scrape time (default now).
     Uses PostgreSQL's ON CONFLICT DO UPDATE to update existing entries.
     """
+    started = time.perf_counter()
     cur = conn.cursor()
     try:
-        cur.execute("""
-            INSERT INTO listings (listing_id, city, zipcode, listing_url, room_type, bedroom_count, bathroom_count, price)
-            VALUES (%(listing_id)s, %(city)s, %(zipcode)s, %(listing_url)s, %(room_type)s, %(bedroom_count)s, %(bathroom_count)s, %(price)s)
-            ON CONFLICT (listing_id) DO UPDATE
-            SET city = EXCLUDED.city,
-                zipcode = EXCLUDED.zipcode,
-                listing_url = EXCLUDED.listing_url,
-                room_type = EXCLUDED.room_type,
-                bedroom_count = EXCLUDED.bedroom_count,
-                bathroom_count = EXCLUDED.bathroom_count,
-                price = EXCLUDED.price;
-        """, listing_data)
+        previous = listing_zipcodes(cur, [listing_data.get("listing_id")])
+        execute_values(cur, BULK_UPSERT_SQL, [listing_row(listing_data)], template=BULK_UPSERT_TEMPLATE)
+        execute_values(cur, SNAPSHOT_INSERT_SQL, [snapshot_row(listing_data)], template=SNAPSHOT_INSERT_TEMPLATE)
+        refresh_zipcode_stats(cur, {(listing_data["city"], listing_data["zipcode"]): 1}, previous)
         conn.commit()
+        inc("db_rows_written_total")
     except Exception as e:
         print(f"Error inserting {listing_data.get('listing_url')}: {e}")
+        inc("db_errors_total", kind="row")
         conn.rollback()
     cur.close()
+    observe("scraper_stage_seconds", time.perf_counter() - started, stage="db_write")
+
+LISTING_COLUMNS = ["listing_id", "city", "zipcode", "listing_url", "room_type",
+                   "bedroom_count", "bathroom_count", "price"]
+REQUIRED_LISTING_COLUMNS = ["listing_id", "city", "zipcode", "listing_url",
+                            "bedroom_count", "bathroom_count", "price"]
+NUMERIC_LISTING_COLUMNS = ["bedroom_count", "bathroom_count", "price"]
+
+# A record's timestamp is its scrape time; records without one (written as they are scraped) get
+# NOW(). A record scraped before the stored row (a late sync) only adds a snapshot.
+BULK_UPSERT_SQL = """
+    INSERT INTO listings (listing_id, city, zipcode, listing_url, room_type, bedroom_count, bathroom_count, price,
+                          timestamp)
+    VALUES %s
+    ON CONFLICT (listing_id) DO UPDATE
+    SET city = EXCLUDED.city,
+        zipcode = EXCLUDED.zipcode,
+        listing_url = EXCLUDED.listing_url,
+        room_type = EXCLUDED.room_type,
+        bedroom_count = EXCLUDED.bedroom_count,
+        bathroom_count = EXCLUDED.bathroom_count,
+        price = EXCLUDED.price,
+        timestamp = EXCLUDED.timestamp,
+        written_at = NOW()
+    WHERE listings.timestamp IS NULL OR listings.timestamp <= EXCLUDED.timestamp;
+"""
+BULK_UPSERT_TEMPLATE = f"({', '.join(['%s'] * len(LISTING_COLUMNS))}, COALESCE(%s, NOW()))"
+
+SNAPSHOT_COLUMNS = ["listing_id", "city", "zipcode", "room_type", "bedroom_count", "bathroom_count", "price"]
+
+SNAPSHOT_INSERT_SQL = """
+    INSERT INTO listing_snapshots (listing_id, city, zipcode, room_type, bedroom_count, bathroom_count, price, price_samples,
+                                   timestamp)
+    VALUES %s;
+"""
+SNAPSHOT_INSERT_TEMPLATE = f"({', '.join(['%s'] * (len(SNAPSHOT_COLUMNS) + 1))}, COALESCE(%s, NOW()))"
+
+# Recomputes the aggregates of the given ZIPs from the listings table (index on city, zipcode), so
+# a write costs one pass over the ZIPs it touched rather than the whole table. The snapshot
+# counter is the only running total: it is bumped by the number of snapshots in this write.
+# Studios are counted by room_type (their bedroom_count comes from the bed count) and left out
+# of the bedroom buckets.
+REFRESH_ZIPCODE_STATS_SQL = """
+    INSERT INTO zipcode_stats (city, zipcode, listings, snapshots, median_price, avg_price, studios,
+                               one_bedroom, two_bedroom, three_bedroom, four_plus_bedroom, updated_at)
+    SELECT t.city, t.zipcode, COUNT(l.listing_id), MAX(t.snapshots),
+           percentile_cont(0.5) WITHIN GROUP (ORDER BY l.price), AVG(l.price),
+           COUNT(*) FILTER (WHERE l.room_type = 'Studio'),
+           COUNT(*) FILTER (WHERE l.room_type IS DISTINCT FROM 'Studio' AND l.bedroom_count = 1),
+           COUNT(*) FILTER (WHERE l.room_type IS DISTINCT FROM 'Studio' AND l.bedroom_count = 2),
+           COUNT(*) FILTER (WHERE l.room_type IS DISTINCT FROM 'Studio' AND l.bedroom_count = 3),
+           COUNT(*) FILTER (WHERE l.room_type IS DISTINCT FROM 'Studio' AND l.bedroom_count >= 4),
+           NOW()
+    FROM unnest(%s::text[], %s::text[], %s::bigint[]) AS t(city, zipcode, snapshots)
+    LEFT JOIN listings l ON l.city = t.city AND l.zipcode = t.zipcode
+    GROUP BY t.city, t.zipcode
+    ON CONFLICT (city, zipcode) DO UPDATE
+    SET listings = EXCLUDED.listings,
+        snapshots = zipcode_stats.snapshots + EXCLUDED.snapshots,
+        median_price = EXCLUDED.median_price,
+        avg_price = EXCLUDED.avg_price,
+        studios = EXCLUDED.studios,
+        one_bedroom = EXCLUDED.one_bedroom,
+        two_bedroom = EXCLUDED.two_bedroom,
+        three_bedroom = EXCLUDED.three_bedroom,
+        four_plus_bedroom = EXCLUDED.four_plus_bedroom,
+        updated_at = EXCLUDED.updated_at;
+"""
+
+def listing_row(record):
+    """The listings row for one listing record (see BULK_UPSERT_TEMPLATE)."""
+    return tuple(record.get(column) for column in LISTING_COLUMNS) + (record.get("timestamp"),)
+
+def snapshot_row(record):
+    """The listing_snapshots row for one listing record; price_samples is stored as JSON when present."""
+    samples = record.get("price_samples")
+    return (tuple(record.get(column) for column in SNAPSHOT_COLUMNS)
+            + (Json(samples) if samples else None, record.get("timestamp")))
+
+def listing_zipcodes(cur, listing_ids):
+    """The (city, zipcode) pairs the given listings are stored under now, before they are overwritten."""
+    cur.execute("SELECT DISTINCT city, zipcode FROM listings WHERE listing_id = ANY(%s);", (list(listing_ids),))
+    return set(cur.fetchall())
+
+def refresh_zipcode_stats(cur, snapshots_by_zip, also_refresh=()):
+    """
+    Refreshes zipcode_stats for the ZIPs in snapshots_by_zip ({(city, zipcode): snapshots written})
+    and also_refresh (ZIPs that listings just moved out of). Runs in the caller's transaction.
+    """
+    counts = dict.fromkeys(also_refresh, 0)
+    counts.update(snapshots_by_zip)
+    if not counts:
+        return
+    # Sorted so concurrent writers lock zipcode_stats rows in the same order.
+    keys = sorted(counts)
+    cur.execute(REFRESH_ZIPCODE_STATS_SQL,
+                ([city for city, _ in keys], [zip_code for _, zip_code in keys], [counts[key] for key in keys]))
+
+def validate_listing(listing_data):
+    """Returns the reason a listing would be rejected by the listings table, or None if it looks valid."""
+    for column in REQUIRED_LISTING_COLUMNS:
+        if listing_data.get(column) is None:
+            return f"missing required field '{column}'"
+    for column in NUMERIC_LISTING_COLUMNS:
+        try:
+            float(listing_data[column])
+        except (TypeError, ValueError):
+            return f"non-numeric value for '{column}': {listing_data[column]!r}"
+    return None
+
+def claim_sync_batch(cur, batch_id, records):
+    """Records batch_id as applied in the current transaction; False if it already was."""
+    cur.execute("""
+        INSERT INTO sync_batches (batch_id, records) VALUES (%s, %s)
+        ON CONFLICT (batch_id) DO NOTHING
+        RETURNING batch_id;
+    """, (batch_id, records))
+    return cur.fetchone() is not None
+
+def insert_listings_bulk(conn, records, page_size=1000, batch_id=None):
+    """
+    Upsert many listings with one multi-row INSERT ... ON CONFLICT per page and a
+    single commit for the whole batch.
+
+    Every written row is also appended to listing_snapshots, and zipcode_stats is
+    refreshed for the ZIPs the batch touched, in the same transaction.
+
+    Rows that would violate the table constraints are filtered out before the
+    write. If a row fails inside the database anyway, the batch is rolled back
+    and replayed row by row under savepoints so only the bad rows are dropped.
+    When the same listing_id appears more than once, the last record wins.
+
+    With a batch_id, the batch is written at most once: the ID is stored in
+    sync_batches in the same transaction, and a batch whose ID is already there
+    is skipped.
+
+    A record may carry its scrape time as `timestamp` (local_store.sync_to_postgres
+    does); it then dates the row and its snapshot instead of the write time, and
+    a stored row scraped later than the record is kept.
+
+    Returns a dict with:
+    - inserted: number of rows written
+    - rejected: list of (record, reason) tuples for rows that were not written
+    - already_synced: True if batch_id had been applied before (only when skipped)
+    """
+    rejected = []
+    rows_by_id = {}
+    for record in records:
+        reason = validate_listing(record)
+        if reason:
+            rejected.append((record, reason))
+            continue
+        rows_by_id[record["listing_id"]] = record
+    records = list(rows_by_id.values())
+    rows = [listing_row(record) for record in records]
+    if not rows:
+        inc("db_rows_rejected_total", len(rejected))
+        return {"inserted": 0, "rejected": rejected}
+    snapshot_rows = [snapshot_row(record) for record in records]
+
+    started = time.perf_counter()
+    cur = conn.cursor()
+    try:
+        try:
+            if batch_id is not None and not claim_sync_batch(cur, batch_id, len(records)):
+                conn.rollback()
+                return {"inserted": 0, "rejected": rejected, "already_synced": True}
+            previous = listing_zipcodes(cur, rows_by_id)
+            execute_values(cur, BULK_UPSERT_SQL, rows, template=BULK_UPSERT_TEMPLATE, page_size=page_size)
+            execute_values(cur, SNAPSHOT_INSERT_SQL, snapshot_rows, template=SNAPSHOT_INSERT_TEMPLATE,
+                           page_size=page_size)
+            written = records
+        except psycopg2.Error:
+            inc("db_errors_total", kind="batch")
+            conn.rollback()
+            if batch_id is not None:
+                claim_sync_batch(cur, batch_id, len(records))
+            previous = listing_zipcodes(cur, rows_by_id)
+            written = []
+            for record, row, snapshot in zip(records, rows, snapshot_rows):
+                cur.execute("SAVEPOINT bulk_row")
+                try:
+                    execute_values(cur, BULK_UPSERT_SQL, [row], template=BULK_UPSERT_TEMPLATE)
+                    execute_values(cur, SNAPSHOT_INSERT_SQL, [snapshot], template=SNAPSHOT_INSERT_TEMPLATE)
+                    cur.execute("RELEASE SAVEPOINT bulk_row")
+                    written.append(record)
+                except psycopg2.Error as e:
+                    cur.execute("ROLLBACK TO SAVEPOINT bulk_row")
+                    inc("db_errors_total", kind="row")
+                    rejected.append((record, str(e).strip()))
+        snapshots_by_zip = {}
+        for record in written:
+            key = (record["city"], record["zipcode"])
+            snapshots_by_zip[key] = snapshots_by_zip.get(key, 0) + 1
+        refresh_zipcode_stats(cur, snapshots_by_zip, previous)
+        conn.commit()
+        inserted = len(written)
+    finally:
+        cur.close()
+        observe("scraper_stage_seconds", time.perf_counter() - started, stage="db_write")
+    inc("db_rows_written_total", inserted)
+    inc("db_rows_rejected_total", len(rejected))
+    return {"inserted": inserted, "rejected": rejected}
+
+def fetch_listing_snapshots(conn, listing_ids):
+    """
+    Returns {listing_id: row} with the stored room_type, bedroom_count,
+    bathroom_count and price for the listings that already exist.
+    """
+    if not listing_ids:
+        return {}
+    cur = conn.cursor()
+    try:
+        cur.execute("""
+            SELECT listing_id, room_type, bedroom_count, bathroom_count, price
+            FROM listings
+            WHERE listing_id = ANY(%s);
+        """, (list(listing_ids),))
+        snapshots = {}
+        for listing_id, room_type, bedroom_count, bathroom_count, price in cur.fetchall():
+            snapshots[listing_id] = {
+                "room_type": room_type,
+                "bedroom_count": bedroom_count,
+                "bathroom_count": bathroom_count,
+                "price": float(price) if price is not None else None,
+            }
+        return snapshots
+    finally:
+        cur.close()
+
+def fetch_zipcode_freshness(conn, stale_after_hours):
+    """
+    Returns {(city, zipcode): (listings, stale)}: how many listings each ZIP has in the table and
+    how many of them were last written more than stale_after_hours ago.
+    """
+    cur = conn.cursor()
+    try:
+        cur.execute("""
+            SELECT city, zipcode, COUNT(*),
+                   COUNT(*) FILTER (WHERE timestamp < NOW() - make_interval(secs => %s))
+            FROM listings
+            GROUP BY city, zipcode;
+        """, (stale_after_hours * 3600,))
+        return {(city, zipcode): (total, stale) for city, zipcode, total, stale in cur.fetchall()}
+    finally:
+        cur.close()
+
+def fetch_zipcode_stats(conn, city=None, zipcode=None):
+    """
+    Returns {(city, zipcode): stats} from the pre-aggregated zipcode_stats table: listings, snapshots,
+    median_price, avg_price and the bedroom mix (studios, one_bedroom ... four_plus_bedroom).
+    Filtering on city and zipcode is a primary-key lookup.
+    """
+    cur = conn.cursor()
+    try:
+        cur.execute("""
+            SELECT city, zipcode, listings, snapshots, median_price, avg_price, studios, one_bedroom,
+                   two_bedroom, three_bedroom, four_plus_bedroom, updated_at
+            FROM zipcode_stats
+            WHERE (%(city)s IS NULL OR city = %(city)s) AND (%(zipcode)s IS NULL OR zipcode = %(zipcode)s);
+        """, {"city": city, "zipcode": zipcode})
+        names = [column.name for column in cur.description]
+        stats = {}
+        for row in cur.fetchall():
+            entry = dict(zip(names[2:], row[2:]))
+            for key in ("median_price", "avg_price"):
+                entry[key] = float(entry[key]) if entry[key] is not None else None
+            stats[(row[0], row[1])] = entry
+        return stats
+    finally:
+        cur.close()
+
+def fetch_listing_history(conn, listing_id, since=None):
+    """Returns a listing's snapshots, oldest first, optionally only those written after `since`."""
+    cur = conn.cursor()
+    try:
+        cur.execute("""
+            SELECT timestamp, city, zipcode, room_type, bedroom_count, bathroom_count, price, price_samples
+            FROM listing_snapshots
+            WHERE listing_id = %s AND timestamp > COALESCE(%s, '-infinity'::timestamp)
+            ORDER BY timestamp;
+        """, (listing_id, since))
+        names = [column.name for column in cur.description]
+        history = []
+        for row in cur.fetchall():
+            entry = dict(zip(names, row))
+            entry["price"] = float(entry["price"])
+            history.append(entry)
+        return history
+    finally:
+        cur.close()
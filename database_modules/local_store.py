@@ -0,0 +1,321 @@
+"""
+local_store.py
+
+Local SQLite storage for scraped listings, synced to Postgres later.
+
+LocalListingStore has the same interface as WriteBehindWriter (`put`, `close`,
+`stats` and the two read methods the scrapers use), so a crawl can run with no
+database reachable. Each commit writes a batch of records to two tables:
+- `listings`: the latest row per listing, which the card planner and the
+  scheduler read back,
+- `outbox`: every record as written (price_samples included), in order, until
+  it has been synced.
+The file is in WAL mode with synchronous=NORMAL, so a commit is a local append
+with no network round trip. A background thread commits a buffer that has sat
+for flush_interval, so a slow crawl's records don't wait for the next put().
+
+`sync_to_postgres` bulk-loads the outbox through `insert_listings_bulk`. Rows
+are cut into batches whose IDs are saved locally before they are sent. Postgres
+records each applied batch ID in `sync_batches` in the same transaction as the
+rows. A sync that is interrupted or run twice therefore never writes a batch
+(or its snapshots) twice. Each row's `timestamp` is the time it was written to
+the local store, which is close to its scrape time, not the time it reached
+Postgres.
+
+    python database_modules/local_store.py            # sync listings_local.sqlite3 to Postgres
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+import sqlite3
+import argparse
+import threading
+from datetime import datetime, timezone
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from metrics import timed
+from database_modules.database import (
+    LISTING_COLUMNS,
+    create_table,
+    get_db_connection,
+    insert_listings_bulk,
+    validate_listing,
+)
+
+LOCAL_STORE_FILE = os.path.join(os.path.dirname(__file__), "listings_local.sqlite3")
+SYNC_BATCH_SIZE = 2000
+
+SCHEMA = """
+PRAGMA journal_mode = WAL;
+PRAGMA synchronous = NORMAL;
+CREATE TABLE IF NOT EXISTS listings (
+    listing_id TEXT PRIMARY KEY,
+    city TEXT NOT NULL,
+    zipcode TEXT NOT NULL,
+    listing_url TEXT NOT NULL,
+    room_type TEXT,
+    bedroom_count INTEGER NOT NULL,
+    bathroom_count INTEGER NOT NULL,
+    price REAL NOT NULL,
+    written_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS listings_zipcode_idx ON listings (city, zipcode);
+CREATE TABLE IF NOT EXISTS outbox (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    record TEXT NOT NULL,
+    written_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS sync_batches (
+    batch_id TEXT PRIMARY KEY,
+    first_seq INTEGER NOT NULL,
+    last_seq INTEGER NOT NULL,
+    synced_at REAL
+);
+CREATE TABLE IF NOT EXISTS store_meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+LOCAL_UPSERT_SQL = f"""
+    INSERT INTO listings ({", ".join(LISTING_COLUMNS)}, written_at)
+    VALUES ({", ".join("?" * (len(LISTING_COLUMNS) + 1))})
+    ON CONFLICT (listing_id) DO UPDATE
+    SET {", ".join(f"{c} = excluded.{c}" for c in LISTING_COLUMNS[1:])},
+        written_at = excluded.written_at;
+"""
+
+
+def open_local_db(path):
+    # Autocommit mode: the store and the sync open their own transactions explicitly.
+    conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+    conn.executescript(SCHEMA)
+    conn.execute("INSERT OR IGNORE INTO store_meta (key, value) VALUES ('store_id', ?)", (uuid.uuid4().hex,))
+    return conn
+
+
+def notify(on_written, written):
+    """Runs a put() caller's on_written callback; its errors are reported, never raised into the writer."""
+    if on_written is None:
+        return
+    try:
+        on_written(written)
+    except Exception as e:
+        print(f"⚠️ on_written callback failed: {e!r}")
+
+
+class LocalListingStore:
+    """Drop-in for WriteBehindWriter that commits batches to a local SQLite file."""
+
+    def __init__(self, path=LOCAL_STORE_FILE, batch_size=500, flush_interval=5.0):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.conn = open_local_db(path)
+        self.stats = {"queued": 0, "written": 0, "rejected": 0}
+        self._batch = []
+        self._callbacks = []
+        self._deadline = None
+        self._lock = threading.Lock()
+        self._closed = False
+        self._stop = threading.Event()
+        self._flusher = threading.Thread(target=self._flush_loop, name="local-store-flush", daemon=True)
+        self._flusher.start()
+
+    def put(self, record, timeout=None, on_written=None):
+        """
+        Buffer a record; the buffer is committed once it holds batch_size records or is flush_interval old.
+        on_written(written) is called after the commit (True) or at once if the record is rejected (False).
+        """
+        if self._closed:
+            raise RuntimeError("LocalListingStore is closed")
+        reason = validate_listing(record)
+        with self._lock:
+            self.stats["queued"] += 1
+            if reason:
+                self.stats["rejected"] += 1
+                print(f"⚠️ Rejected {record.get('listing_url')}: {reason}")
+                notify(on_written, False)
+                return
+            self._batch.append(record)
+            self._callbacks.append(on_written)
+            if self._deadline is None:
+                self._deadline = time.monotonic() + self.flush_interval
+            if len(self._batch) >= self.batch_size or time.monotonic() >= self._deadline:
+                self._flush_locked()
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_loop(self):
+        # Checks a few times per interval, so a buffer is committed at most a fraction of it late.
+        while not self._stop.wait(max(self.flush_interval / 4, 0.05)):
+            with self._lock:
+                if self._deadline is None or time.monotonic() < self._deadline:
+                    continue
+                try:
+                    self._flush_locked()
+                except sqlite3.Error as e:
+                    # The batch stays buffered; the next put(), flush() or close() tries again.
+                    print(f"⚠️ Local store flush failed: {e!r}")
+                    self._deadline = time.monotonic() + self.flush_interval
+
+    def _flush_locked(self):
+        if not self._batch:
+            return
+        now = time.time()
+        with timed("local_write"):
+            self._commit_batch(now)
+        self.stats["written"] += len(self._batch)
+        for on_written in self._callbacks:
+            notify(on_written, True)
+        self._batch = []
+        self._callbacks = []
+        self._deadline = None
+
+    def _commit_batch(self, now):
+        self.conn.execute("BEGIN")
+        try:
+            self.conn.executemany(LOCAL_UPSERT_SQL, [
+                tuple(record.get(column) for column in LISTING_COLUMNS) + (now,) for record in self._batch
+            ])
+            self.conn.executemany("INSERT INTO outbox (record, written_at) VALUES (?, ?)", [
+                (json.dumps(record, default=str), now) for record in self._batch
+            ])
+            self.conn.execute("COMMIT")
+        except sqlite3.Error:
+            self.conn.execute("ROLLBACK")
+            raise
+
+    def fetch_listing_snapshots(self, listing_ids):
+        """{listing_id: row} for the listings already stored, like database.fetch_listing_snapshots."""
+        listing_ids = list(listing_ids)
+        if not listing_ids:
+            return {}
+        self.flush()
+        with self._lock:
+            rows = self.conn.execute(
+                f"SELECT listing_id, room_type, bedroom_count, bathroom_count, price FROM listings "
+                f"WHERE listing_id IN ({', '.join('?' * len(listing_ids))})", listing_ids
+            ).fetchall()
+        return {
+            listing_id: {"room_type": room_type, "bedroom_count": bedroom_count,
+                         "bathroom_count": bathroom_count, "price": price}
+            for listing_id, room_type, bedroom_count, bathroom_count, price in rows
+        }
+
+    def fetch_zipcode_freshness(self, stale_after_hours):
+        """{(city, zipcode): (listings, stale)}, like database.fetch_zipcode_freshness."""
+        cutoff = time.time() - stale_after_hours * 3600
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT city, zipcode, COUNT(*), SUM(written_at < ?) FROM listings GROUP BY city, zipcode",
+                (cutoff,),
+            ).fetchall()
+        return {(city, zipcode): (total, stale) for city, zipcode, total, stale in rows}
+
+    def close(self):
+        """Commit whatever is still buffered and close the file."""
+        if self._closed:
+            return
+        self._stop.set()
+        self._flusher.join()
+        self.flush()
+        self._closed = True
+        self.conn.close()
+        print(f"💾 Local store closed: {self.stats} -> {self.path}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def _next_sync_batch(local, batch_size):
+    """
+    Returns (batch_id, first_seq, last_seq) for the oldest batch not yet confirmed synced, cutting a
+    new one from the outbox if none is pending, or None when everything is synced.
+    """
+    pending = local.execute(
+        "SELECT batch_id, first_seq, last_seq FROM sync_batches WHERE synced_at IS NULL ORDER BY first_seq LIMIT 1"
+    ).fetchone()
+    if pending:
+        return pending
+    # IMMEDIATE takes the write lock first, so a scraper committing to the same file can't slip
+    # rows in below the new batch's range.
+    local.execute("BEGIN IMMEDIATE")
+    try:
+        start = local.execute("SELECT COALESCE(MAX(last_seq), 0) FROM sync_batches").fetchone()[0]
+        seqs = local.execute("SELECT seq FROM outbox WHERE seq > ? ORDER BY seq LIMIT ?",
+                             (start, batch_size)).fetchall()
+        if not seqs:
+            local.execute("ROLLBACK")
+            return None
+        store_id = local.execute("SELECT value FROM store_meta WHERE key = 'store_id'").fetchone()[0]
+        batch = (f"{store_id}:{seqs[0][0]}-{seqs[-1][0]}", seqs[0][0], seqs[-1][0])
+        local.execute("INSERT INTO sync_batches (batch_id, first_seq, last_seq) VALUES (?, ?, ?)", batch)
+        local.execute("COMMIT")
+    except sqlite3.Error:
+        local.execute("ROLLBACK")
+        raise
+    return batch
+
+def sync_to_postgres(path=LOCAL_STORE_FILE, conn=None, batch_size=SYNC_BATCH_SIZE, keep_synced=False):
+    """
+    Bulk-loads every record in the local outbox that hasn't been synced into Postgres. Safe to
+    interrupt and rerun. Synced records are deleted from the outbox unless keep_synced.
+
+    Returns a dict with batches, inserted, rejected and skipped (batches Postgres already had).
+    """
+    local = open_local_db(path)
+    own_conn = conn is None
+    conn = conn or get_db_connection()
+    totals = {"batches": 0, "inserted": 0, "rejected": 0, "skipped": 0}
+    try:
+        create_table(conn)
+        while True:
+            batch = _next_sync_batch(local, batch_size)
+            if batch is None:
+                break
+            batch_id, first_seq, last_seq = batch
+            records = [dict(json.loads(record), timestamp=datetime.fromtimestamp(written_at, timezone.utc))
+                       for record, written_at in local.execute(
+                           "SELECT record, written_at FROM outbox WHERE seq BETWEEN ? AND ? ORDER BY seq",
+                           (first_seq, last_seq))]
+            result = insert_listings_bulk(conn, records, batch_id=batch_id)
+            for record, reason in result["rejected"]:
+                print(f"⚠️ Rejected {record.get('listing_url')}: {reason}")
+            local.execute("BEGIN")
+            local.execute("UPDATE sync_batches SET synced_at = ? WHERE batch_id = ?", (time.time(), batch_id))
+            if not keep_synced:
+                local.execute("DELETE FROM outbox WHERE seq BETWEEN ? AND ?", (first_seq, last_seq))
+            local.execute("COMMIT")
+            totals["batches"] += 1
+            totals["inserted"] += result["inserted"]
+            totals["rejected"] += len(result["rejected"])
+            totals["skipped"] += int(result.get("already_synced", False))
+            print(f"🔄 Synced batch {first_seq}-{last_seq}: {result['inserted']} written"
+                  f"{' (already in Postgres)' if result.get('already_synced') else ''}")
+    finally:
+        local.close()
+        if own_conn:
+            conn.close()
+    print(f"🔄 Sync finished: {totals}")
+    return totals
+
+def main(argv=None, prog=None):
+    parser = argparse.ArgumentParser(prog=prog, description="Sync locally stored listings into Postgres.")
+    parser.add_argument("--path", default=LOCAL_STORE_FILE, help="Local store file to sync.")
+    parser.add_argument("--batch-size", type=int, default=SYNC_BATCH_SIZE,
+                        help=f"Records per Postgres transaction (default {SYNC_BATCH_SIZE}).")
+    parser.add_argument("--keep-synced", action="store_true", help="Keep synced records in the local outbox.")
+    args = parser.parse_args(argv)
+    sync_to_postgres(args.path, batch_size=args.batch_size, keep_synced=args.keep_synced)
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,24 @@
+"""
+storage.py
+
+Picks where scraped listings are written. Every backend takes records with
+`put(record)`, keeps `stats`, answers the two reads the scrapers make
+(`fetch_listing_snapshots(listing_ids)` and
+`fetch_zipcode_freshness(stale_after_hours)`) and flushes on `close()`:
+- postgres: WriteBehindWriter, batched upserts straight into Postgres,
+- local: LocalListingStore, a local SQLite file that
+  `python database_modules/local_store.py` syncs into Postgres later.
+"""
+
+STORAGE_BACKENDS = ("postgres", "local")
+
+
+def open_listing_store(backend="postgres", local_path=None, **kwargs):
+    """Returns the listing store for `backend`; extra keyword arguments go to its constructor."""
+    if backend == "postgres":
+        from database_modules.write_behind import WriteBehindWriter
+        return WriteBehindWriter(**kwargs)
+    if backend == "local":
+        from database_modules.local_store import LOCAL_STORE_FILE, LocalListingStore
+        return LocalListingStore(local_path or LOCAL_STORE_FILE, **kwargs)
+    raise ValueError(f"Unknown storage backend {backend!r}; expected one of {STORAGE_BACKENDS}")
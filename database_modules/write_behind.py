@@ -0,0 +1,222 @@
+"""
+write_behind.py
+
+Background write-behind queue for scraped listing records.
+
+Scrapers call `writer.put(record)` and go straight back to the browser. One or
+more writer threads drain a bounded in-memory queue and upsert the records in
+batches through `insert_listings_bulk` (which also appends to the snapshot
+history and refreshes the per-ZIP stats), using connections from a
+`ThreadedConnectionPool`. A batch is flushed when it reaches `batch_size` or
+when `flush_interval` seconds have passed since its first record, whichever
+comes first. A record's optional `on_written(written)` callback runs on the
+writer thread once its fate is known: True when it was committed (or spilled),
+False when it was rejected or lost.
+
+If the queue is full, `put` blocks until a writer catches up (backpressure).
+A connection that drops is thrown away and replaced from the pool, and the
+batch is retried, so a network blip doesn't end a multi-hour run. A batch that
+still can't be written (retries exhausted, or an error retrying won't fix) is
+spilled to a local store file (see local_store.py) for `python cli.py sync` to
+load later, and the writer thread carries on. Rows are only lost if the spill
+fails too, and then close() raises.
+"""
+
+import time
+import queue
+import threading
+import psycopg2
+from metrics import inc, set_gauge, timed
+from database_modules.database import (
+    create_table,
+    fetch_listing_snapshots,
+    fetch_zipcode_freshness,
+    get_connection_pool,
+    insert_listings_bulk,
+)
+from database_modules.local_store import LOCAL_STORE_FILE, LocalListingStore, notify
+
+_STOP = object()
+
+
+class WriteBehindWriter:
+    """Bounded queue plus writer threads that batch records into the listings table."""
+
+    def __init__(self, pool=None, batch_size=500, flush_interval=5.0, max_queue=10_000,
+                 writers=1, max_retries=5, retry_backoff=2.0, spill_path=LOCAL_STORE_FILE):
+        self.pool = pool or get_connection_pool(minconn=1, maxconn=writers + 1)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.spill_path = spill_path
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.stats = {"queued": 0, "written": 0, "rejected": 0, "spilled": 0, "failed": 0, "reconnects": 0}
+        self._stats_lock = threading.Lock()
+        self._spill_store = None
+        self._spill_lock = threading.Lock()
+        self._closed = False
+        # Makes sure the snapshot tables and the coming months' partitions exist before the first batch.
+        conn = self.pool.getconn()
+        try:
+            create_table(conn)
+        finally:
+            self.pool.putconn(conn)
+        self._threads = [
+            threading.Thread(target=self._writer_loop, name=f"write-behind-{i}", daemon=True)
+            for i in range(writers)
+        ]
+        for t in self._threads:
+            t.start()
+
+    def put(self, record, timeout=None, on_written=None):
+        """Queue a record for writing. Blocks while the queue is full. on_written(written) is called
+        once the record has been committed (True) or rejected or lost (False)."""
+        if self._closed:
+            raise RuntimeError("WriteBehindWriter is closed")
+        with timed("queue_put"):
+            self.queue.put((record, on_written), timeout=timeout)
+        self._bump("queued")
+
+    def fetch_listing_snapshots(self, listing_ids):
+        """Stored rows for the given listing IDs, read on a pooled connection."""
+        conn = self.pool.getconn()
+        try:
+            return fetch_listing_snapshots(conn, listing_ids)
+        finally:
+            self.pool.putconn(conn)
+
+    def fetch_zipcode_freshness(self, stale_after_hours):
+        """Per-ZIP listing counts and stale counts, read on a pooled connection."""
+        conn = self.pool.getconn()
+        try:
+            return fetch_zipcode_freshness(conn, stale_after_hours)
+        finally:
+            self.pool.putconn(conn)
+
+    def close(self):
+        """Flush everything still queued, stop the writer threads and close the pool."""
+        if self._closed:
+            return
+        self._closed = True
+        for _ in self._threads:
+            self.queue.put(_STOP)
+        for t in self._threads:
+            t.join()
+        self.pool.closeall()
+        if self._spill_store:
+            self._spill_store.close()
+        print(f"💾 Write-behind drained: {self.stats}")
+        if self.stats["spilled"]:
+            print(f"💾 {self.stats['spilled']} listings are waiting in {self.spill_path}; "
+                  f"run `python cli.py sync --path {self.spill_path}` to load them into Postgres")
+        if self.stats["failed"]:
+            raise RuntimeError(f"{self.stats['failed']} listings could not be written to Postgres or spilled")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _bump(self, key, n=1):
+        with self._stats_lock:
+            self.stats[key] += n
+
+    def _writer_loop(self):
+        batch = []
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                item = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+            if item is _STOP:
+                if batch:
+                    self._flush_safely(batch)
+                return
+            if item is not None:
+                batch.append(item)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+            if batch and (len(batch) >= self.batch_size or time.monotonic() >= deadline):
+                set_gauge("db_write_queue_depth", self.queue.qsize())
+                self._flush_safely(batch)
+                batch = []
+                deadline = None
+
+    def _flush_safely(self, batch):
+        # The thread must outlive any error: if it died, put() and close() would block forever on a full queue.
+        try:
+            self._flush(batch)
+        except Exception as e:
+            print(f"❌ Write-behind error on a batch of {len(batch)} listings: {e!r}")
+            self._spill(batch)
+
+    def _release(self, conn):
+        """Returns a connection after a failed batch, dropping it if it can't be rolled back."""
+        try:
+            conn.rollback()
+            self.pool.putconn(conn)
+        except Exception:
+            self.pool.putconn(conn, close=True)
+
+    def _flush(self, batch):
+        for attempt in range(1, self.max_retries + 1):
+            conn = None
+            try:
+                conn = self.pool.getconn()
+                if conn.closed:
+                    raise psycopg2.InterfaceError("pooled connection already closed")
+                result = insert_listings_bulk(conn, [record for record, _ in batch])
+            except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
+                # Drop the broken connection; the pool opens a fresh one on the next getconn().
+                if conn is not None:
+                    self.pool.putconn(conn, close=True)
+                self._bump("reconnects")
+                inc("db_errors_total", kind="connection")
+                inc("db_retries_total")
+                wait = self.retry_backoff * attempt
+                print(f"🔌 DB connection lost ({e}); retry {attempt}/{self.max_retries} in {wait:.0f}s")
+                time.sleep(wait)
+                continue
+            except Exception as e:
+                # Not a connection problem, so retrying the same batch won't help.
+                if conn is not None:
+                    self._release(conn)
+                inc("db_errors_total", kind="batch")
+                print(f"❌ Writing a batch of {len(batch)} listings failed: {e!r}")
+                self._spill(batch)
+                return
+            self.pool.putconn(conn)
+            self._bump("written", result["inserted"])
+            self._bump("rejected", len(result["rejected"]))
+            for record, reason in result["rejected"]:
+                print(f"⚠️ Rejected {record.get('listing_url')}: {reason}")
+            rejected = {id(record) for record, _ in result["rejected"]}
+            for record, on_written in batch:
+                notify(on_written, id(record) not in rejected)
+            return
+        print(f"❌ Gave up writing a batch of {len(batch)} listings after {self.max_retries} attempts")
+        self._spill(batch)
+
+    def _spill(self, batch):
+        """Saves a batch that couldn't be written to the local store file, to be synced later."""
+        try:
+            with self._spill_lock:
+                if self._spill_store is None:
+                    self._spill_store = LocalListingStore(self.spill_path)
+                rejected = self._spill_store.stats["rejected"]
+                for record, on_written in batch:
+                    self._spill_store.put(record, on_written=on_written)
+                self._spill_store.flush()
+                rejected = self._spill_store.stats["rejected"] - rejected
+            self._bump("spilled", len(batch) - rejected)
+            self._bump("rejected", rejected)
+            print(f"💾 Spilled {len(batch) - rejected} listings to {self.spill_path}")
+        except Exception as e:
+            self._bump("failed", len(batch))
+            print(f"❌ Could not spill {len(batch)} listings to {self.spill_path}: {e!r}")
+            for _, on_written in batch:
+                notify(on_written, False)
@@ -0,0 +1,255 @@
+"""
+metrics.py
+
+In-process metrics for the scraper and the database writers: counters, gauges
+and fixed-bucket latency histograms, all labelled. Recording is a dict lookup
+and a few additions under one lock (a few microseconds against page loads of
+seconds), so it stays on in production.
+
+    with timed("parse"):
+        extract_listing_page(page_source, url)
+    inc("scraper_listings_total", source="detail")
+
+Two exports:
+- start_metrics_server(port): a local HTTP endpoint serving /metrics in the
+  Prometheus text format and /metrics.json,
+- JsonLinesExporter(path, interval): appends one JSON snapshot per interval
+  (and a last one on stop) with counters, gauges, and count/sum/p50/p90/p99
+  per histogram.
+
+Throughput gauges (`*_per_second`) are derived from the counters in
+THROUGHPUT_COUNTERS each time a snapshot is taken. Metrics are per process:
+browser pool workers hand theirs back with each task result (take_deltas) and
+the parent folds them into its own (merge_deltas), so only the main process
+is exported.
+"""
+
+import json
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Upper bounds in seconds; a page load is ~1-10 s, a parse or a DB batch is milliseconds.
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+DEFAULT_EXPORT_INTERVAL = 30.0
+
+METRICS = {
+    "scraper_stage_seconds": ("histogram", "Time spent per stage: pace, page_load, wait, parse, queue_put, "
+                                           "db_write, local_write."),
+    "scraper_pages_total": ("counter", "Page loads by outcome (ok, blocked, error)."),
+    "scraper_wait_timeouts_total": ("counter", "WebDriverWait readiness checks that timed out, by page kind."),
+    "scraper_listings_total": ("counter", "Listing records queued for writing, by source (detail, card)."),
+    "scraper_null_prices_total": ("counter", "Parsed listings that ended up without a price."),
+    "db_rows_written_total": ("counter", "Listing rows written to Postgres."),
+    "db_rows_rejected_total": ("counter", "Listing rows rejected by validation or the database."),
+    "db_errors_total": ("counter", "Database errors, by kind (batch, row, connection)."),
+    "db_retries_total": ("counter", "Write-behind batch retries after a lost connection."),
+    "db_write_queue_depth": ("gauge", "Records waiting in the write-behind queue."),
+}
+# Counters that get a derived `<name without _total>_per_second` gauge.
+THROUGHPUT_COUNTERS = ("scraper_pages_total", "scraper_listings_total", "db_rows_written_total")
+
+_lock = threading.Lock()
+_series = {}      # (name, labels) -> float, or _Histogram for histograms
+_rate_marks = {}  # counter name -> (monotonic time, total) at the last throughput update
+
+
+class _Histogram:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-th observation (None if past the last bucket)."""
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(LATENCY_BUCKETS, self.counts):
+            seen += n
+            if seen >= rank:
+                return bound
+        return None
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+def inc(name, n=1, **labels):
+    """Adds n to a counter."""
+    key = _key(name, labels)
+    with _lock:
+        _series[key] = _series.get(key, 0) + n
+
+def set_gauge(name, value, **labels):
+    key = _key(name, labels)
+    with _lock:
+        _series[key] = value
+
+def observe(name, value, **labels):
+    """Records one observation (in seconds) in a histogram."""
+    key = _key(name, labels)
+    with _lock:
+        histogram = _series.get(key)
+        if histogram is None:
+            histogram = _series[key] = _Histogram()
+        histogram.counts[bisect.bisect_left(LATENCY_BUCKETS, value)] += 1
+        histogram.sum += value
+        histogram.count += 1
+
+@contextmanager
+def timed(stage):
+    """Times the block into scraper_stage_seconds{stage=...}, including when it raises."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe("scraper_stage_seconds", time.perf_counter() - started, stage=stage)
+
+def reset():
+    with _lock:
+        _series.clear()
+        _rate_marks.clear()
+
+def take_deltas():
+    """
+    Counters and histograms recorded since the last call, as a picklable list, cleared here.
+    Gauges are left alone; they describe this process only.
+    """
+    with _lock:
+        keys = [key for key in _series if METRICS.get(key[0], ("gauge",))[0] != "gauge"]
+        deltas = []
+        for key in keys:
+            value = _series.pop(key)
+            if isinstance(value, _Histogram):
+                value = (value.counts, value.sum, value.count)
+            deltas.append((key, value))
+    return deltas
+
+def merge_deltas(deltas):
+    """Adds another process's take_deltas() into this process's series."""
+    with _lock:
+        for key, value in deltas:
+            if not isinstance(value, tuple):
+                _series[key] = _series.get(key, 0) + value
+                continue
+            histogram = _series.get(key)
+            if histogram is None:
+                histogram = _series[key] = _Histogram()
+            counts, total, count = value
+            histogram.counts = [a + b for a, b in zip(histogram.counts, counts)]
+            histogram.sum += total
+            histogram.count += count
+
+def _update_throughput():
+    now = time.monotonic()
+    for name in THROUGHPUT_COUNTERS:
+        total = sum(v for (n, _), v in _series.items() if n == name)
+        mark = _rate_marks.get(name)
+        # Rates over less than a second are noise; keep the previous value until a second has passed.
+        if mark is None or now - mark[0] >= 1.0:
+            if mark is not None:
+                _series[_key(name[:-len("_total")] + "_per_second", {})] = (total - mark[1]) / (now - mark[0])
+            _rate_marks[name] = (now, total)
+
+def _label_text(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+def snapshot():
+    """All series as a JSON-ready dict: counters, gauges and histogram summaries keyed by 'name{labels}'."""
+    with _lock:
+        _update_throughput()
+        items = [(name, labels, value if not isinstance(value, _Histogram) else
+                  {"count": value.count, "sum": value.sum, "p50": value.quantile(0.5),
+                   "p90": value.quantile(0.9), "p99": value.quantile(0.99)})
+                 for (name, labels), value in sorted(_series.items())]
+    result = {"time": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+              "counters": {}, "gauges": {}, "histograms": {}}
+    for name, labels, value in items:
+        kind = METRICS.get(name, ("gauge",))[0]
+        result[kind + "s"][name + _label_text(labels)] = value
+    return result
+
+def render_prometheus():
+    """All series in the Prometheus text exposition format."""
+    with _lock:
+        _update_throughput()
+        by_name = {}
+        for (name, labels), value in sorted(_series.items()):
+            if isinstance(value, _Histogram):
+                value = (list(value.counts), value.sum, value.count)
+            by_name.setdefault(name, []).append((labels, value))
+    lines = []
+    for name, series in by_name.items():
+        kind, help_text = METRICS.get(name, ("gauge", "Derived throughput."))
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in series:
+            if kind != "histogram":
+                lines.append(f"{name}{_label_text(labels)} {value}")
+                continue
+            counts, total, count = value
+            cumulative = 0
+            for bound, n in zip(LATENCY_BUCKETS + ("+Inf",), counts):
+                cumulative += n
+                lines.append(f"{name}_bucket{_label_text(labels, [('le', bound)])} {cumulative}")
+            lines.append(f"{name}_sum{_label_text(labels)} {total}")
+            lines.append(f"{name}_count{_label_text(labels)} {count}")
+    return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == "/metrics":
+            body, content_type = render_prometheus().encode(), "text/plain; version=0.0.4"
+        elif self.path == "/metrics.json":
+            body, content_type = json.dumps(snapshot()).encode(), "application/json"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_metrics_server(port, host="127.0.0.1"):
+    """Serves /metrics and /metrics.json from a daemon thread. Returns the server (shutdown() stops it)."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    print(f"📈 Metrics at http://{host}:{server.server_address[1]}/metrics")
+    return server
+
+
+class JsonLinesExporter:
+    """Appends a metrics snapshot to a JSON-lines file every `interval` seconds and once more on stop()."""
+
+    def __init__(self, path, interval=DEFAULT_EXPORT_INTERVAL):
+        self.path = path
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name="metrics-jsonl", daemon=True)
+        self._thread.start()
+
+    def write(self):
+        with open(self.path, "a") as f:
+            f.write(json.dumps(snapshot()) + "\n")
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            self.write()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.write()
@@ -0,0 +1,231 @@
+"""
+features.py
+
+Feature extraction from the listings table into a local columnar cache.
+
+Rows are streamed out of Postgres through a server-side (named) cursor in
+chunks, so memory stays flat however big the table is, and written as Parquet
+files partitioned by the date of their `timestamp` (the scrape time):
+
+    feature_cache/date=2026-10-16/part-<watermark>-<n>-<refresh>.parquet
+
+Rows are read in order of `written_at`, the time Postgres last wrote them; a
+row synced from the local store can be scraped long before it is written. A
+watermark (the last (written_at, listing_id) read) is saved after every chunk,
+so each refresh reads only the rows written since the previous one and an
+interrupted refresh resumes from the last finished chunk. The upserts set
+`written_at` on every write, so a re-scraped listing shows up in the delta; the
+loader keeps the newest row per listing.
+
+`written_at` is the writing transaction's start time (NOW()), and a transaction
+can commit after a refresh has already read past that time. So a refresh
+re-reads WATERMARK_OVERLAP before the watermark and skips the
+(listing_id, written_at) rows the cache already holds; a row committed up to
+that long after it was stamped is still picked up. The <watermark> in a file
+name is the newest `written_at` in it, so only the files written since the
+overlap window began are checked.
+
+Loading is memory-mapped and column-pruned: only the requested columns are read
+from disk.
+
+    python regression_model_modules/features.py     # pull the delta into the cache
+"""
+
+import os
+import sys
+import json
+import uuid
+from datetime import datetime, timedelta
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from pyarrow import fs
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from database_modules.database import get_db_connection
+
+FEATURE_CACHE_DIR = os.environ.get("FEATURE_CACHE_DIR", os.path.join(os.path.dirname(__file__), "feature_cache"))
+WATERMARK_FILE = "_watermark.json"
+CHUNK_ROWS = 50_000
+# How long a listings write may stay open before it commits; rows stamped this long before the
+# watermark are read again in case they committed after the last refresh.
+WATERMARK_OVERLAP = timedelta(seconds=float(os.environ.get("FEATURE_WATERMARK_OVERLAP_SECONDS", 600)))
+
+LISTING_SCHEMA = pa.schema([
+    ("listing_id", pa.string()),
+    ("city", pa.string()),
+    ("zipcode", pa.string()),
+    ("room_type", pa.string()),
+    ("bedroom_count", pa.int32()),
+    ("bathroom_count", pa.float64()),
+    ("price", pa.float64()),
+    ("timestamp", pa.timestamp("us")),
+    ("written_at", pa.timestamp("us")),
+])
+# The schema is given explicitly so files cached before written_at existed read it as null.
+DATASET_SCHEMA = LISTING_SCHEMA.append(pa.field("date", pa.string()))
+FILE_TAG_FORMAT = "%Y%m%dT%H%M%S%f"
+
+# listings columns -> the feature names sample_model.py trains on.
+MODEL_FEATURE_NAMES = {"price": "Nightly Price", "bedroom_count": "Bedrooms", "bathroom_count": "Bathrooms"}
+
+DELTA_QUERY = """
+    SELECT listing_id, city, zipcode, room_type, bedroom_count, bathroom_count, price, timestamp, written_at
+    FROM listings
+    WHERE written_at > %s
+    ORDER BY written_at, listing_id;
+"""
+
+
+def read_watermark(cache_dir=FEATURE_CACHE_DIR):
+    """Returns the (written_at ISO string, listing_id) last written to the cache, or None."""
+    path = os.path.join(cache_dir, WATERMARK_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        mark = json.load(f)
+    # Caches from before written_at existed saved the row timestamp; it is never later, so the next
+    # refresh reads everything written since.
+    return mark.get("written_at", mark.get("timestamp")), mark["listing_id"]
+
+def write_watermark(cache_dir, written_at, listing_id):
+    path = os.path.join(cache_dir, WATERMARK_FILE)
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump({"written_at": written_at.isoformat(), "listing_id": listing_id}, f)
+    os.replace(tmp, path)
+
+def write_partitioned_chunk(rows, cache_dir, chunk_number, refresh_id=""):
+    """
+    Writes one chunk of listings rows into partitions by the date of their timestamp. Rows arrive
+    sorted by written_at, so the last one's names the files.
+    """
+    by_date = {}
+    for row in rows:
+        by_date.setdefault(row[7].date().isoformat(), []).append(row)
+    tag = rows[-1][-1].strftime(FILE_TAG_FORMAT)
+    for day, day_rows in by_date.items():
+        columns = list(zip(*day_rows))
+        table = pa.Table.from_arrays([
+            pa.array(columns[0], pa.string()),
+            pa.array(columns[1], pa.string()),
+            pa.array(columns[2], pa.string()),
+            pa.array(columns[3], pa.string()),
+            pa.array(columns[4], pa.int32()),
+            pa.array([float(v) if v is not None else None for v in columns[5]], pa.float64()),
+            pa.array([float(v) if v is not None else None for v in columns[6]], pa.float64()),
+            pa.array(columns[7], pa.timestamp("us")),
+            pa.array(columns[8], pa.timestamp("us")),
+        ], schema=LISTING_SCHEMA)
+        partition = os.path.join(cache_dir, f"date={day}")
+        os.makedirs(partition, exist_ok=True)
+        name = f"part-{tag}-{chunk_number}{'-' + refresh_id if refresh_id else ''}.parquet"
+        # Written under a temp name first so a crash never leaves a half-written file in the dataset;
+        # the leading "_" keeps the loader (ignore_prefixes) from ever opening it.
+        tmp = os.path.join(partition, f"_{name}.tmp")
+        pq.write_table(table, tmp)
+        os.replace(tmp, os.path.join(partition, name))
+
+def cached_row_keys(cache_dir, since):
+    """
+    The (listing_id, written_at) pairs already cached for rows written after `since`. Only files
+    whose tag (their newest written_at) is after `since` can hold any.
+    """
+    keys = set()
+    for partition in os.scandir(cache_dir):
+        if not (partition.is_dir() and partition.name.startswith("date=")):
+            continue
+        for part in os.scandir(partition.path):
+            if not (part.name.startswith("part-") and part.name.endswith(".parquet")):
+                continue
+            if datetime.strptime(part.name.split("-")[1], FILE_TAG_FORMAT) <= since:
+                continue
+            if "written_at" not in pq.read_schema(part.path).names:
+                continue  # cached before written_at existed, so tagged by timestamp instead
+            table = pq.read_table(part.path, columns=["listing_id", "written_at"], memory_map=True)
+            keys.update(zip(table["listing_id"].to_pylist(), table["written_at"].to_pylist()))
+    return keys
+
+def refresh_feature_cache(conn=None, cache_dir=FEATURE_CACHE_DIR, chunk_rows=CHUNK_ROWS,
+                          overlap=WATERMARK_OVERLAP):
+    """
+    Streams every listings row written since the watermark (less `overlap`, see the module
+    docstring) into the cache, skipping rows it already holds. Returns the number of rows written.
+    Needs the listings.written_at column that database.create_table adds.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    own_conn = conn is None
+    conn = conn or get_db_connection()
+    watermark = read_watermark(cache_dir)
+    latest = datetime.fromisoformat(watermark[0]) if watermark else None
+    since, cached = "-infinity", set()
+    if latest is not None:
+        since = latest - overlap
+        cached = cached_row_keys(cache_dir, since)
+    refresh_id = uuid.uuid4().hex[:8]
+    written = 0
+    try:
+        # A named cursor keeps the result set on the server; only chunk_rows rows cross per fetch.
+        cur = conn.cursor(name="listing_features_delta")
+        cur.itersize = chunk_rows
+        cur.execute(DELTA_QUERY, (since,))
+        chunk_number = 0
+        while True:
+            fetched = cur.fetchmany(chunk_rows)
+            if not fetched:
+                break
+            rows = [row for row in fetched if (row[0], row[-1]) not in cached]
+            if rows:
+                write_partitioned_chunk(rows, cache_dir, chunk_number, refresh_id)
+                chunk_number += 1
+                written += len(rows)
+                print(f"📦 Cached {written} listing rows (up to {rows[-1][-1]})")
+            # The overlap re-reads rows older than the watermark; it never moves back.
+            if latest is None or fetched[-1][-1] > latest:
+                latest = fetched[-1][-1]
+                write_watermark(cache_dir, latest, fetched[-1][0])
+        cur.close()
+        conn.commit()
+    finally:
+        if own_conn:
+            conn.close()
+    if not written:
+        print("📦 Feature cache is already up to date")
+    return written
+
+def load_features(columns=None, cache_dir=FEATURE_CACHE_DIR, since=None, latest_only=True):
+    """
+    Loads the cached listings as a DataFrame, reading only `columns` (plus listing_id and
+    timestamp) through memory-mapped files. `since` (a datetime) reads only rows scraped after it,
+    skipping older date partitions entirely. With latest_only, each listing keeps its newest row.
+    A missing or empty cache gives an empty DataFrame with the same columns.
+    """
+    wanted = list(dict.fromkeys((columns or LISTING_SCHEMA.names) + ["listing_id", "timestamp"]))
+    if not os.path.isdir(cache_dir):
+        return pd.DataFrame(columns=wanted)
+    dataset = ds.dataset(cache_dir, format="parquet", partitioning="hive", schema=DATASET_SCHEMA,
+                         filesystem=fs.LocalFileSystem(use_mmap=True),
+                         exclude_invalid_files=True, ignore_prefixes=["_", "."])
+    # With no files the dataset has no schema (not even the date partition), so a column lookup would fail.
+    if not dataset.files:
+        return pd.DataFrame(columns=wanted)
+    row_filter = None
+    if since is not None:
+        since = pd.Timestamp(since)
+        row_filter = (ds.field("date") >= since.date().isoformat()) & (ds.field("timestamp") > since)
+    df = dataset.to_table(columns=wanted, filter=row_filter).to_pandas()
+    if latest_only and not df.empty:
+        df = df.sort_values("timestamp").drop_duplicates("listing_id", keep="last")
+    return df.reset_index(drop=True)
+
+def load_model_features(extra_columns=(), cache_dir=FEATURE_CACHE_DIR):
+    """
+    The listing features sample_model.py values, renamed to its column names, plus `extra_columns`
+    as they are. Complete rows only.
+    """
+    columns = list(extra_columns) + list(MODEL_FEATURE_NAMES)
+    df = load_features(columns, cache_dir)
+    return df[columns].rename(columns=MODEL_FEATURE_NAMES).dropna()
+
+if __name__ == "__main__":
+    refresh_feature_cache()
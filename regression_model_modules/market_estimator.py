@@ -0,0 +1,145 @@
+"""
+market_estimator.py
+
+Market size and portfolio value from capture-recapture over the scraper's own
+search passes.
+
+Every search pass of a ZIP uses freshly randomized dates, guests and price
+range, so two passes are two independent-ish samples ("captures") of the
+ZIP's listings. The crawl state records which listings each pass saw. With n1
+and n2 listings in the two most recent passes and m seen by both, Chapman's
+estimator gives the number of listings:
+
+    N = (n1 + 1)(n2 + 1) / (m + 1) - 1
+
+Estimates are made per ZIP and per city. For a city, the two occasions are the
+unions of its ZIPs' passes, so listings shared by neighbouring ZIPs are counted
+once. The portfolio value is the sum over cities of N times the mean predicted
+value of that city's listings.
+
+Confidence intervals come from a bootstrap:
+- Resample each city's capture histories (seen in both passes / only the first
+  / only the second) multinomially.
+- Resample its listing values with replacement.
+Both are done as NumPy array operations, one block of resamples per process.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+DEFAULT_RESAMPLES = 5000
+DEFAULT_CONFIDENCE = 0.95
+# Rows of the value resampling matrix built at once (rows x listings indices).
+VALUE_RESAMPLE_ROWS = 256
+
+
+def chapman(n1, n2, m):
+    """Chapman's bias-corrected Lincoln-Petersen estimate; works elementwise on arrays."""
+    return (np.asarray(n1) + 1) * (np.asarray(n2) + 1) / (np.asarray(m) + 1) - 1
+
+def capture_counts(passes_by_zip):
+    """
+    From {(city, zipcode): [newest pass's listing IDs, previous pass's, ...]} (CrawlState.latest_search_passes),
+    returns (zipcodes, cities): {(city, zipcode): (n1, n2, m)} and {city: (n1, n2, m)} for every ZIP
+    and city with at least two passes.
+    """
+    zipcodes = {}
+    city_occasions = {}
+    for (city, zip_code), passes in passes_by_zip.items():
+        if len(passes) < 2:
+            continue
+        first, second = passes[1], passes[0]
+        zipcodes[(city, zip_code)] = (len(first), len(second), len(first & second))
+        occasions = city_occasions.setdefault(city, (set(), set()))
+        occasions[0].update(first)
+        occasions[1].update(second)
+    cities = {city: (len(a), len(b), len(a & b)) for city, (a, b) in city_occasions.items()}
+    return zipcodes, cities
+
+def _resampled_means(rng, values, resamples):
+    """Bootstrap means of `values`, resamples x len(values) draws made a block of rows at a time."""
+    means = np.empty(resamples)
+    for start in range(0, resamples, VALUE_RESAMPLE_ROWS):
+        rows = min(VALUE_RESAMPLE_ROWS, resamples - start)
+        picks = rng.integers(0, len(values), size=(rows, len(values)), dtype=np.int32)
+        means[start:start + rows] = values[picks].mean(axis=1)
+    return means
+
+def _bootstrap_block(histories, city_values, resamples, seed):
+    """
+    One process's share of the bootstrap. histories is a (cities x 3) array of (both, only first,
+    only second) counts. Returns (listings, values), each resamples x cities.
+    """
+    rng = np.random.default_rng(seed)
+    listings = np.empty((resamples, len(histories)))
+    values = np.empty((resamples, len(histories)))
+    for c, counts in enumerate(histories):
+        draws = rng.multinomial(counts.sum(), counts / counts.sum(), size=resamples)
+        both = draws[:, 0]
+        listings[:, c] = chapman(both + draws[:, 1], both + draws[:, 2], both)
+        values[:, c] = listings[:, c] * _resampled_means(rng, city_values[c], resamples)
+    return listings, values
+
+def _interval(samples, confidence):
+    tail = (1 - confidence) / 2 * 100
+    low, high = np.percentile(samples, [tail, 100 - tail], axis=0)
+    return low, high
+
+def estimate_market(passes_by_zip, values_by_city, default_values=None, resamples=DEFAULT_RESAMPLES,
+                    confidence=DEFAULT_CONFIDENCE, workers=None, seed=0):
+    """
+    Estimates listings and portfolio value per city and in total, with bootstrap intervals.
+
+    values_by_city maps a city to an array of predicted property values for its scraped listings;
+    cities without one use default_values. Cities with neither are left out of the value totals
+    but still get a listing count. workers is the number of processes (default: all cores).
+    """
+    zipcodes, cities = capture_counts(passes_by_zip)
+    result = {
+        "zipcodes": {key: {"observed": n1 + n2 - m, "estimated_listings": float(chapman(n1, n2, m))}
+                     for key, (n1, n2, m) in zipcodes.items()},
+        "cities": {},
+        "resamples": resamples,
+        "confidence": confidence,
+    }
+    names = [city for city, (n1, n2, m) in cities.items()
+             if n1 + n2 > m and (city in values_by_city or default_values is not None)]
+    if not names:
+        result["cities"] = {city: {"observed": n1 + n2 - m, "estimated_listings": float(chapman(n1, n2, m))}
+                            for city, (n1, n2, m) in cities.items()}
+        return result
+    histories = np.array([[m, n1 - m, n2 - m] for n1, n2, m in (cities[city] for city in names)], dtype=float)
+    city_values = [np.asarray(values_by_city.get(city, default_values), dtype=float) for city in names]
+
+    workers = workers or os.cpu_count() or 1
+    blocks = [len(b) for b in np.array_split(np.arange(resamples), workers) if len(b)]
+    seeds = np.random.SeedSequence(seed).spawn(len(blocks))
+    if len(blocks) == 1:
+        parts = [_bootstrap_block(histories, city_values, blocks[0], seeds[0])]
+    else:
+        with ProcessPoolExecutor(max_workers=len(blocks)) as executor:
+            parts = list(executor.map(_bootstrap_block, [histories] * len(blocks), [city_values] * len(blocks),
+                                      blocks, seeds))
+    listings = np.concatenate([p[0] for p in parts])
+    values = np.concatenate([p[1] for p in parts])
+
+    listings_low, listings_high = _interval(listings, confidence)
+    values_low, values_high = _interval(values, confidence)
+    for c, city in enumerate(names):
+        n1, n2, m = cities[city]
+        estimated = float(chapman(n1, n2, m))
+        mean_value = float(city_values[c].mean())
+        result["cities"][city] = {
+            "observed": n1 + n2 - m,
+            "estimated_listings": estimated,
+            "listings_ci": (float(listings_low[c]), float(listings_high[c])),
+            "mean_value": mean_value,
+            "value": estimated * mean_value,
+            "value_ci": (float(values_low[c]), float(values_high[c])),
+        }
+    result["total_listings"] = sum(c["estimated_listings"] for c in result["cities"].values())
+    result["total_listings_ci"] = tuple(float(x) for x in _interval(listings.sum(axis=1), confidence))
+    result["total_value"] = sum(c["value"] for c in result["cities"].values())
+    result["total_value_ci"] = tuple(float(x) for x in _interval(values.sum(axis=1), confidence))
+    return result
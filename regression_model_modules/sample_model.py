@@ -1,34 +1,78 @@
+import os
+import sys
 from sklearn.model_selection import train_test_split
 from sklearn.ensemble import RandomForestRegressor
 import pandas as pd
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from regression_model_modules.features import FEATURE_CACHE_DIR, load_model_features
+from regression_model_modules.market_estimator import estimate_market
+from regression_model_modules.train import load_model
+from scraper_modules.crawl_state import CRAWL_STATE_FILE, CrawlState
 
-# Load Sampled Airbnb + Real Estate Data
-df = pd.read_csv("sample_airbnb_data.csv")
 
-# Define Features and Target
-features = ["Nightly Price", "Bedrooms", "Bathrooms", "Occupancy Rate"]
-X = df[features]
-y = df["Property Value"]  # Known property value from real estate data
+def main():
+    """Trains (or loads) the value model and estimates the total Airbnb property value.
+    Runs only under __main__: the market estimator's process pool re-imports this module on spawn."""
+    # Load Sampled Airbnb + Real Estate Data
+    df = pd.read_csv("sample_airbnb_data.csv")
 
-# Train/Test Split
-X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+    # Define Features and Target
+    features = ["Nightly Price", "Bedrooms", "Bathrooms", "Occupancy Rate"]
+    X = df[features]
+    y = df["Property Value"]  # Known property value from real estate data
 
-# Train Regression Model
-model = RandomForestRegressor(n_estimators=100, random_state=42)
-model.fit(X_train, y_train)
+    # Train/Test Split
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
 
-# Evaluate Model Performance
-predicted_values = model.predict(X_test)
-mae = abs(predicted_values - y_test).mean()
-print(f"Mean Absolute Error: ${mae:,.2f}")
+    # Use the latest model registered by train.py (memory-mapped, no refit); train one here if there is none.
+    model, model_entry = load_model()
+    if model is None:
+        model = RandomForestRegressor(n_estimators=100, random_state=42, n_jobs=-1)
+        model.fit(X_train, y_train)
+    else:
+        print(f"Loaded model v{model_entry['version']} (trained {model_entry['trained_at']}, MAE ${model_entry['mae']:,.2f})")
 
-# Predict average property value from the sample
-average_predicted_value = model.predict(X).mean()
+    # Evaluate Model Performance
+    predicted_values = model.predict(X_test)
+    mae = abs(predicted_values - y_test).mean()
+    print(f"Mean Absolute Error: ${mae:,.2f}")
 
-# Estimated total Airbnb listings (using capture-recapture or search pagination)
-estimated_total_listings = 500_000  # Replace with your estimation
+    # Predict average property value from the sample
+    average_predicted_value = model.predict(X).mean()
 
-# Calculate total estimated property value
-total_airbnb_property_value = average_predicted_value * estimated_total_listings
-print(f"Estimated Total Airbnb Property Value: ${total_airbnb_property_value:,.2f}")
+    # Value the scraped listings as well, once features.py has filled the feature cache.
+    # Occupancy isn't scraped, so the sample's median occupancy stands in for it.
+    values_by_city = {}
+    if os.path.isdir(FEATURE_CACHE_DIR):
+        scraped = load_model_features(["city"])
+        if not scraped.empty:
+            scraped["Occupancy Rate"] = df["Occupancy Rate"].median()
+            scraped["value"] = model.predict(scraped[features])
+            print(f"Average predicted value over {len(scraped):,} scraped listings: ${scraped['value'].mean():,.2f}")
+            values_by_city = {city: group["value"].to_numpy() for city, group in scraped.groupby("city")}
 
+    # Estimated total Airbnb listings: capture-recapture over the scraper's search passes when the crawl
+    # state has at least two passes of a ZIP (see market_estimator.py), otherwise a fixed guess.
+    estimated_total_listings = 500_000  # Replace with your estimation
+    market = None
+    if os.path.exists(CRAWL_STATE_FILE):
+        crawl_state = CrawlState(CRAWL_STATE_FILE)
+        passes_by_zip = crawl_state.latest_search_passes()
+        crawl_state.close()
+        market = estimate_market(passes_by_zip, values_by_city, default_values=model.predict(X))
+
+    if market and "total_value" in market:
+        for city, estimate in market["cities"].items():
+            low, high = estimate["listings_ci"]
+            print(f"{city}: ~{estimate['estimated_listings']:,.0f} listings ({low:,.0f}-{high:,.0f}), "
+                  f"{estimate['observed']:,} seen")
+        low, high = market["total_value_ci"]
+        print(f"Estimated Total Airbnb Property Value: ${market['total_value']:,.2f} "
+              f"({market['confidence']:.0%} CI ${low:,.2f} - ${high:,.2f})")
+    else:
+        # Calculate total estimated property value
+        total_airbnb_property_value = average_predicted_value * estimated_total_listings
+        print(f"Estimated Total Airbnb Property Value: ${total_airbnb_property_value:,.2f}")
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,210 @@
+"""
+valuation.py
+
+Long-lived property valuation API.
+
+ValuationService keeps a fitted model in memory (loaded memory-mapped from the
+registry, see train.py) and answers single or bulk requests for
+(nightly price, bedrooms, bathrooms, occupancy rate):
+- concurrent single calls are micro-batched: a batching thread collects
+  whatever requests arrive within a couple of milliseconds (up to max_batch)
+  and values them with one vectorized predict call,
+- bulk calls go straight to one predict call,
+- repeated feature tuples are answered from an LRU cache without touching the
+  model.
+
+    service = ValuationService()
+    service.value(185.0, 2, 1, 0.72)
+    service.value_many([(185.0, 2, 1, 0.72), (420.0, 4, 3, 0.55)])
+
+benchmarks/bench_valuation.py measures p50/p99 latency and throughput under load.
+
+From the command line, value one property or a CSV of them:
+
+    python regression_model_modules/valuation.py --property 185 2 1 0.72
+    python regression_model_modules/valuation.py --input rows.csv --output valued.csv
+"""
+
+import os
+import sys
+import time
+import queue
+import argparse
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+import pandas as pd
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from regression_model_modules.train import FEATURES, TARGET, load_model
+
+DEFAULT_MAX_BATCH = 256
+DEFAULT_MAX_WAIT_MS = 2.0
+DEFAULT_CACHE_SIZE = 50_000
+
+
+class LRUCache:
+    """Thread-safe LRU map from feature tuples to predicted values."""
+
+    def __init__(self, max_size=DEFAULT_CACHE_SIZE):
+        self.max_size = max_size
+        self.items = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self.items.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self.items.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put_many(self, pairs):
+        if not self.max_size:
+            return
+        with self._lock:
+            for key, value in pairs:
+                self.items[key] = value
+                self.items.move_to_end(key)
+            while len(self.items) > self.max_size:
+                self.items.popitem(last=False)
+
+
+def feature_key(price, bedrooms, bathrooms, occupancy):
+    """Normalizes one request into a hashable feature tuple (cents, counts, 4-digit occupancy)."""
+    return (round(float(price), 2), float(bedrooms), float(bathrooms), round(float(occupancy), 4))
+
+
+class ValuationService:
+    """In-memory model behind a micro-batching queue and an LRU feature cache."""
+
+    def __init__(self, model=None, max_batch=DEFAULT_MAX_BATCH, max_wait_ms=DEFAULT_MAX_WAIT_MS,
+                 cache_size=DEFAULT_CACHE_SIZE):
+        if model is None:
+            model, entry = load_model()
+            if model is None:
+                raise RuntimeError("No trained model found; run regression_model_modules/train.py first.")
+            print(f"🧠 Valuation service using model v{entry['version']} (MAE ${entry['mae']:,.2f})")
+        self.model = model
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.cache = LRUCache(cache_size)
+        self.stats = {"requests": 0, "batches": 0, "batched_rows": 0}
+        self._requests = queue.Queue()
+        self._closed = False
+        self._batcher = threading.Thread(target=self._batch_loop, name="valuation-batcher", daemon=True)
+        self._batcher.start()
+
+    def _predict(self, keys):
+        """One vectorized predict call for a list of feature tuples; fills the cache."""
+        values = self.model.predict(pd.DataFrame(keys, columns=FEATURES))
+        self.cache.put_many(zip(keys, values))
+        self.stats["batches"] += 1
+        self.stats["batched_rows"] += len(keys)
+        return values
+
+    def _batch_loop(self):
+        while True:
+            item = self._requests.get()
+            if item is None:
+                return
+            batch = [item]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._requests.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._requests.put(None)
+                    break
+                batch.append(item)
+            # The same tuple can be requested several times within one batch; predict it once.
+            unique_keys = list(dict.fromkeys(key for key, _ in batch))
+            try:
+                values = dict(zip(unique_keys, self._predict(unique_keys)))
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for key, future in batch:
+                future.set_result(float(values[key]))
+
+    def submit(self, price, bedrooms, bathrooms, occupancy):
+        """Queues one valuation and returns a Future for it (resolved at once on a cache hit)."""
+        if self._closed:
+            raise RuntimeError("ValuationService is closed.")
+        self.stats["requests"] += 1
+        key = feature_key(price, bedrooms, bathrooms, occupancy)
+        future = Future()
+        cached = self.cache.get(key)
+        if cached is not None:
+            future.set_result(float(cached))
+        else:
+            self._requests.put((key, future))
+        return future
+
+    def value(self, price, bedrooms, bathrooms, occupancy, timeout=None):
+        """Values one property. Concurrent callers share batched predict calls."""
+        return self.submit(price, bedrooms, bathrooms, occupancy).result(timeout)
+
+    def value_many(self, rows):
+        """Values (price, bedrooms, bathrooms, occupancy) rows with one predict call for the uncached ones."""
+        keys = [feature_key(*row) for row in rows]
+        self.stats["requests"] += len(keys)
+        results = [self.cache.get(key) for key in keys]
+        missing = list(dict.fromkeys(key for key, value in zip(keys, results) if value is None))
+        if missing:
+            values = dict(zip(missing, self._predict(missing)))
+            results = [value if value is not None else values[key] for key, value in zip(keys, results)]
+        return [float(value) for value in results]
+
+    def close(self):
+        self._closed = True
+        self._requests.put(None)
+        self._batcher.join(timeout=5)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def main(argv=None, prog=None):
+    parser = argparse.ArgumentParser(prog=prog, description="Value properties with a registered model.")
+    parser.add_argument("--property", nargs=4, type=float, metavar=("PRICE", "BEDROOMS", "BATHROOMS", "OCCUPANCY"),
+                        help="Value one property.")
+    parser.add_argument("--input", help=f"CSV with the columns {', '.join(FEATURES)}.")
+    parser.add_argument("--output", help=f"Write the input with a '{TARGET}' column here (default: print it).")
+    parser.add_argument("--model-version", type=int, default=None, help="Registered model version (default latest).")
+    args = parser.parse_args(argv)
+    if not args.property and not args.input:
+        parser.error("give --property or --input")
+
+    model, entry = load_model(args.model_version)
+    if model is None:
+        print("❌ No trained model found; run regression_model_modules/train.py first.")
+        return 1
+    with ValuationService(model) as service:
+        print(f"🧠 Using model v{entry['version']} (MAE ${entry['mae']:,.2f})")
+        if args.property:
+            print(f"🏠 Estimated value: ${service.value(*args.property):,.2f}")
+        if args.input:
+            df = pd.read_csv(args.input)
+            df[TARGET] = service.value_many(df[FEATURES].itertuples(index=False, name=None))
+            if args.output:
+                df.to_csv(args.output, index=False)
+                print(f"🏠 Valued {len(df):,} properties -> {args.output}")
+            else:
+                print(df.to_string(index=False))
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
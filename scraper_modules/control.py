@@ -0,0 +1,214 @@
+"""
+control.py
+
+Remote control for a running crawl: pause, resume, throttle, and change the
+number of browser workers without restarting.
+
+CrawlControl holds the settings in multiprocessing primitives, so browser pool
+workers see a change as soon as the parent makes it:
+- paused: workers and the single-driver loop block before their next page
+  load (checked in paced_get / fetch_page),
+- throttle: a factor on every host's request rate (0.5 = half speed),
+- workers: the target browser process count; the pool starts or retires
+  processes to match (only for --workers > 1 runs).
+
+start_control_server(control, port) exposes it over local HTTP:
+
+    curl localhost:8766/status
+    curl -X POST localhost:8766/pause
+    curl -X POST localhost:8766/resume
+    curl -X POST 'localhost:8766/throttle?factor=0.5'
+    curl -X POST 'localhost:8766/workers?count=6'
+
+or `python cli.py control pause` (see main below). Each process activates its
+control once; the module-level helpers are no-ops when none is active.
+"""
+
+import json
+import asyncio
+import argparse
+import threading
+import multiprocessing as mp
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+DEFAULT_CONTROL_PORT = 8766
+MIN_THROTTLE = 0.05
+MAX_THROTTLE = 4.0
+MAX_WORKERS = 32
+PAUSE_POLL_SECONDS = 0.5
+
+
+class CrawlControl:
+    """Pause flag, throttle factor and target worker count, shared with worker processes."""
+
+    def __init__(self, workers=1, resizable=False):
+        self.resizable = resizable
+        self._running = mp.Event()
+        self._running.set()
+        self._throttle = mp.Value("d", 1.0)
+        self._workers = mp.Value("i", workers)
+
+    @property
+    def paused(self):
+        return not self._running.is_set()
+
+    @property
+    def throttle(self):
+        return self._throttle.value
+
+    @property
+    def workers(self):
+        return self._workers.value
+
+    def pause(self):
+        self._running.clear()
+        print("⏸️ Paused scraping...")
+
+    def resume(self):
+        self._running.set()
+        print("▶️ Resuming scraping...")
+
+    def set_throttle(self, factor):
+        """Scales every host's request rate by factor (clamped to MIN_THROTTLE..MAX_THROTTLE)."""
+        factor = min(MAX_THROTTLE, max(MIN_THROTTLE, float(factor)))
+        self._throttle.value = factor
+        print(f"🎚️ Throttle set to {factor:g}x")
+        return factor
+
+    def set_workers(self, count):
+        """Sets the target worker count; the browser pool picks it up on its next poll."""
+        if not self.resizable:
+            raise ValueError("this crawl has no browser pool to resize (start it with --workers > 1)")
+        count = int(count)
+        if not 1 <= count <= MAX_WORKERS:
+            raise ValueError(f"worker count must be between 1 and {MAX_WORKERS}")
+        self._workers.value = count
+        print(f"🧵 Target worker count set to {count}")
+        return count
+
+    def worker_share(self):
+        """Rate factor for one pool worker: the throttle split evenly across the current workers."""
+        return self.throttle / max(1, self.workers)
+
+    def wait_while_paused(self):
+        self._running.wait()
+
+    async def wait_while_paused_async(self):
+        while not self._running.is_set():
+            await asyncio.sleep(PAUSE_POLL_SECONDS)
+
+    def status(self):
+        return {"paused": self.paused, "throttle": self.throttle, "workers": self.workers,
+                "resizable": self.resizable}
+
+
+# The control this process obeys (set by the scraper's main and by each pool worker).
+_active = None
+
+def activate(control):
+    global _active
+    _active = control
+
+def wait_if_paused():
+    if _active is not None:
+        _active.wait_while_paused()
+
+async def wait_if_paused_async():
+    if _active is not None:
+        await _active.wait_while_paused_async()
+
+def throttle_factor():
+    return _active.throttle if _active is not None else 1.0
+
+
+class _ControlHandler(BaseHTTPRequestHandler):
+    def _reply(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if urlparse(self.path).path == "/status":
+            self._reply(200, self.server.control.status())
+        else:
+            self._reply(404, {"error": "not found"})
+
+    def do_POST(self):
+        control = self.server.control
+        url = urlparse(self.path)
+        params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        try:
+            if url.path == "/pause":
+                control.pause()
+            elif url.path == "/resume":
+                control.resume()
+            elif url.path == "/throttle":
+                control.set_throttle(params["factor"])
+            elif url.path == "/workers":
+                control.set_workers(params["count"])
+            else:
+                self._reply(404, {"error": "not found"})
+                return
+        except KeyError as e:
+            self._reply(400, {"error": f"missing parameter {e.args[0]}"})
+            return
+        except ValueError as e:
+            self._reply(400, {"error": str(e)})
+            return
+        self._reply(200, control.status())
+
+    def log_message(self, format, *args):
+        pass
+
+def start_control_server(control, port=DEFAULT_CONTROL_PORT, host="127.0.0.1"):
+    """Serves the control endpoints from a daemon thread. Returns the server (shutdown() stops it)."""
+    server = ThreadingHTTPServer((host, port), _ControlHandler)
+    server.control = control
+    threading.Thread(target=server.serve_forever, name="control-server", daemon=True).start()
+    print(f"🎛️ Crawl control at http://{host}:{server.server_address[1]} (pause, resume, throttle, workers)")
+    return server
+
+
+def send_command(command, value=None, port=DEFAULT_CONTROL_PORT, host="127.0.0.1"):
+    """Sends one command to a running crawl and returns its status dict."""
+    if command == "status":
+        request = urllib.request.Request(f"http://{host}:{port}/status")
+    else:
+        query = {"throttle": f"?factor={value}", "workers": f"?count={value}"}.get(command, "")
+        request = urllib.request.Request(f"http://{host}:{port}/{command}{query}", method="POST")
+    try:
+        with urllib.request.urlopen(request, timeout=10) as response:
+            return json.load(response)
+    except urllib.error.HTTPError as e:
+        raise ValueError(json.load(e).get("error", str(e))) from None
+
+def main(argv=None, prog=None):
+    parser = argparse.ArgumentParser(prog=prog, description="Control a running crawl.")
+    parser.add_argument("command", choices=["status", "pause", "resume", "throttle", "workers"])
+    parser.add_argument("value", nargs="?", type=float,
+                        help="Rate factor for 'throttle' (e.g. 0.5), worker count for 'workers'.")
+    parser.add_argument("--port", type=int, default=DEFAULT_CONTROL_PORT,
+                        help=f"The crawl's --control-port (default {DEFAULT_CONTROL_PORT}).")
+    args = parser.parse_args(argv)
+    if args.command in ("throttle", "workers") and args.value is None:
+        parser.error(f"'{args.command}' needs a value")
+    value = int(args.value) if args.command == "workers" else args.value
+    try:
+        status = send_command(args.command, value, port=args.port)
+    except ValueError as e:
+        print(f"❌ {e}")
+        return 1
+    except OSError as e:
+        print(f"❌ No crawl listening on port {args.port}: {e}")
+        return 1
+    print(json.dumps(status))
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
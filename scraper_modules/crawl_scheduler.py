@@ -0,0 +1,173 @@
+"""
+crawl_scheduler.py
+
+Yield-driven ordering of the ZIP codes to crawl.
+
+Instead of walking cities_and_zipcodes.json in file order, every ZIP gets an
+estimate of how many fresh, unique listings one crawl of it would produce and
+how many page loads that crawl costs (search pages plus one detail page per
+listing to refresh). The estimate comes from:
+- the crawl state: listings found, search pages loaded and listings the ZIP
+  claimed first (i.e. not duplicates of a neighbouring ZIP) on its last crawl,
+  and when that was,
+- the listing store: how many of the ZIP's stored listings are older than the
+  freshness TTL.
+ZIPs never crawled get their city's average, so newly added ZIPs are explored.
+
+A page-load budget is split across cities in proportion to their expected
+yield, and each city spends its share on its best yield-per-page ZIPs first;
+whatever a city can't use goes to the best remaining ZIPs anywhere. Coverage
+can be widened with every ZIP ZipcodeBase lists for a city.
+"""
+
+import os
+import sys
+import math
+import time
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from scraper_modules.listing_scraper import MAX_SEARCH_PAGES, RESULTS_PER_PAGE
+
+# Assumed for a city with no crawl history at all.
+PRIOR_UNIQUE_LISTINGS = 60
+PRIOR_UNIQUE_SHARE = 0.6
+# Share of listings that still need a detail page load in card mode (see plan_from_cards).
+CARD_MODE_DETAIL_SHARE = 0.25
+
+
+def expand_city_zipcodes(city_data, lookup=None):
+    """
+    Adds every ZIP ZipcodeBase lists for each city ("City, ST") to city_data. Returns a new
+    {city: [zip_code, ...]} with the original ZIPs first. The lookup is limited to the city's
+    state, so a Portland, OR crawl doesn't pick up Portland, ME.
+    """
+    if lookup is None:
+        from scraper_modules.zipcodebase_extended import get_postal_codes_by_city as lookup
+    expanded = {}
+    for city, zip_codes in city_data.items():
+        name, _, state = (part.strip() for part in city.partition(","))
+        response = lookup(name, state_name=state or None)
+        found = [str(code) for code in (response or {}).get("results") or []]
+        merged = list(dict.fromkeys(list(zip_codes) + found))
+        if len(merged) > len(zip_codes):
+            print(f"🗺️ {city}: {len(merged) - len(zip_codes)} more ZIPs from ZipcodeBase")
+        expanded[city] = merged
+    return expanded
+
+def load_db_freshness(store, stale_after_hours):
+    """Reads per-ZIP listing counts from the listing store, or {} if it can't be reached."""
+    if store is None:
+        return {}
+    try:
+        return store.fetch_zipcode_freshness(stale_after_hours)
+    except Exception as e:
+        print(f"⚠️ Scheduler could not read listing history from the listing store: {e}")
+        return {}
+
+def estimate_zipcode(history, db_counts, city_prior, ttl_seconds, now, detail_share=1.0):
+    """
+    Returns (expected fresh unique listings, page loads) for one crawl of a ZIP.
+    history is a CrawlState.zipcode_history() entry (or None), db_counts (listings, stale) or None,
+    city_prior (unique listings, unique share) for ZIPs with no history of their own, and
+    detail_share the fraction of fresh listings that cost a detail page load.
+    """
+    if history is None:
+        unique = city_prior[0]
+        search_pages = min(MAX_SEARCH_PAGES, max(1, math.ceil(unique / city_prior[1] / RESULTS_PER_PAGE)))
+        stale_share = 1.0
+    else:
+        found = history["listings_found"]
+        unique = history["claimed"] if history["claimed"] is not None else found * city_prior[1]
+        search_pages = history["search_pages"]
+        if db_counts and db_counts[0]:
+            stale_share = db_counts[1] / db_counts[0]
+        else:
+            # Listings from the last crawl stay fresh for the TTL, then all need refreshing.
+            stale_share = min(1.0, (now - history["finished_at"]) / ttl_seconds) if ttl_seconds else 1.0
+    expected = unique * stale_share
+    return expected, search_pages + expected * detail_share
+
+def city_priors(city_data, histories):
+    """Per-city (average unique listings per ZIP, unique share) from the ZIPs crawled so far."""
+    priors = {}
+    for city, zip_codes in city_data.items():
+        known = [histories[(city, z)] for z in zip_codes if (city, z) in histories]
+        found = sum(h["listings_found"] for h in known)
+        claimed = [h for h in known if h["claimed"] is not None]
+        share = (sum(h["claimed"] for h in claimed) / sum(h["listings_found"] for h in claimed)
+                 if claimed and sum(h["listings_found"] for h in claimed) else PRIOR_UNIQUE_SHARE)
+        unique = found * share / len(known) if known else PRIOR_UNIQUE_LISTINGS
+        priors[city] = (max(unique, 1.0), max(share, 0.05))
+    return priors
+
+def plan_crawl(city_data, crawl_state=None, store=None, ttl_hours=None, card_mode=False):
+    """
+    Scores every ZIP in city_data. Returns a list of plan dicts (city, zip_code, expected,
+    page_loads, yield_per_page), best yield per page first.
+    """
+    ttl_hours = ttl_hours if ttl_hours is not None else (crawl_state.ttl_seconds / 3600 if crawl_state else 72)
+    histories = crawl_state.zipcode_history() if crawl_state else {}
+    db_freshness = load_db_freshness(store, ttl_hours)
+    priors = city_priors(city_data, histories)
+    now = time.time()
+    detail_share = CARD_MODE_DETAIL_SHARE if card_mode else 1.0
+    plans = []
+    for city, zip_codes in city_data.items():
+        for zip_code in zip_codes:
+            expected, page_loads = estimate_zipcode(histories.get((city, zip_code)),
+                                                    db_freshness.get((city, zip_code)),
+                                                    priors[city], ttl_hours * 3600, now, detail_share)
+            plans.append({"city": city, "zip_code": zip_code, "expected": expected,
+                          "page_loads": page_loads, "yield_per_page": expected / page_loads})
+    plans.sort(key=lambda p: p["yield_per_page"], reverse=True)
+    return plans
+
+def allocate_budget(plans, page_budget):
+    """
+    Picks ZIPs to fit page_budget (estimated page loads). Each city gets a share of the budget
+    proportional to its expected yield and spends it best yield-per-page first; leftover budget
+    goes to the best remaining ZIPs of any city. Returns the chosen plans, best first.
+    """
+    if page_budget is None:
+        return list(plans)
+    by_city = {}
+    for plan in plans:
+        by_city.setdefault(plan["city"], []).append(plan)
+    total_expected = sum(p["expected"] for p in plans) or 1.0
+    chosen = []
+    spent = 0.0
+    for city, city_plans in by_city.items():
+        city_budget = page_budget * sum(p["expected"] for p in city_plans) / total_expected
+        city_spent = 0.0
+        for plan in city_plans:
+            if city_spent + plan["page_loads"] > city_budget:
+                continue
+            chosen.append(plan)
+            city_spent += plan["page_loads"]
+        spent += city_spent
+    picked = {id(p) for p in chosen}
+    for plan in plans:
+        if id(plan) in picked or spent + plan["page_loads"] > page_budget:
+            continue
+        chosen.append(plan)
+        spent += plan["page_loads"]
+    chosen.sort(key=lambda p: p["yield_per_page"], reverse=True)
+    return chosen
+
+def schedule_crawl(city_data, crawl_state=None, store=None, page_budget=None, expand=False, card_mode=False):
+    """
+    Returns {city: [zip_code, ...]} in crawl order (cities by their best ZIP, ZIPs by expected
+    fresh unique listings per page load), trimmed to page_budget if one is given.
+    """
+    if expand:
+        city_data = expand_city_zipcodes(city_data)
+    plans = plan_crawl(city_data, crawl_state, store, card_mode=card_mode)
+    chosen = allocate_budget(plans, page_budget)
+    schedule = {}
+    for plan in chosen:
+        schedule.setdefault(plan["city"], []).append(plan["zip_code"])
+    for city, zip_codes in schedule.items():
+        city_plans = [p for p in chosen if p["city"] == city]
+        print(f"📋 {city}: {len(zip_codes)} of {len(city_data[city])} ZIPs scheduled, "
+              f"~{sum(p['expected'] for p in city_plans):.0f} fresh listings "
+              f"in ~{sum(p['page_loads'] for p in city_plans):.0f} page loads")
+    return schedule
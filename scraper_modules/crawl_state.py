@@ -0,0 +1,294 @@
+"""
+crawl_state.py
+
+Local crawl-state store (SQLite) so a scraping run can be resumed and refreshed
+incrementally.
+
+It records:
+- every ZIP code a run has started and finished,
+- every search result page loaded (listings found / new on that page),
+- every listing_id with the time it was last scraped and the outcome,
+- the listing IDs already claimed by the current crawl (see listing_dedup.py),
+- nightly prices sampled per (listing, date window) (see price_sampler.py),
+- which listings each search pass of a ZIP saw (see market_estimator.py).
+
+On restart, finished ZIPs are skipped and listings scraped within the
+freshness TTL are not re-parsed, so a crash costs at most the ZIP that was in
+progress, and a re-run only touches what is stale.
+"""
+
+import os
+import time
+import sqlite3
+import threading
+
+CRAWL_STATE_FILE = os.environ.get("CRAWL_STATE_FILE", os.path.join(os.path.dirname(__file__), "crawl_state.sqlite3"))
+DEFAULT_TTL_HOURS = 72
+
+OUTCOME_OK = "ok"
+OUTCOME_NO_PRICE = "no_price"
+OUTCOME_FAILED = "failed"
+OUTCOME_FROM_CARD = "from_card"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS zipcodes (
+    city TEXT NOT NULL,
+    zipcode TEXT NOT NULL,
+    status TEXT NOT NULL,
+    listings_found INTEGER,
+    started_at REAL,
+    finished_at REAL,
+    PRIMARY KEY (city, zipcode)
+);
+CREATE TABLE IF NOT EXISTS pages (
+    city TEXT NOT NULL,
+    zipcode TEXT NOT NULL,
+    page INTEGER NOT NULL,
+    listings_found INTEGER NOT NULL,
+    new_listings INTEGER NOT NULL,
+    scraped_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS pages_zipcode_idx ON pages (zipcode, scraped_at);
+CREATE TABLE IF NOT EXISTS seen_listings (
+    listing_id INTEGER PRIMARY KEY,
+    city TEXT,
+    zipcode TEXT,
+    first_seen REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS price_samples (
+    listing_id TEXT NOT NULL,
+    check_in TEXT NOT NULL,
+    check_out TEXT NOT NULL,
+    price REAL,
+    sampled_at REAL NOT NULL,
+    PRIMARY KEY (listing_id, check_in, check_out)
+);
+CREATE TABLE IF NOT EXISTS search_passes (
+    pass_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    city TEXT NOT NULL,
+    zipcode TEXT NOT NULL,
+    listings_found INTEGER NOT NULL,
+    searched_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS search_passes_zipcode_idx ON search_passes (city, zipcode, searched_at);
+CREATE TABLE IF NOT EXISTS sightings (
+    pass_id INTEGER NOT NULL,
+    listing_id INTEGER NOT NULL,
+    PRIMARY KEY (pass_id, listing_id)
+);
+CREATE TABLE IF NOT EXISTS listings (
+    listing_id TEXT PRIMARY KEY,
+    city TEXT,
+    zipcode TEXT,
+    outcome TEXT NOT NULL,
+    last_scraped REAL NOT NULL
+);
+"""
+
+
+def listing_outcome(details):
+    """Classifies parsed listing details for the crawl log."""
+    if not details or not details.get("listing_id"):
+        return OUTCOME_FAILED
+    if details.get("price") is None:
+        return OUTCOME_NO_PRICE
+    return OUTCOME_OK
+
+
+class CrawlState:
+    """Checkpoint store for ZIP progress and per-listing freshness."""
+
+    def __init__(self, path=CRAWL_STATE_FILE, ttl_hours=DEFAULT_TTL_HOURS):
+        self.path = path
+        self.ttl_seconds = ttl_hours * 3600
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+        self._lock = threading.Lock()
+
+    def close(self):
+        self.conn.close()
+
+    def _execute(self, sql, params=()):
+        with self._lock:
+            self.conn.execute(sql, params)
+            self.conn.commit()
+
+    # --- ZIP progress ---
+
+    def is_zipcode_done(self, city, zip_code):
+        row = self.conn.execute(
+            "SELECT status FROM zipcodes WHERE city = ? AND zipcode = ?", (city, zip_code)
+        ).fetchone()
+        return row is not None and row[0] == "done"
+
+    def mark_zipcode_started(self, city, zip_code):
+        self._execute("""
+            INSERT INTO zipcodes (city, zipcode, status, started_at) VALUES (?, ?, 'in_progress', ?)
+            ON CONFLICT (city, zipcode) DO UPDATE SET status = 'in_progress', started_at = excluded.started_at
+        """, (city, zip_code, time.time()))
+
+    def mark_zipcode_done(self, city, zip_code, listings_found):
+        self._execute("""
+            INSERT INTO zipcodes (city, zipcode, status, listings_found, finished_at) VALUES (?, ?, 'done', ?, ?)
+            ON CONFLICT (city, zipcode) DO UPDATE
+            SET status = 'done', listings_found = excluded.listings_found, finished_at = excluded.finished_at
+        """, (city, zip_code, listings_found, time.time()))
+
+    def record_page(self, city, zip_code, page, listings_found, new_listings):
+        self._execute(
+            "INSERT INTO pages (city, zipcode, page, listings_found, new_listings, scraped_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (city, zip_code, page, listings_found, new_listings, time.time()),
+        )
+
+    def reset_zipcodes(self):
+        """Marks every ZIP as not done and forgets the seen-ID index, so the next run walks the full list
+        again (listing TTLs still apply). Each ZIP's last result is kept for the scheduler."""
+        with self._lock:
+            self.conn.execute("UPDATE zipcodes SET status = 'pending'")
+            self.conn.execute("DELETE FROM seen_listings")
+            self.conn.commit()
+
+    def zipcode_history(self):
+        """
+        Returns {(city, zipcode): history} for every ZIP that has finished at least once, where history has the listings
+        found, the search pages loaded, the listings this ZIP claimed first (None when the seen-ID
+        index has been reset) and when it finished.
+        """
+        claims_known = self.conn.execute("SELECT 1 FROM seen_listings LIMIT 1").fetchone() is not None
+        rows = self.conn.execute("""
+            SELECT z.city, z.zipcode, z.listings_found, z.finished_at,
+                   (SELECT MAX(p.page) FROM pages p WHERE p.city = z.city AND p.zipcode = z.zipcode),
+                   (SELECT COUNT(*) FROM seen_listings s WHERE s.city = z.city AND s.zipcode = z.zipcode)
+            FROM zipcodes z WHERE z.finished_at IS NOT NULL
+        """).fetchall()
+        return {
+            (city, zip_code): {
+                "listings_found": listings_found or 0,
+                "finished_at": finished_at,
+                "search_pages": search_pages or 1,
+                "claimed": claimed if claims_known else None,
+            }
+            for city, zip_code, listings_found, finished_at, search_pages, claimed in rows
+        }
+
+    # --- Seen-ID index ---
+
+    def load_seen_ids(self):
+        """Returns the claimed listing IDs of finished ZIPs. Claims from ZIPs that never finished are
+        dropped, since those ZIPs are re-scraped on resume and must be able to claim them again."""
+        with self._lock:
+            self.conn.execute("""
+                DELETE FROM seen_listings WHERE NOT EXISTS (
+                    SELECT 1 FROM zipcodes z
+                    WHERE z.city = seen_listings.city AND z.zipcode = seen_listings.zipcode AND z.status = 'done'
+                )
+            """)
+            self.conn.commit()
+        return {row[0] for row in self.conn.execute("SELECT listing_id FROM seen_listings")}
+
+    def add_seen_ids(self, listing_ids, city, zip_code):
+        now = time.time()
+        with self._lock:
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO seen_listings (listing_id, city, zipcode, first_seen) VALUES (?, ?, ?, ?)",
+                [(listing_id, city, zip_code, now) for listing_id in listing_ids],
+            )
+            self.conn.commit()
+
+    # --- Search pass sightings ---
+
+    def record_search_pass(self, city, zip_code, listing_ids):
+        """Stores the listing IDs one search pass of a ZIP returned. Returns the pass ID."""
+        with self._lock:
+            cur = self.conn.execute(
+                "INSERT INTO search_passes (city, zipcode, listings_found, searched_at) VALUES (?, ?, ?, ?)",
+                (city, zip_code, len(listing_ids), time.time()),
+            )
+            pass_id = cur.lastrowid
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO sightings (pass_id, listing_id) VALUES (?, ?)",
+                [(pass_id, listing_id) for listing_id in listing_ids],
+            )
+            self.conn.commit()
+        return pass_id
+
+    def latest_search_passes(self, passes=2):
+        """
+        Returns {(city, zipcode): [set of listing IDs, ...]} with the `passes` most recent search
+        passes of every ZIP, newest first.
+        """
+        rows = self.conn.execute("""
+            SELECT pass_id, city, zipcode FROM (
+                SELECT pass_id, city, zipcode,
+                       ROW_NUMBER() OVER (PARTITION BY city, zipcode ORDER BY searched_at DESC, pass_id DESC) AS n
+                FROM search_passes
+            ) WHERE n <= ?
+            ORDER BY city, zipcode, n
+        """, (passes,)).fetchall()
+        sightings = {}
+        pass_ids = [row[0] for row in rows]
+        for i in range(0, len(pass_ids), 500):
+            chunk = pass_ids[i:i + 500]
+            placeholders = ",".join("?" * len(chunk))
+            for pass_id, listing_id in self.conn.execute(
+                f"SELECT pass_id, listing_id FROM sightings WHERE pass_id IN ({placeholders})", chunk
+            ):
+                sightings.setdefault(pass_id, set()).add(listing_id)
+        history = {}
+        for pass_id, city, zip_code in rows:
+            history.setdefault((city, zip_code), []).append(sightings.get(pass_id, set()))
+        return history
+
+    # --- Price samples ---
+
+    def get_price_sample(self, listing_id, check_in, check_out):
+        """
+        Returns (found, price) for a window priced within the TTL, or (False, None). Only prices that
+        were found are cached; a window whose load failed is not, so it is tried again.
+        """
+        row = self.conn.execute(
+            "SELECT price FROM price_samples WHERE listing_id = ? AND check_in = ? AND check_out = ? "
+            "AND sampled_at >= ?",
+            (listing_id, check_in, check_out, time.time() - self.ttl_seconds),
+        ).fetchone()
+        return (True, row[0]) if row else (False, None)
+
+    def put_price_sample(self, listing_id, check_in, check_out, price):
+        self._execute("""
+            INSERT INTO price_samples (listing_id, check_in, check_out, price, sampled_at) VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (listing_id, check_in, check_out) DO UPDATE
+            SET price = excluded.price, sampled_at = excluded.sampled_at
+        """, (listing_id, check_in, check_out, price, time.time()))
+
+    # --- Listing freshness ---
+
+    def record_listing(self, listing_id, outcome, city=None, zip_code=None):
+        self._execute("""
+            INSERT INTO listings (listing_id, city, zipcode, outcome, last_scraped) VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (listing_id) DO UPDATE
+            SET city = excluded.city, zipcode = excluded.zipcode,
+                outcome = excluded.outcome, last_scraped = excluded.last_scraped
+        """, (listing_id, city, zip_code, outcome, time.time()))
+
+    def fresh_listing_ids(self, listing_ids):
+        """Returns the subset of listing_ids scraped and stored within the TTL. Listings without a
+        price are not fresh: their rows are rejected, so nothing was stored for them."""
+        listing_ids = list(listing_ids)
+        if not listing_ids:
+            return set()
+        cutoff = time.time() - self.ttl_seconds
+        fresh = set()
+        # SQLite caps bound parameters per statement, so look IDs up in chunks.
+        for i in range(0, len(listing_ids), 500):
+            chunk = listing_ids[i:i + 500]
+            placeholders = ",".join("?" * len(chunk))
+            rows = self.conn.execute(
+                f"SELECT listing_id FROM listings WHERE listing_id IN ({placeholders}) "
+                f"AND last_scraped >= ? AND outcome NOT IN (?, ?)",
+                (*chunk, cutoff, OUTCOME_FAILED, OUTCOME_NO_PRICE),
+            ).fetchall()
+            fresh.update(row[0] for row in rows)
+        return fresh
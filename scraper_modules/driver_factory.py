@@ -0,0 +1,203 @@
+"""
+driver_factory.py
+
+Tuned Firefox drivers for the scraper.
+
+- A lean profile: no images, no web fonts, no autoplay media, small caches and
+  session history, tracking protection on.
+- Heavy third-party hosts (map tiles, analytics, ad/tracking scripts) are sent
+  to a black-hole proxy through a PAC script, so those requests never leave the
+  machine.
+- Optionally start from a pre-warmed profile directory (copied per driver,
+  since Firefox locks a profile while it is in use).
+- RecyclingDriver wraps a driver, times every page load, tracks the RSS of the
+  geckodriver + Firefox process tree, and restarts the browser after N pages
+  or once it crosses a memory limit. The memory limit needs psutil; without it
+  browsers are recycled by page count only.
+"""
+
+import os
+import time
+import shutil
+import tempfile
+from selenium import webdriver
+from selenium.webdriver.firefox.options import Options
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+USER_AGENT = "Mozilla/5.0 (Macintosh; Intel Mac OS X 10.15; rv:116.0) Gecko/20100101 Firefox/116.0"
+
+# Defaults can be overridden per machine from the environment.
+DRIVER_MAX_PAGES = int(os.environ.get("DRIVER_MAX_PAGES", "250"))
+DRIVER_MAX_RSS_MB = int(os.environ.get("DRIVER_MAX_RSS_MB", "1500"))
+FIREFOX_PROFILE_TEMPLATE = os.environ.get("FIREFOX_PROFILE_TEMPLATE") or None
+REPORT_EVERY_PAGES = 25
+
+LEAN_PREFERENCES = {
+    "permissions.default.image": 2,
+    "browser.display.use_document_fonts": 0,
+    "gfx.downloadable_fonts.enabled": False,
+    "media.autoplay.default": 5,
+    "media.autoplay.blocking_policy": 2,
+    "media.peerconnection.enabled": False,
+    "dom.webnotifications.enabled": False,
+    "permissions.default.geo": 2,
+    "network.prefetch-next": False,
+    "network.dns.disablePrefetch": True,
+    "network.http.speculative-parallel-limit": 0,
+    "browser.cache.disk.enable": False,
+    "browser.cache.memory.capacity": 65536,
+    "browser.sessionhistory.max_entries": 2,
+    "browser.sessionstore.max_tabs_undo": 0,
+    "browser.sessionstore.resume_from_crash": False,
+    "dom.ipc.processCount": 1,
+    "fission.autostart": False,
+    "privacy.trackingprotection.enabled": True,
+    "toolkit.telemetry.enabled": False,
+    "datareporting.healthreport.uploadEnabled": False,
+}
+
+# Hosts whose requests are sent to a dead proxy. Airbnb itself (and its a0/muscache
+# static hosts, which serve the JS bundles) still load directly.
+BLOCKED_HOST_SUFFIXES = [
+    "maps.googleapis.com", "maps.gstatic.com", "fonts.googleapis.com", "fonts.gstatic.com",
+    "google-analytics.com", "googletagmanager.com", "doubleclick.net", "facebook.net",
+    "facebook.com", "bing.com", "hotjar.com", "sentry.io", "datadoghq.com", "tiktok.com",
+    "pinterest.com", "branch.io", "px-cloud.net",
+]
+BLACK_HOLE_PROXY = "PROXY 127.0.0.1:9"
+
+
+def build_pac_url(blocked_suffixes=BLOCKED_HOST_SUFFIXES):
+    """Returns a data: URL for a PAC script that black-holes the blocked hosts."""
+    checks = " || ".join(f'dnsDomainIs(host, "{suffix}")' for suffix in blocked_suffixes)
+    pac = f'function FindProxyForURL(url, host) {{ if ({checks}) return "{BLACK_HOLE_PROXY}"; return "DIRECT"; }}'
+    return "data:text/plain," + pac.replace(" ", "%20")
+
+def build_options(headless=True, lean=True, profile_dir=None):
+    options = Options()
+    if headless:
+        options.add_argument("-headless")
+    options.set_preference("general.useragent.override", USER_AGENT)
+    if lean:
+        for name, value in LEAN_PREFERENCES.items():
+            options.set_preference(name, value)
+        options.set_preference("network.proxy.type", 2)
+        options.set_preference("network.proxy.autoconfig_url", build_pac_url())
+    if profile_dir:
+        options.add_argument("-profile")
+        options.add_argument(profile_dir)
+    return options
+
+def copy_profile(template_dir):
+    """Copies a pre-warmed profile into a private temp dir (Firefox locks profiles in use)."""
+    target = tempfile.mkdtemp(prefix="ff-profile-")
+    shutil.copytree(template_dir, target, dirs_exist_ok=True,
+                    ignore=shutil.ignore_patterns("lock", ".parentlock", "parent.lock"))
+    return target
+
+def process_tree_rss_mb(pid):
+    """Resident memory of a process and all its children, in MB (0 without psutil)."""
+    if psutil is None:
+        return 0.0
+    try:
+        root = psutil.Process(pid)
+        processes = [root] + root.children(recursive=True)
+    except psutil.NoSuchProcess:
+        return 0.0
+    total = 0
+    for proc in processes:
+        try:
+            total += proc.memory_info().rss
+        except psutil.NoSuchProcess:
+            continue
+    return total / (1024 * 1024)
+
+
+class RecyclingDriver:
+    """
+    Wraps a Firefox webdriver and restarts it after `max_pages` page loads or once the
+    browser's process tree grows past `max_rss_mb`. Anything other than get()/quit() is
+    passed straight through, so it can be used anywhere a webdriver is expected.
+    """
+
+    def __init__(self, headless=True, lean=True, profile_template=FIREFOX_PROFILE_TEMPLATE,
+                 max_pages=DRIVER_MAX_PAGES, max_rss_mb=DRIVER_MAX_RSS_MB):
+        self.headless = headless
+        self.lean = lean
+        self.profile_template = profile_template
+        self.max_pages = max_pages
+        self.max_rss_mb = max_rss_mb
+        self.driver = None
+        self.profile_dir = None
+        self.pages_on_driver = 0
+        self.last_rss_mb = 0.0
+        self.stats = {"pages": 0, "load_seconds": 0.0, "max_load_seconds": 0.0,
+                      "peak_rss_mb": 0.0, "recycles": 0}
+        if psutil is None and max_rss_mb:
+            print(f"⚠️ psutil is not installed; browsers are recycled every {max_pages} pages, "
+                  f"not at {max_rss_mb} MB RSS")
+        self._start()
+
+    def _start(self):
+        if self.profile_template:
+            self.profile_dir = copy_profile(self.profile_template)
+        self.driver = webdriver.Firefox(options=build_options(self.headless, self.lean, self.profile_dir))
+        self.pages_on_driver = 0
+
+    def _stop(self):
+        if self.driver is not None:
+            try:
+                self.driver.quit()
+            except Exception as e:
+                print(f"⚠️ Error while quitting the browser: {e}")
+            self.driver = None
+        if self.profile_dir:
+            shutil.rmtree(self.profile_dir, ignore_errors=True)
+            self.profile_dir = None
+
+    def rss_mb(self):
+        service = getattr(self.driver, "service", None)
+        process = getattr(service, "process", None)
+        return process_tree_rss_mb(process.pid) if process else 0.0
+
+    def recycle(self, reason):
+        print(f"♻️ Recycling browser after {self.pages_on_driver} pages ({reason})")
+        self._stop()
+        self._start()
+        self.stats["recycles"] += 1
+
+    def get(self, url):
+        if self.pages_on_driver >= self.max_pages:
+            self.recycle(f"page limit {self.max_pages}")
+        elif self.last_rss_mb >= self.max_rss_mb:
+            self.recycle(f"RSS {self.last_rss_mb:.0f} MB >= {self.max_rss_mb} MB")
+        started = time.monotonic()
+        self.driver.get(url)
+        load_seconds = time.monotonic() - started
+        self.pages_on_driver += 1
+        self.last_rss_mb = self.rss_mb()
+        stats = self.stats
+        stats["pages"] += 1
+        stats["load_seconds"] += load_seconds
+        stats["max_load_seconds"] = max(stats["max_load_seconds"], load_seconds)
+        stats["peak_rss_mb"] = max(stats["peak_rss_mb"], self.last_rss_mb)
+        if stats["pages"] % REPORT_EVERY_PAGES == 0:
+            self.report()
+
+    def report(self):
+        stats = self.stats
+        avg = stats["load_seconds"] / stats["pages"] if stats["pages"] else 0.0
+        rss = f"RSS {self.last_rss_mb:.0f} MB (peak {stats['peak_rss_mb']:.0f} MB), " if psutil else ""
+        print(f"📈 Browser: {stats['pages']} pages, avg load {avg:.2f}s (max {stats['max_load_seconds']:.2f}s), "
+              f"{rss}{stats['recycles']} recycles")
+
+    def quit(self):
+        if self.stats["pages"]:
+            self.report()
+        self._stop()
+
+    def __getattr__(self, name):
+        return getattr(self.driver, name)
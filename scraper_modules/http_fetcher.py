@@ -0,0 +1,265 @@
+"""
+http_fetcher.py
+
+Browser-free fetch backend for the listing scraper.
+
+Search and listing pages are fetched over plain HTTP with asyncio/aiohttp, many
+requests in flight at once, and the response bodies go through the same
+listing_extractor the Selenium path uses, which reads the server-rendered HTML
+or the JSON state Airbnb embeds in <script type="application/json"> tags.
+Nothing is rendered, so there is no JS, image or font cost per page.
+
+Listing pages this backend cannot fetch or parse (e.g. a JS-only shell or a
+changed layout, down to a page the extractor raises on), and ZIPs with a search
+page that failed or was blocked, are handed back to the Selenium path at the
+end of the run.
+
+Set AIRBNB_BASE_URL to run against a local stand-in server that serves saved
+pages (see benchmarks/standin_server.py).
+"""
+
+import os
+import sys
+import time
+import asyncio
+import aiohttp
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from metrics import inc, observe, timed
+from scraper_modules.listing_scraper import (
+    MAX_SEARCH_PAGES,
+    ZipcodeJob,
+    build_search_url,
+    default_price_cache,
+    generate_random_search_params,
+    listing_url_for,
+    listing_window_url,
+    merge_search_page,
+    parse_listing_details,
+    scrape_and_process_zipcode,
+    setup_driver,
+)
+from scraper_modules.control import throttle_factor, wait_if_paused_async
+from scraper_modules.listing_extractor import (
+    extract_availability,
+    extract_listing_page,
+    extract_search_cards,
+    is_block_page,
+)
+from scraper_modules.price_sampler import plan_listing_windows, sample_listing_prices_async
+from scraper_modules.rate_control import OUTCOME_BLOCKED, OUTCOME_ERROR, OUTCOME_OK, RateController
+
+DEFAULT_CONCURRENCY = 16
+# ZIPs in flight at once; each one fans out into its search and detail pages.
+DEFAULT_ZIPCODE_CONCURRENCY = 4
+# Search result pages of one ZIP fetched at once before checking whether to keep paginating.
+SEARCH_PAGE_WINDOW = 4
+REQUEST_TIMEOUT_SECONDS = 20
+REQUEST_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10.15; rv:116.0) Gecko/20100101 Firefox/116.0",
+    "Accept": "text/html,application/xhtml+xml",
+    "Accept-Language": "en-US,en;q=0.9",
+}
+
+# HTTP statuses that mean the site is pushing back rather than failing.
+BLOCK_STATUSES = {403, 429}
+
+# Without a browser the per-request cost is tiny, so the pacer is allowed to climb higher.
+rate_controller = RateController(initial_rate=2.0, max_rate=20.0, scale=throttle_factor)
+
+# --- ASYNC FETCHING ---
+
+async def fetch_page(session, semaphore, url):
+    """
+    GETs a page with at most `concurrency` requests in flight, paced by the rate controller
+    (and held while the crawl is paused). Returns the body, or None on failure or when the
+    site answers with a block/captcha page.
+    """
+    await wait_if_paused_async()
+    with timed("pace"):
+        await rate_controller.wait_async(url)
+    async with semaphore:
+        started = time.monotonic()
+        try:
+            async with session.get(url) as response:
+                body = await response.text()
+                status = response.status
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            rate_controller.record(url, time.monotonic() - started, OUTCOME_ERROR)
+            inc("scraper_pages_total", outcome=OUTCOME_ERROR)
+            print(f"⚠️ Request failed for {url}: {e}")
+            return None
+    latency = time.monotonic() - started
+    observe("scraper_stage_seconds", latency, stage="page_load")
+    if status in BLOCK_STATUSES or (status == 200 and is_block_page(body)):
+        rate_controller.record(url, latency, OUTCOME_BLOCKED)
+        inc("scraper_pages_total", outcome=OUTCOME_BLOCKED)
+        return None
+    if status != 200:
+        rate_controller.record(url, latency, OUTCOME_ERROR)
+        inc("scraper_pages_total", outcome=OUTCOME_ERROR)
+        print(f"⚠️ HTTP {status} for {url}")
+        return None
+    rate_controller.record(url, latency, OUTCOME_OK)
+    inc("scraper_pages_total", outcome=OUTCOME_OK)
+    return body
+
+async def fetch_search_page(session, semaphore, zip_code, search_params, page):
+    """Fetches one search result page by offset. Returns {listing_url: card}, or None on failure."""
+    search_url = build_search_url(zip_code, *search_params, page=page)
+    page_html = await fetch_page(session, semaphore, search_url)
+    if page_html is None:
+        return None
+    return {listing_url_for(listing_id): card for listing_id, card in extract_search_cards(page_html).items()}
+
+async def fetch_zipcode_listings(session, semaphore, zip_code, max_pages=MAX_SEARCH_PAGES,
+                                 window=SEARCH_PAGE_WINDOW, on_page=None):
+    """
+    Returns {listing_url: card} across the search result pages of a ZIP code ({} if it has no
+    results), or None if any page failed or was blocked, since the results would be partial.
+    `window` pages are fetched at once; pagination stops after the first page that adds no new
+    listing IDs. on_page(page, found, new), if given, is called in a thread for every page merged.
+    """
+    search_params = generate_random_search_params()
+    listings = {}
+    page = 1
+    while page <= max_pages:
+        pages = list(range(page, min(page + window, max_pages + 1)))
+        results = await asyncio.gather(*(
+            fetch_search_page(session, semaphore, zip_code, search_params, p) for p in pages
+        ))
+        for page_number, page_listings in zip(pages, results):
+            if page_listings is None:
+                print(f"⚠️ ZIP {zip_code}: search page {page_number} failed over HTTP")
+                return None
+            new_count = merge_search_page(listings, page_listings)
+            if on_page:
+                await asyncio.to_thread(on_page, page_number, len(page_listings), new_count)
+            if new_count == 0:
+                return listings
+        page += len(pages)
+    return listings
+
+async def fetch_window_price(session, semaphore, url, check_in, check_out):
+    """Fetches a listing for one date window and returns its nightly price, or None."""
+    page_html = await fetch_page(session, semaphore, listing_window_url(url, check_in, check_out))
+    if page_html is None:
+        return None
+    return extract_listing_page(page_html, url)[0]["price"]
+
+async def fetch_listing_details(session, semaphore, url, price_cache=None):
+    """
+    Fetches and parses one listing page for a random date window, then prices a few more bookable
+    windows from its availability calendar (see price_sampler); the window fetches run
+    concurrently. The page's own price is one of the samples, or the only one without a calendar.
+    Returns the details dict, or None if unparseable.
+    """
+    check_in, check_out, _, _, _ = generate_random_search_params()
+    page_html = await fetch_page(session, semaphore, listing_window_url(url, check_in, check_out))
+    if page_html is None:
+        return None
+    listing_data, found_summary = extract_listing_page(page_html, url)
+    if not found_summary:
+        return None
+    availability = extract_availability(page_html)
+    if not listing_data["listing_id"]:
+        return listing_data
+    cache = price_cache or default_price_cache
+    windows = await asyncio.to_thread(plan_listing_windows, listing_data["listing_id"], (check_in, check_out),
+                                      listing_data["price"], availability, cache)
+    if windows:
+        await sample_listing_prices_async(
+            listing_data, windows, availability, cache,
+            lambda check_in, check_out: fetch_window_price(session, semaphore, url, check_in, check_out),
+        )
+    return listing_data
+
+async def crawl(city_data, writer, concurrency=DEFAULT_CONCURRENCY, card_mode=False,
+                crawl_state=None, seen_index=None, zipcode_concurrency=DEFAULT_ZIPCODE_CONCURRENCY):
+    """
+    Crawls every city/ZIP over HTTP and queues records on `writer`.
+    With card_mode, only listings the search cards can't describe get a detail fetch.
+    With a crawl_state, finished ZIPs and listings within the TTL are skipped; with a
+    seen_index, listings another ZIP already claimed are not fetched again.
+    At most zipcode_concurrency ZIPs are in flight, started in city_data order. Writer and
+    crawl-state calls (blocking SQLite and queue puts) run in threads, off the event loop.
+    Returns (fallback_zipcodes, fallback_listings) for the Selenium path: (city, zip_code) pairs,
+    and (job, listing_url) pairs whose ZipcodeJob stays unfinished until the fallback has parsed
+    the listing, so the ZIP isn't checkpointed before then.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    fallback_zipcodes = []
+    fallback_listings = []
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    timeout = aiohttp.ClientTimeout(total=REQUEST_TIMEOUT_SECONDS)
+
+    async def process_listing(session, job, listing_url):
+        try:
+            details = await fetch_listing_details(session, semaphore, listing_url, crawl_state)
+        except Exception as e:
+            # A page the extractor chokes on must not take the rest of the crawl down with it.
+            print(f"⚠️ Listing {listing_url} failed over HTTP: {e!r}")
+            details = None
+        if details is None:
+            # Still outstanding on the job; run_selenium_fallback hands it the parsed details.
+            fallback_listings.append((job, listing_url))
+            return
+        await asyncio.to_thread(job.add_details, listing_url, details)
+
+    async def process_zipcode(session, city, zip_code):
+        job = ZipcodeJob(city, zip_code, writer, card_mode, crawl_state, seen_index)
+        if not await asyncio.to_thread(job.start):
+            return
+        on_page = None
+        if crawl_state:
+            on_page = lambda page, found, new: crawl_state.record_page(city, zip_code, page, found, new)
+        try:
+            listings = await fetch_zipcode_listings(session, semaphore, zip_code, on_page=on_page)
+        except Exception as e:
+            print(f"⚠️ ZIP {zip_code}: search failed over HTTP: {e!r}")
+            listings = None
+        if listings is None:
+            # Left in progress; the Selenium fallback searches the whole ZIP again.
+            fallback_zipcodes.append((city, zip_code))
+            return
+        print(f"🔍 {city} (ZIP {zip_code}): {len(listings)} listings over HTTP")
+        detail_urls = await asyncio.to_thread(job.plan, listings)
+        await asyncio.gather(*(process_listing(session, job, url) for url in detail_urls))
+
+    async def zipcode_worker(session, zipcodes):
+        # Workers share one iterator, so ZIPs start in scheduling order.
+        for city, zip_code in zipcodes:
+            await process_zipcode(session, city, zip_code)
+
+    zipcodes = iter([(city, zip_code) for city, zip_codes in city_data.items() for zip_code in zip_codes])
+    async with aiohttp.ClientSession(headers=REQUEST_HEADERS, connector=connector, timeout=timeout) as session:
+        await asyncio.gather(*(zipcode_worker(session, zipcodes) for _ in range(max(1, zipcode_concurrency))))
+    return fallback_zipcodes, fallback_listings
+
+def run_selenium_fallback(fallback_zipcodes, fallback_listings, writer, headless=True, card_mode=False,
+                          crawl_state=None, seen_index=None, driver_settings=None):
+    """
+    Runs the pages the HTTP backend could not parse through a real browser (set up with
+    driver_settings, see setup_driver). A fallback listing's ZIP is checkpointed once its
+    last one is parsed.
+    """
+    if not fallback_zipcodes and not fallback_listings:
+        return
+    print(f"🦊 Falling back to Selenium for {len(fallback_zipcodes)} ZIPs and {len(fallback_listings)} listings")
+    driver = setup_driver(headless=headless, **(driver_settings or {}))
+    try:
+        for city, zip_code in fallback_zipcodes:
+            scrape_and_process_zipcode(driver, city, zip_code, writer, card_mode, crawl_state, seen_index)
+        for job, listing_url in fallback_listings:
+            job.add_details(listing_url, parse_listing_details(driver, listing_url, crawl_state))
+    finally:
+        driver.quit()
+
+def run_http_backend(city_data, writer, concurrency=DEFAULT_CONCURRENCY, headless=True,
+                     card_mode=False, crawl_state=None, seen_index=None, driver_settings=None):
+    """Entry point used by listing_scraper.py when run with --backend http."""
+    fallback_zipcodes, fallback_listings = asyncio.run(
+        crawl(city_data, writer, concurrency=concurrency, card_mode=card_mode,
+              crawl_state=crawl_state, seen_index=seen_index)
+    )
+    run_selenium_fallback(fallback_zipcodes, fallback_listings, writer, headless=headless, card_mode=card_mode,
+                          crawl_state=crawl_state, seen_index=seen_index, driver_settings=driver_settings)
@@ -0,0 +1,70 @@
+"""
+listing_dedup.py
+
+Run-wide deduplication of listings across ZIP code searches.
+
+Neighbouring ZIP searches return heavily overlapping results. The seen-ID index
+keeps every numeric listing ID the run has already claimed, so each listing is
+detail-parsed once per run no matter how many ZIPs it shows up in. With a crawl
+state the index is persisted, so a resumed run keeps deduplicating against what
+the interrupted run already claimed.
+
+It also tracks, per city, how many search results were duplicates.
+"""
+
+import threading
+from scraper_modules.listing_extractor import listing_id_from_url
+
+
+class SeenListingIndex:
+    """Set of numeric listing IDs claimed so far in this crawl, plus per-city duplicate stats."""
+
+    def __init__(self, crawl_state=None):
+        self.crawl_state = crawl_state
+        self.seen = crawl_state.load_seen_ids() if crawl_state else set()
+        self.city_stats = {}
+        self._lock = threading.Lock()
+        if self.seen:
+            print(f"🧮 Seen-ID index restored with {len(self.seen)} listings from the crawl state")
+
+    def claim(self, listings, city, zip_code):
+        """
+        Returns only the listings in {listing_url: card} that no earlier ZIP in this crawl has
+        claimed, and marks them as claimed.
+        """
+        # The HTTP backend plans ZIPs on worker threads.
+        with self._lock:
+            found, duplicates = self.city_stats.get(city, (0, 0))
+            unseen = {}
+            new_ids = []
+            for listing_url, card in listings.items():
+                listing_id = listing_id_from_url(listing_url)
+                if listing_id is None:
+                    continue
+                key = int(listing_id)
+                found += 1
+                if key in self.seen:
+                    duplicates += 1
+                    continue
+                self.seen.add(key)
+                new_ids.append(key)
+                unseen[listing_url] = card
+            self.city_stats[city] = (found, duplicates)
+            if self.crawl_state and new_ids:
+                self.crawl_state.add_seen_ids(new_ids, city, zip_code)
+        if len(unseen) < len(listings):
+            print(f"♻️ {city} (ZIP {zip_code}): {len(listings) - len(unseen)} of {len(listings)} "
+                  f"listings already seen in another ZIP")
+        return unseen
+
+    def duplicate_rate(self, city):
+        found, duplicates = self.city_stats.get(city, (0, 0))
+        return duplicates / found if found else 0.0
+
+    def report(self, city=None):
+        """Prints the duplicate rate for one city, or for every city seen so far."""
+        cities = [city] if city else list(self.city_stats)
+        for name in cities:
+            found, duplicates = self.city_stats.get(name, (0, 0))
+            print(f"♻️ {name}: {duplicates} of {found} search results were duplicates "
+                  f"({self.duplicate_rate(name):.1%}); {found - duplicates} unique listings")
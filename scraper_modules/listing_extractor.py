@@ -0,0 +1,268 @@
+"""
+listing_extractor.py
+
+Pure extraction of listing data from a page-source snapshot.
+
+Nothing here touches a browser or the network: every function takes the HTML
+of a search or listing page (str or bytes) and returns plain Python data. The
+Selenium backend grabs `driver.page_source` once per page and hands it over,
+instead of paying a geckodriver round trip for every find_element/.text call;
+the HTTP backend passes the response body straight in.
+
+Listing pages are scanned once with a single precompiled alternation, picking
+up the summary list, title, price breakdown and embedded JSON state in the same
+pass.
+"""
+
+import re
+import json
+import html
+
+ROOM_ID_RE = re.compile(r"/rooms/(\d+)")
+TAG_RE = re.compile(r"<[^>]+>")
+WHITESPACE_RE = re.compile(r"\s+")
+DIGITS_RE = re.compile(r"(\d+)")
+DECIMAL_RE = re.compile(r"([\d\.]+)")
+NIGHTLY_PRICE_RE = re.compile(r"\$(\d+(?:,\d+)*)\s*x")
+PRICE_BREAKDOWN_RE = re.compile(r"\$\d+(?:,\d+)*\s*x\s*\d+\s*nights?")
+
+CARD_START_RE = re.compile(r'itemprop="itemListElement"')
+CARD_NAME_RE = re.compile(r'data-testid="listing-card-name"[^>]*>(.*?)</', re.S)
+CARD_SUBTITLE_RE = re.compile(r'data-testid="listing-card-subtitle"[^>]*>(.*?)</span>', re.S)
+CARD_NIGHTLY_PRICE_RE = re.compile(r"\$(\d+(?:,\d+)*)\s*(?:</?[^>]+>\s*)*(?:/\s*)?night", re.S)
+
+BLOCK_TITLE_RE = re.compile(r"<title[^>]*>[^<]*(?:access denied|captcha|are you a human|robot check)", re.I)
+BLOCK_MARKER_RE = re.compile(r'id="px-captcha"|class="g-recaptcha"|/captcha/|verify you are a human', re.I)
+
+CALENDAR_DAY_TAG_RE = re.compile(r'<[^>]*data-testid="calendar-day-(\d{2})/(\d{2})/(\d{4})"[^>]*>')
+DAY_BLOCKED_RE = re.compile(r'data-is-day-blocked="(true|false)"')
+JSON_SCRIPT_RE = re.compile(r'<script[^>]*type="application/json"[^>]*>(.*?)</script>', re.S)
+PRICE_AMOUNT_RE = re.compile(r"\$(\d+(?:,\d+)*(?:\.\d+)?)")
+
+LISTING_FIELDS_RE = re.compile(
+    r'(?P<summary><ol[^>]*class="[^"]*lgx66tx[^"]*"[^>]*>.*?</ol>)'
+    r'|(?P<title><h1[^>]*>.*?</h1>)'
+    r'|(?P<price>' + PRICE_BREAKDOWN_RE.pattern + ')'
+    r'|<script[^>]*type="application/json"[^>]*>(?P<state>.*?)</script>',
+    re.S,
+)
+
+
+def empty_listing_data():
+    return {
+        "listing_id": None,
+        "title": None,
+        "room_type": None,
+        "bedroom_count": None,
+        "bathroom_count": None,
+        "price": None
+    }
+
+def _as_text(page_source):
+    if isinstance(page_source, bytes):
+        return page_source.decode("utf-8", errors="replace")
+    return page_source
+
+def html_to_text(fragment):
+    """Strips tags and entities from an HTML fragment and collapses whitespace."""
+    return WHITESPACE_RE.sub(" ", html.unescape(TAG_RE.sub(" ", fragment))).strip()
+
+def parse_summary_text(summary_text, listing_data):
+    """
+    Fills room_type, bedroom_count and bathroom_count in listing_data from the listing summary.
+    Expected summary format example: "4 guests · 1 bedroom · 2 beds · 1.5 baths"
+    """
+    parts = [part.strip() for part in summary_text.split("·")]
+    # Example parts: ["4 guests", "1 bedroom", "2 beds", "1.5 baths"]
+    for part in parts:
+        part_lower = part.lower()
+        if "studio" in part_lower:
+            listing_data["room_type"] = "Studio"
+        elif "bedroom" in part_lower:
+            m_bedroom = DIGITS_RE.search(part_lower)
+            if m_bedroom:
+                listing_data["bedroom_count"] = int(m_bedroom.group(1))
+        elif "beds" in part_lower and listing_data["bedroom_count"] is None:
+            # Use "beds" as fallback if no "bedroom" info is present.
+            m_beds = DIGITS_RE.search(part_lower)
+            if m_beds:
+                listing_data["bedroom_count"] = int(m_beds.group(1))
+        elif "bath" in part_lower:
+            m_bath = DECIMAL_RE.search(part_lower)
+            if m_bath:
+                listing_data["bathroom_count"] = float(m_bath.group(1))
+    return listing_data
+
+def parse_nightly_price(breakdown_text):
+    """Returns the nightly price from a breakdown like "$545 x 10 nights", or None."""
+    nightly_price_match = NIGHTLY_PRICE_RE.search(breakdown_text)
+    if nightly_price_match:
+        return float(nightly_price_match.group(1).replace(',', ''))
+    return None
+
+def listing_id_from_url(url):
+    m = ROOM_ID_RE.search(url or "")
+    return m.group(1) if m else None
+
+def find_json_key(node, key):
+    """Depth-first search for the first value stored under `key` in nested JSON."""
+    if isinstance(node, dict):
+        if key in node:
+            return node[key]
+        children = node.values()
+    elif isinstance(node, list):
+        children = node
+    else:
+        return None
+    for child in children:
+        found = find_json_key(child, key)
+        if found is not None:
+            return found
+    return None
+
+def _summary_from_state(state_blocks):
+    for block in state_blocks:
+        try:
+            state = json.loads(block)
+        except ValueError:
+            continue
+        items = find_json_key(state, "overviewItems")
+        if items:
+            return " · ".join(item.get("title", "") for item in items if isinstance(item, dict))
+    return None
+
+
+# --- PAGE EXTRACTORS ---
+
+def is_block_page(page_source):
+    """True if the page is a captcha / bot-check / access-denied page instead of real content."""
+    page_source = _as_text(page_source)
+    return bool(BLOCK_TITLE_RE.search(page_source) or BLOCK_MARKER_RE.search(page_source))
+
+def extract_listing_ids(page_source):
+    """Returns the listing IDs linked from a search results page, in page order without duplicates."""
+    return list(dict.fromkeys(ROOM_ID_RE.findall(_as_text(page_source))))
+
+def extract_search_cards(page_source):
+    """
+    Returns {listing_id: card} for every result card on a search page, in page order.
+
+    A card holds whatever the search results show: title, nightly price,
+    bedroom count (or "Studio") when listed. Cards never carry bathrooms. Links
+    found outside a recognisable card still get an entry with only the ID.
+    """
+    page_source = _as_text(page_source)
+    cards = {}
+    starts = [m.start() for m in CARD_START_RE.finditer(page_source)]
+    for i, start in enumerate(starts):
+        chunk = page_source[start:starts[i + 1] if i + 1 < len(starts) else len(page_source)]
+        m_id = ROOM_ID_RE.search(chunk)
+        if not m_id or m_id.group(1) in cards:
+            continue
+        card = empty_listing_data()
+        card["listing_id"] = m_id.group(1)
+        m_name = CARD_NAME_RE.search(chunk)
+        if m_name:
+            card["title"] = html_to_text(m_name.group(1)) or None
+        for m_subtitle in CARD_SUBTITLE_RE.finditer(chunk):
+            parse_summary_text(html_to_text(m_subtitle.group(1)), card)
+        m_price = CARD_NIGHTLY_PRICE_RE.search(chunk)
+        if m_price:
+            card["price"] = float(m_price.group(1).replace(",", ""))
+        cards[card["listing_id"]] = card
+    for listing_id in ROOM_ID_RE.findall(page_source):
+        if listing_id not in cards:
+            card = empty_listing_data()
+            card["listing_id"] = listing_id
+            cards[listing_id] = card
+    return cards
+
+def _calendar_day_price(day):
+    price = day.get("price")
+    if isinstance(price, dict):
+        price = price.get("localPriceFormatted") or price.get("localPrice")
+    if isinstance(price, (int, float)):
+        return float(price)
+    if isinstance(price, str):
+        m = PRICE_AMOUNT_RE.search(price)
+        if m:
+            return float(m.group(1).replace(",", ""))
+    return None
+
+def extract_availability(page_source):
+    """
+    Reads the booking calendar from a listing page, from the embedded calendar state
+    ("calendarMonths") or, failing that, from the rendered calendar day cells.
+
+    Returns {"YYYY-MM-DD": {"available": bool, "min_nights": int or None, "price": float or None}},
+    empty if the page carries no calendar.
+    """
+    page_source = _as_text(page_source)
+    days = {}
+    for block in JSON_SCRIPT_RE.findall(page_source):
+        if "calendarMonths" not in block:
+            continue
+        try:
+            months = find_json_key(json.loads(block), "calendarMonths")
+        except ValueError:
+            continue
+        for month in months or []:
+            for day in month.get("days", []) if isinstance(month, dict) else []:
+                date = day.get("calendarDate")
+                if not date:
+                    continue
+                days[date] = {
+                    "available": bool(day.get("available", day.get("bookable", False))),
+                    "min_nights": day.get("minNights"),
+                    "price": _calendar_day_price(day),
+                }
+        if days:
+            return days
+    for m in CALENDAR_DAY_TAG_RE.finditer(page_source):
+        blocked = DAY_BLOCKED_RE.search(m.group(0))
+        if blocked is None:
+            continue
+        month, day, year = m.group(1), m.group(2), m.group(3)
+        days[f"{year}-{month}-{day}"] = {"available": blocked.group(1) == "false", "min_nights": None, "price": None}
+    return days
+
+def extract_listing_page(page_source, url=None):
+    """
+    Extracts every listing field from one listing page snapshot.
+
+    Returns (listing_data, found_summary). found_summary is False when the page
+    had neither the rendered summary list nor an embedded overview, which
+    usually means the page is a JS-only shell or the layout changed.
+    """
+    page_source = _as_text(page_source)
+    listing_data = empty_listing_data()
+    listing_data["listing_id"] = listing_id_from_url(url)
+
+    summary_html = title_html = price_text = None
+    state_blocks = []
+    for m in LISTING_FIELDS_RE.finditer(page_source):
+        kind = m.lastgroup
+        if kind == "summary" and summary_html is None:
+            summary_html = m.group("summary")
+        elif kind == "title" and title_html is None:
+            title_html = m.group("title")
+        elif kind == "price" and price_text is None:
+            price_text = m.group("price")
+        elif kind == "state":
+            state_blocks.append(m.group("state"))
+
+    if title_html:
+        listing_data["title"] = html_to_text(title_html) or None
+    summary_text = html_to_text(summary_html) if summary_html else _summary_from_state(state_blocks)
+    if summary_text:
+        parse_summary_text(summary_text, listing_data)
+    if price_text is None:
+        # The breakdown can also live inside the embedded state, which the scan above skips over.
+        for block in state_blocks:
+            m = PRICE_BREAKDOWN_RE.search(block)
+            if m:
+                price_text = m.group(0)
+                break
+    if price_text:
+        listing_data["price"] = parse_nightly_price(price_text)
+    return listing_data, bool(summary_text)
@@ -1,23 +1,83 @@
 #!/usr/bin/env python3
 import sys
+import argparse
 import json
 import os
-import re
 import time
-import threading
 import random
+import threading
 from datetime import datetime, timedelta
-from selenium import webdriver
-from selenium.webdriver.firefox.options import Options
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
-from database_modules.database import insert_listing, get_db_connection
+from metrics import (
+    DEFAULT_EXPORT_INTERVAL,
+    JsonLinesExporter,
+    inc,
+    start_metrics_server,
+    timed,
+)
+from database_modules.storage import STORAGE_BACKENDS, open_listing_store
+from scraper_modules.control import (
+    DEFAULT_CONTROL_PORT,
+    CrawlControl,
+    activate,
+    start_control_server,
+    throttle_factor,
+    wait_if_paused,
+)
+from scraper_modules.crawl_state import (
+    CRAWL_STATE_FILE,
+    DEFAULT_TTL_HOURS,
+    OUTCOME_FAILED,
+    OUTCOME_FROM_CARD,
+    OUTCOME_NO_PRICE,
+    CrawlState,
+    listing_outcome,
+)
+from scraper_modules.driver_factory import (
+    DRIVER_MAX_PAGES,
+    DRIVER_MAX_RSS_MB,
+    FIREFOX_PROFILE_TEMPLATE,
+    RecyclingDriver,
+)
+from scraper_modules.listing_dedup import SeenListingIndex
+from scraper_modules.listing_extractor import (
+    extract_availability,
+    extract_listing_page,
+    extract_search_cards,
+    is_block_page,
+    empty_listing_data,
+    listing_id_from_url,
+)
+from scraper_modules.price_sampler import (
+    MemoryPriceCache,
+    plan_listing_windows,
+    sample_listing_prices,
+    window_bookable,
+)
 from urllib.parse import urlencode
+from selenium.common.exceptions import TimeoutException
+from scraper_modules.rate_control import (
+    OUTCOME_BLOCKED as RATE_BLOCKED,
+    OUTCOME_ERROR as RATE_ERROR,
+    OUTCOME_OK as RATE_OK,
+    RateController,
+)
 
 # Configuration
 CITY_ZIP_FILE = os.path.join(os.path.dirname(__file__), "cities_and_zipcodes.json")
+# Point this at a local stand-in server to scrape saved pages instead of the live site.
+AIRBNB_BASE_URL = os.environ.get("AIRBNB_BASE_URL", "https://www.airbnb.com").rstrip("/")
+# Airbnb shows 18 results per search page and stops serving results after 15 pages.
+RESULTS_PER_PAGE = 18
+MAX_SEARCH_PAGES = 15
+# How often readiness checks re-query the DOM while waiting for a page to render.
+READY_POLL_SECONDS = 0.25
+# Longest wait for a window's price breakdown. Windows come from the availability calendar,
+# so the breakdown normally renders right after the page does.
+PRICE_WAIT_SECONDS = 10
 
 # Supabase/PostgreSQL connection parameters (set these via your environment or update defaults)
 DB_HOST = os.environ.get("SUPABASE_DB_HOST", "your-supabase-host.supabase.co")
@@ -26,56 +86,72 @@ DB_NAME = os.environ.get("SUPABASE_DB_NAME", "postgres")
 DB_USER = os.environ.get("SUPABASE_DB_USER", "your-db-user")
 DB_PASSWORD = os.environ.get("SUPABASE_DB_PASSWORD", "your-db-password")
 
-def setup_driver(headless=True):
-    """Setup Selenium WebDriver."""
-    options = Options()
-    options.headless = headless
-    options.set_preference(
-        "general.useragent.override",
-        "Mozilla/5.0 (Macintosh; Intel Mac OS X 10.15; rv:116.0) Gecko/20100101 Firefox/116.0"
-    )
-    return webdriver.Firefox(options=options)
-
-driver = setup_driver(headless=False)
-
-global paused
-paused = False
-
-def pause_resume_listener():
-    global paused
-    while True:
-        command = input("Type 'pause' to pause, 'resume' to continue: ")
-        if command.lower() == "pause":
-            paused = True
-            print("⏸️ Paused scraping...")
-        elif command.lower() == "resume":
-            paused = False
-            print("▶️ Resuming scraping...")
-
-def wait_for_resume():
-    global paused
-    while paused:
-        time.sleep(1)
-
-def waitForFullListingsLoad(max_wait=5):
-    """Waits until there are more than 2 listings loaded, or until max_wait seconds have passed."""
-    elapsed = 0
-    while elapsed < max_wait:
-        listing_elements = driver.find_elements(By.XPATH, "//a[contains(@href, '/rooms/')]")
-        if len(listing_elements) > 2:
-            break
-        elapsed += 1
-def get_listings_from_page():
-    """Extracts unique listing URLs by removing extra query parameters."""
-    listing_elements = driver.find_elements(By.XPATH, "//a[contains(@href, '/rooms/')]")
-    listings = set()
-    for elem in listing_elements:
-        url = elem.get_attribute("href")
-        if url:
-            match = re.search(r"(https://www\.airbnb\.com/rooms/(\d+))", url)
-            if match:
-                listings.add(match.group(1))  # Return the base URL; listing ID is in group(2)
-    return listings
+def setup_driver(headless=True, **driver_settings):
+    """
+    Setup Selenium WebDriver: a lean Firefox that blocks heavy resources and restarts itself
+    after a page or memory limit (see driver_factory.RecyclingDriver for driver_settings).
+    """
+    return RecyclingDriver(headless=headless, **driver_settings)
+
+# Paces page loads per host, speeding up while the site responds cleanly and backing off on
+# slow responses, errors and captchas. Each worker process gets its own. The crawl control's
+# throttle scales it at runtime.
+rate_controller = RateController(scale=throttle_factor)
+
+# Window prices cached in this process when no crawl state is passed to parse_listing_details.
+default_price_cache = MemoryPriceCache()
+
+def waitForFullListingsLoad(driver, max_wait=5):
+    """
+    Waits until there are more than 2 listings loaded, or until max_wait seconds have passed.
+    Returns True if the listings showed up in time.
+    """
+    try:
+        with timed("wait"):
+            WebDriverWait(driver, max_wait, poll_frequency=READY_POLL_SECONDS).until(
+                lambda d: len(d.find_elements(By.XPATH, "//a[contains(@href, '/rooms/')]")) > 2
+            )
+        return True
+    except TimeoutException:
+        inc("scraper_wait_timeouts_total", page="search")
+        return False
+
+def paced_get(driver, url):
+    """Waits while the crawl is paused and until the rate controller allows a request to url's
+    host, then loads it. Returns the monotonic time the load started."""
+    wait_if_paused()
+    with timed("pace"):
+        rate_controller.wait(url)
+    started = time.monotonic()
+    with timed("page_load"):
+        driver.get(url)
+    return started
+
+def report_page_load(driver, url, started, ready):
+    """Feeds the load time and outcome of a page back to the rate controller."""
+    latency = time.monotonic() - started
+    if ready:
+        outcome = RATE_OK
+    elif is_block_page(driver.page_source):
+        outcome = RATE_BLOCKED
+    else:
+        outcome = RATE_ERROR
+    rate_controller.record(url, latency, outcome)
+    inc("scraper_pages_total", outcome=outcome)
+    return outcome
+def listing_url_for(listing_id):
+    """Returns the canonical listing URL for a listing ID."""
+    return f"{AIRBNB_BASE_URL}/rooms/{listing_id}"
+
+def get_listings_from_page(driver):
+    """
+    Extracts the search result cards from one snapshot of the page source.
+    Returns {listing_url: card}, with listing URLs stripped of extra query parameters.
+    """
+    page_source = driver.page_source
+    with timed("parse"):
+        cards = extract_search_cards(page_source)
+    return {listing_url_for(listing_id): card for listing_id, card in cards.items()}
 
 def generate_random_search_params():
     """Generate diverse search parameters to increase sample independence."""
@@ -86,23 +162,42 @@ def generate_random_search_params():
     possible_price_max = [250, 300, 400, 500, 750, 1000]
     price_max = random.choice([p for p in possible_price_max if p > price_min])
     return start_date.strftime("%Y-%m-%d"), end_date.strftime("%Y-%m-%d"), guests, price_min, price_max
-def randomize_sleep(base_min=1, base_max=3, extended_min=180, extended_max=300, extended_prob=0.01):
-    """
-    Sleep for a random duration between base_min and base_max seconds.
-    Occasionally, sleep for an extended period between extended_min and extended_max seconds
-    based on the probability extended_prob.
-    """
-    if random.random() < extended_prob:
-        sleep_time = random.uniform(extended_min, extended_max)
-        print(f"⏳ Taking an extended break for {sleep_time:.2f} seconds...")
-    else:
-        sleep_time = random.uniform(base_min, base_max)
-        print(f"⏳ Sleeping for {sleep_time:.2f} seconds...")
-    time.sleep(sleep_time)
-
 # --- PARSING FUNCTIONS ---
 
-def parse_listing_details(url):
+def listing_window_url(url, check_in, check_out, guests=1):
+    """The listing URL with a date window, so the page renders that window's price breakdown."""
+    return f"{url}?{urlencode({'check_in': check_in, 'check_out': check_out, 'adults': guests})}"
+
+def wait_for_price(driver, url, check_in, check_out):
+    """Waits for the price breakdown to render; returns False on a timeout."""
+    try:
+        with timed("wait"):
+            WebDriverWait(driver, PRICE_WAIT_SECONDS, poll_frequency=READY_POLL_SECONDS).until(
+                EC.presence_of_element_located((By.XPATH, "//div[contains(text(), 'nights')]"))
+            )
+        return True
+    except TimeoutException:
+        inc("scraper_wait_timeouts_total", page="price")
+        print(f"Warning: No price for {url} from {check_in} to {check_out}")
+        return False
+
+def load_window_price(driver, url, check_in, check_out, guests=1):
+    """Loads a listing for one date window and returns its nightly price, or None if none rendered."""
+    url_with_params = listing_window_url(url, check_in, check_out, guests)
+    try:
+        started = paced_get(driver, url_with_params)
+        # Readiness check only; the price is read from one page_source snapshot below.
+        price_ready = wait_for_price(driver, url, check_in, check_out)
+        if report_page_load(driver, url_with_params, started, price_ready) == RATE_BLOCKED:
+            return None
+        page_source = driver.page_source
+        with timed("parse"):
+            return extract_listing_page(page_source, url)[0]["price"]
+    except Exception as e:
+        print(f"Error loading price for {url}: {e}")
+        return None
+
+def parse_listing_details(driver, url, price_cache=None):
     """
     Visits the listing page and extracts relevant data:
       - listing_id: extracted from the URL.
@@ -110,161 +205,365 @@ def parse_listing_details(url):
       - room_type: e.g. "Studio" if indicated.
       - bedroom_count: number of bedrooms.
       - bathroom_count: number of bathrooms.
-      - price: the price per night.
-      
-    It parses the summary section from the <ol> element with a class containing 'lgx66tx'.
+      - price: the median nightly price over a few bookable date windows (see price_sampler),
+        with the per-window prices in price_samples.
+
+    The page is loaded once for a random date window and read from a driver.page_source
+    snapshot by listing_extractor, including its availability calendar and that window's price
+    (waited for only when the calendar says the window is bookable). The other windows are then
+    priced from the calendar, from `price_cache` (the crawl state, or an in-process cache) or by
+    loading the listing for that window; without a calendar the page's own price is used.
     Expected summary format example: "4 guests · 1 bedroom · 2 beds · 1.5 baths"
     """
-    listing_data = {
-        "listing_id": None,
-        "title": None,
-        "room_type": None,
-        "bedroom_count": None,
-        "bathroom_count": None,
-        "price": None
-    }
-    check_in, check_out, guests, price_min, price_max = generate_random_search_params()
-    query_params = {
-        "check_in": check_in,
-        "check_out": check_out,
-        "adults": guests
-    }
-    url_with_params = f"{url}?{urlencode(query_params)}"
+    listing_data = empty_listing_data()
+    listing_data["listing_id"] = listing_id_from_url(url)
+    check_in, check_out, _, _, _ = generate_random_search_params()
+    page_url = listing_window_url(url, check_in, check_out)
 
     try:
-        driver.get(url_with_params)  
-              
-        # Extract the listing ID from the URL.
-        m = re.search(r"/rooms/(\d+)", url)
-        if m:
-            listing_data["listing_id"] = m.group(1)
-        
-        # Extract summary details from the ordered list.
+        started = paced_get(driver, page_url)
+
+        # Readiness check only; the fields are read from one page_source snapshot below.
+        summary_ready = False
         try:
-            summary_element = WebDriverWait(driver, 10).until(
-                EC.presence_of_element_located((By.XPATH, "//ol[contains(@class, 'lgx66tx')]"))
-            )
-            summary_text = summary_element.text.strip()
-            parts = [part.strip() for part in summary_text.split("·")]
-            # Example parts: ["4 guests", "1 bedroom", "2 beds", "1.5 baths"]
-            for part in parts:
-                part_lower = part.lower()
-                if "studio" in part_lower:
-                    listing_data["room_type"] = "Studio"
-                elif "bedroom" in part_lower:
-                    m_bedroom = re.search(r"(\d+)", part_lower)
-                    if m_bedroom:
-                        listing_data["bedroom_count"] = int(m_bedroom.group(1))
-                elif "beds" in part_lower and listing_data["bedroom_count"] is None:
-                    # Use "beds" as fallback if no "bedroom" info is present.
-                    m_beds = re.search(r"(\d+)", part_lower)
-                    if m_beds:
-                        listing_data["bedroom_count"] = int(m_beds.group(1))
-                elif "bath" in part_lower:
-                    m_bath = re.search(r"([\d\.]+)", part_lower)
-                    if m_bath:
-                        listing_data["bathroom_count"] = float(m_bath.group(1))
+            with timed("wait"):
+                WebDriverWait(driver, 10, poll_frequency=READY_POLL_SECONDS).until(
+                    EC.presence_of_element_located((By.XPATH, "//ol[contains(@class, 'lgx66tx')]"))
+                )
+            summary_ready = True
         except Exception as e:
+            inc("scraper_wait_timeouts_total", page="listing")
             print(f"Warning: Could not extract summary details from {url}: {e}")
-        
-        # Extract the price per night.
-        try:
-            # Locate the element that contains the breakdown text, e.g., "$545 x 10 nights"
-            breakdown_element = WebDriverWait(driver, 10).until(
-                EC.presence_of_element_located((By.XPATH, "//div[contains(text(), 'nights')]"))
-            )
-            breakdown_text = breakdown_element.text.strip()  # Expected: "$545 x 10 nights"
-            
-            # Extract the nightly price directly from the breakdown text.
-            nightly_price_match = re.search(r'\$(\d+(?:,\d+)*)\s*x', breakdown_text)
-            if nightly_price_match:
-                nightly_price = float(nightly_price_match.group(1).replace(',', ''))
-                listing_data["price"] = nightly_price
+        if report_page_load(driver, page_url, started, summary_ready) == RATE_BLOCKED:
+            print(f"Error parsing listing details from {url}: blocked by a captcha page")
+            return listing_data
+
+        page_source = driver.page_source
+        with timed("parse"):
+            listing_data, _ = extract_listing_page(page_source, url)
+            availability = extract_availability(page_source)
+        if (listing_data["price"] is None and (not availability or window_bookable(availability, check_in, check_out))
+                and wait_for_price(driver, url, check_in, check_out)):
+            with timed("parse"):
+                listing_data["price"] = extract_listing_page(driver.page_source, url)[0]["price"]
+        if listing_data["listing_id"]:
+            cache = price_cache or default_price_cache
+            windows = plan_listing_windows(listing_data["listing_id"], (check_in, check_out),
+                                           listing_data["price"], availability, cache)
+            if not windows:
+                print(f"Warning: No bookable dates or page price for {url}; skipping price")
             else:
-                listing_data["price"] = None
-        except Exception as e:
-            print(f"Warning: Could not extract price from {url}: {e}")
-            
+                sample_listing_prices(
+                    listing_data, windows, availability, cache,
+                    lambda check_in, check_out: load_window_price(driver, url, check_in, check_out),
+                )
     except Exception as e:
         print(f"Error parsing listing details from {url}: {e}")
-    
+
     print(f"Extracted data for {url}: {listing_data}")
     return listing_data
 
-def get_current_page():
-    """Extracts the current page number from the pagination elements on the Airbnb search page."""
-    try:
-        current_page_element = WebDriverWait(driver, 5).until(
-            EC.presence_of_element_located((By.XPATH, "//button[@aria-current='page']"))
-        )
-        return int(current_page_element.text.strip())
-    except Exception as e:
-        print(f"⚠️ Could not determine the current page: {e}")
-        return 1
-    
 # --- SCRAPING FUNCTIONS ---
 
-def scrape_zipcode(city, zip_code):
-    """Scrapes listing URLs for a given city and ZIP code and returns a set of unique listing URLs."""
-    check_in, check_out, guests, price_min, price_max = generate_random_search_params()
-    listings = set()
+def build_search_url(zip_code, check_in, check_out, guests, price_min, price_max, page=1):
+    """
+    Builds the Airbnb search URL for one ZIP code and set of search parameters.
+    Result pages are addressed directly by offset, so any page can be loaded without clicking "Next".
+    """
+    items_offset = (page - 1) * RESULTS_PER_PAGE
+    return (f"{AIRBNB_BASE_URL}/s/{zip_code}/homes?"
+            f"check_in={check_in}&check_out={check_out}&adults={guests}"
+            f"&price_min={price_min}&price_max={price_max}"
+            f"&room_types[]=Entire%20home%2Fapt"
+            f"&items_offset={items_offset}&section_offset=0")
+
+def merge_search_page(listings, page_listings):
+    """Adds one page of {listing_url: card} results to listings and returns how many were new."""
+    new_count = sum(1 for listing_url in page_listings if listing_url not in listings)
+    listings.update(page_listings)
+    return new_count
+
+def paginate_search(fetch_pages, max_pages=MAX_SEARCH_PAGES, window=1, on_page=None):
+    """
+    Walks result pages 1..max_pages, `window` pages at a time.
+
+    fetch_pages(page_numbers) must return one {listing_url: card} dict per page, in order, or
+    None for a page that failed to load (blocked, or the browser errored); with window > 1 the
+    caller can load those pages concurrently. Stops after the first page that adds no listing
+    IDs that earlier pages didn't already have, or at the first failed page. on_page(page,
+    found, new), if given, is called for every page merged.
+    Returns (listings, complete): the merged {listing_url: card} dict, and False if a page failed,
+    so the results may be missing listings.
+    """
+    listings = {}
     page = 1
-    search_url = (f"https://www.airbnb.com/s/{zip_code}/homes?"
-                f"check_in={check_in}&check_out={check_out}&adults={guests}"
-                f"&price_min={price_min}&price_max={price_max}"
-                f"&room_types[]=Entire%20home%2Fapt&page={page}")
-    driver.get(search_url)
-    waitForFullListingsLoad()
-
-    while page <= 1:
-        wait_for_resume()
-        print(f"\n🔍 Scraping {city} (ZIP: {zip_code}), Page {page}")
-        new_listings = get_listings_from_page()
-        listings.update(new_listings)
-        try:
-            next_button = WebDriverWait(driver, 5).until(
-                EC.element_to_be_clickable((By.XPATH, "//a[@aria-label='Next']"))
-            )
-            next_button.click()
-            randomize_sleep()
-            waitForFullListingsLoad()
-            page = get_current_page()
-        except Exception as e:
-            print(f"❌ No more pages available for {city} (ZIP {zip_code}): {e}")
-            break
-
-    print(f"📊 Total unique listings found in {city} (ZIP {zip_code}): {len(listings)}")
-    print(f"Scraped for {zip_code} complete. Listings are \n{listings}")
-    return listings
-
-def process_listings_for_zipcode(city, zip_code, listings, conn):
-    """Iterates through collected listing URLs to parse details and insert them into the database.
-       The zipcode is saved as part of each record."""
-    for listing_url in listings:
-        wait_for_resume()
-        randomize_sleep()
-        details = parse_listing_details(listing_url)
-        if details["listing_id"]:
-            listing_record = {
-                "listing_id": details["listing_id"],
-                "city": city,
-                "zipcode": zip_code, 
-                "listing_url": listing_url,
-                "room_type": details.get("room_type"),
-                "bedroom_count": details.get("bedroom_count"), 
-                "bathroom_count": details.get("bathroom_count"),
-                "price": details.get("price")
-            }
-            print(f"Inserting listing record: {listing_record}")
-            insert_listing(conn, listing_record)
-
-
-def process_city(city, zip_codes, conn):
+    while page <= max_pages:
+        pages = list(range(page, min(page + window, max_pages + 1)))
+        for page_number, page_listings in zip(pages, fetch_pages(pages)):
+            if page_listings is None:
+                print(f"⚠️ Page {page_number} failed to load; stopping pagination.")
+                return listings, False
+            new_count = merge_search_page(listings, page_listings)
+            if on_page:
+                on_page(page_number, len(page_listings), new_count)
+            if new_count == 0:
+                print(f"⏹️ Page {page_number} added no new listings; stopping pagination.")
+                return listings, True
+        page += len(pages)
+    return listings, True
+
+def load_search_page(driver, zip_code, search_params, page):
+    """Loads one result page by offset and returns its {listing_url: card} results, or None
+    if the site answered with a captcha page or the browser failed to load it."""
+    search_url = build_search_url(zip_code, *search_params, page=page)
+    try:
+        started = paced_get(driver, search_url)
+        ready = waitForFullListingsLoad(driver)
+        if report_page_load(driver, search_url, started, ready) == RATE_BLOCKED:
+            print(f"🛑 Search page {page} for ZIP {zip_code} was blocked")
+            return None
+        return get_listings_from_page(driver)
+    except Exception as e:
+        print(f"❌ Error loading search page {page} for ZIP {zip_code}: {e}")
+        return None
+
+def scrape_zipcode(driver, city, zip_code, max_pages=MAX_SEARCH_PAGES, crawl_state=None):
+    """
+    Scrapes the search results for a given city and ZIP code, page by page, until a page
+    adds no new listings or max_pages is reached. Each page is logged to crawl_state if given.
+    Returns (listings, complete): {listing_url: card} for the unique listings found (see
+    get_listings_from_page), and False if a page failed to load along the way.
+    """
+    # One set of search parameters per ZIP so every offset addresses the same result list.
+    search_params = generate_random_search_params()
+
+    def fetch_pages(pages):
+        results = []
+        for page in pages:
+            wait_if_paused()
+            print(f"\n🔍 Scraping {city} (ZIP: {zip_code}), Page {page}")
+            results.append(load_search_page(driver, zip_code, search_params, page))
+        return results
+
+    on_page = None
+    if crawl_state:
+        on_page = lambda page, found, new: crawl_state.record_page(city, zip_code, page, found, new)
+    listings, complete = paginate_search(fetch_pages, max_pages=max_pages, on_page=on_page)
+    print(f"📊 Total unique listings found in {city} (ZIP {zip_code}): {len(listings)}"
+          f"{'' if complete else ' (search incomplete)'}")
+    print(f"Scraped for {zip_code} complete. Listings are \n{list(listings)}")
+    return listings, complete
+
+def build_listing_record(details, city, zip_code, listing_url):
+    """
+    Turns parsed listing details into a database record, or None if the listing ID is missing.
+    price_samples rides along to the listing_snapshots row (None for listings priced from a card).
+    """
+    if not details["listing_id"]:
+        return None
+    return {
+        "listing_id": details["listing_id"],
+        "city": city,
+        "zipcode": zip_code,
+        "listing_url": listing_url,
+        "room_type": details.get("room_type"),
+        "bedroom_count": details.get("bedroom_count"),
+        "bathroom_count": details.get("bathroom_count"),
+        "price": details.get("price"),
+        "price_samples": details.get("price_samples"),
+    }
+
+# Card fields that describe the unit itself; if these differ from the stored snapshot the
+# listing was edited and its detail page is re-read. Prices are not compared because they
+# depend on the randomized search dates.
+CARD_STRUCTURAL_FIELDS = ("bedroom_count", "room_type")
+REQUIRED_RECORD_FIELDS = ("bedroom_count", "bathroom_count", "price")
+
+def plan_from_cards(listings, city, zip_code, snapshots):
+    """
+    Splits search results into records that can be written straight from their search card
+    and listing URLs that still need a detail page load.
+
+    A card becomes a record when the stored snapshot for that listing fills in what the card
+    lacks (search cards never show bathrooms) and its structural fields still match the
+    snapshot. Everything else is returned for a detail visit.
+    Returns (records, detail_urls).
+    """
+    records = []
+    detail_urls = []
+    for listing_url, card in listings.items():
+        listing_id = card.get("listing_id") or listing_id_from_url(listing_url)
+        snapshot = snapshots.get(listing_id)
+        if snapshot is None or any(
+            card.get(field) is not None and card.get(field) != snapshot.get(field)
+            for field in CARD_STRUCTURAL_FIELDS
+        ):
+            detail_urls.append(listing_url)
+            continue
+        details = dict(snapshot, listing_id=listing_id)
+        details.update({field: value for field, value in card.items() if value is not None})
+        if any(details.get(field) is None for field in REQUIRED_RECORD_FIELDS):
+            detail_urls.append(listing_url)
+            continue
+        records.append(build_listing_record(details, city, zip_code, listing_url))
+    return records, detail_urls
+
+def load_snapshots(store, listing_urls):
+    """Reads the stored snapshots for a batch of listing URLs from the listing store."""
+    listing_ids = [listing_id_from_url(url) for url in listing_urls]
+    return store.fetch_listing_snapshots([i for i in listing_ids if i])
+
+def drop_fresh_listings(listings, crawl_state):
+    """Removes listings scraped within the crawl-state TTL from a {listing_url: card} dict."""
+    if not crawl_state:
+        return listings
+    fresh = crawl_state.fresh_listing_ids(listing_id_from_url(url) for url in listings)
+    if fresh:
+        print(f"⏭️ Skipping {len(fresh)} listings refreshed within the last {crawl_state.ttl_seconds / 3600:g}h")
+    return {url: card for url, card in listings.items() if listing_id_from_url(url) not in fresh}
+
+def write_listing_record(writer, crawl_state, listing_record, outcome, city, zip_code):
+    """
+    Puts a record on `writer` and logs its outcome to the crawl state once the writer reports
+    it committed. A record that never reaches the table is logged as no_price or failed, so
+    the TTL does not skip it on the next run.
+    """
+    def on_written(written):
+        result = outcome if written else OUTCOME_NO_PRICE if listing_record["price"] is None else OUTCOME_FAILED
+        crawl_state.record_listing(listing_record["listing_id"], result, city, zip_code)
+
+    writer.put(listing_record, on_written=on_written if crawl_state else None)
+
+def record_search_pass(crawl_state, city, zip_code, listings):
+    """Logs which listings one search pass of a ZIP saw, for the capture-recapture estimator."""
+    if crawl_state and listings:
+        listing_ids = [listing_id_from_url(url) for url in listings]
+        crawl_state.record_search_pass(city, zip_code, [int(i) for i in listing_ids if i])
+
+def queue_listing_details(writer, crawl_state, details, city, zip_code, listing_url):
+    """Queues the record for one parsed detail page on `writer` and logs the listing's outcome.
+    Returns True if a record was queued."""
+    listing_record = build_listing_record(details, city, zip_code, listing_url)
+    if listing_record:
+        print(f"Queueing listing record: {listing_record}")
+        inc("scraper_listings_total", source="detail")
+        if listing_record["price"] is None:
+            inc("scraper_null_prices_total")
+        write_listing_record(writer, crawl_state, listing_record, listing_outcome(details), city, zip_code)
+    return listing_record is not None
+
+
+class ZipcodeJob:
+    """
+    One ZIP's trip through the steps every backend shares around its page loads: skip it if the
+    crawl state has it finished, log its search pass, drop listings another ZIP claimed or that
+    are still fresh, write card records (card_mode), queue a record per parsed detail page, and
+    checkpoint the ZIP once its last listing is handled. A ZIP whose search had a failed page
+    still gets its listings written but is not checkpointed, so a resumed run searches it again.
+
+    The serial path calls run(listings, fetch_details); the worker pool and the HTTP backend
+    call plan() and add_details() themselves, since their detail pages come back out of order.
+    add_details() may be called from several threads at once.
+    """
+
+    def __init__(self, city, zip_code, writer, card_mode=False, crawl_state=None, seen_index=None):
+        self.city = city
+        self.zip_code = zip_code
+        self.writer = writer
+        self.card_mode = card_mode
+        self.crawl_state = crawl_state
+        self.seen_index = seen_index
+        self.found = 0
+        self.queued = 0
+        self.outstanding = 0
+        self.complete = True
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Marks the ZIP started. Returns False, without marking it, if it is already finished."""
+        if self.crawl_state and self.crawl_state.is_zipcode_done(self.city, self.zip_code):
+            print(f"⏭️ {self.city} (ZIP {self.zip_code}) already finished; skipping.")
+            return False
+        if self.crawl_state:
+            self.crawl_state.mark_zipcode_started(self.city, self.zip_code)
+        return True
+
+    def plan(self, listings, complete=True):
+        """
+        Takes the ZIP's {listing_url: card} search results, writes what the cards can describe
+        and returns the listing URLs that need a detail page. complete=False means a search page
+        failed. A ZIP with nothing left to parse is finished here.
+        """
+        city, zip_code, crawl_state = self.city, self.zip_code, self.crawl_state
+        self.found = len(listings)
+        self.complete = complete
+        # A partial pass would look like a small capture to the market estimator; only full ones are logged.
+        if complete:
+            record_search_pass(crawl_state, city, zip_code, listings)
+        if self.seen_index:
+            listings = self.seen_index.claim(listings, city, zip_code)
+        listings = drop_fresh_listings(listings, crawl_state)
+        detail_urls = list(listings)
+        if self.card_mode:
+            records, detail_urls = plan_from_cards(listings, city, zip_code, load_snapshots(self.writer, listings))
+            inc("scraper_listings_total", len(records), source="card")
+            for listing_record in records:
+                write_listing_record(self.writer, crawl_state, listing_record, OUTCOME_FROM_CARD, city, zip_code)
+            self.queued += len(records)
+        print(f"📥 {city} (ZIP {zip_code}): {len(detail_urls)} of {len(listings)} listings need detail pages")
+        self.outstanding = len(detail_urls)
+        if not detail_urls:
+            self.finish()
+        return detail_urls
+
+    def add_details(self, listing_url, details):
+        """
+        Handles one detail page: queues its record, or only counts it off when details is None
+        (the load failed). Returns True once the ZIP's last listing is in and it is checkpointed.
+        """
+        queued = details is not None and queue_listing_details(self.writer, self.crawl_state, details,
+                                                               self.city, self.zip_code, listing_url)
+        with self._lock:
+            self.queued += queued
+            self.outstanding -= 1
+            last = self.outstanding == 0
+        if last:
+            self.finish()
+        return last
+
+    def finish(self):
+        if not self.crawl_state:
+            return
+        if self.complete:
+            self.crawl_state.mark_zipcode_done(self.city, self.zip_code, self.found)
+        else:
+            print(f"⚠️ {self.city} (ZIP {self.zip_code}): search incomplete; left in progress for the next run")
+
+    def run(self, listings, fetch_details, complete=True):
+        """plan() the search results, then fetch_details(listing_url) each detail page in turn."""
+        for listing_url in self.plan(listings, complete):
+            self.add_details(listing_url, fetch_details(listing_url))
+        return self.queued
+
+def scrape_and_process_zipcode(driver, city, zip_code, writer, card_mode=False, crawl_state=None,
+                               seen_index=None):
+    """
+    Runs one ZIP end to end on one driver: search pages, then detail pages (or cards in card_mode).
+    See ZipcodeJob for the seen-index, TTL and checkpoint handling.
+    """
+    job = ZipcodeJob(city, zip_code, writer, card_mode, crawl_state, seen_index)
+    if not job.start():
+        return 0
+    listings, complete = scrape_zipcode(driver, city, zip_code, crawl_state=crawl_state)
+    return job.run(listings, lambda listing_url: parse_listing_details(driver, listing_url, crawl_state), complete)
+
+def process_city(driver, city, zip_codes, writer, card_mode=False, crawl_state=None, seen_index=None):
     """Iterates through ZIP codes for a city and processes each listing."""
     for zip_code in zip_codes:
         print(f"\n🚀 Starting scrape for {city} (ZIP: {zip_code})")
-        listings = scrape_zipcode(city, zip_code)
-        process_listings_for_zipcode(city, zip_code, listings, conn)
+        scrape_and_process_zipcode(driver, city, zip_code, writer, card_mode, crawl_state, seen_index)
+    if seen_index:
+        seen_index.report(city)
 
 def load_data_from_file(file_path):
     """Reads city names and ZIP codes from a JSON file."""
@@ -277,31 +576,125 @@ def load_data_from_file(file_path):
 
 # --- MAIN EXECUTION ---
 
-if __name__ == "__main__":
-
-    # Start the pause/resume listener in a separate thread
-    listener_thread = threading.Thread(target=pause_resume_listener, daemon=True)
-    listener_thread.start()
+def main(argv=None, prog=None):
+    """Runs a crawl from command-line arguments (also `python cli.py scrape` / `resume`)."""
+    parser = argparse.ArgumentParser(prog=prog, description="Scrape Airbnb listings into the database.")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Number of browser processes to run in parallel (default 1).")
+    parser.add_argument("--backend", choices=["selenium", "http"], default="selenium",
+                        help="Fetch pages with a real browser or with async HTTP (default selenium).")
+    parser.add_argument("--concurrency", type=int, default=16,
+                        help="Requests in flight for the http backend (default 16).")
+    parser.add_argument("--mode", choices=["details", "cards"], default="details",
+                        help="'cards' builds records from search result cards and only opens "
+                             "detail pages when needed (default 'details').")
+    parser.add_argument("--state-file", default=CRAWL_STATE_FILE,
+                        help="SQLite file used to checkpoint progress and listing freshness.")
+    parser.add_argument("--ttl-hours", type=float, default=DEFAULT_TTL_HOURS,
+                        help=f"Skip listings scraped within this many hours (default {DEFAULT_TTL_HOURS}).")
+    parser.add_argument("--restart", action="store_true",
+                        help="Walk every ZIP again instead of resuming; listing TTLs still apply.")
+    parser.add_argument("--order", choices=["yield", "file"], default="yield",
+                        help="Crawl ZIPs by expected fresh listings per page load, or in file order (default yield).")
+    parser.add_argument("--page-budget", type=int, default=None,
+                        help="Only schedule ZIPs whose estimated page loads fit this budget.")
+    parser.add_argument("--expand-zipcodes", action="store_true",
+                        help="Add every ZIP ZipcodeBase lists for each city before scheduling.")
+    parser.add_argument("--storage", choices=STORAGE_BACKENDS, default="postgres",
+                        help="Write to Postgres as the crawl runs, or to a local file synced later (default postgres).")
+    parser.add_argument("--local-store", default=None,
+                        help="SQLite file for --storage local (default database_modules/listings_local.sqlite3).")
+    parser.add_argument("--metrics-port", type=int, default=None,
+                        help="Serve Prometheus metrics on this local port (/metrics and /metrics.json).")
+    parser.add_argument("--metrics-log", default=None,
+                        help="Append a JSON-lines metrics snapshot to this file every --metrics-interval seconds.")
+    parser.add_argument("--metrics-interval", type=float, default=DEFAULT_EXPORT_INTERVAL,
+                        help=f"Seconds between metrics snapshots in --metrics-log (default {DEFAULT_EXPORT_INTERVAL:g}).")
+    parser.add_argument("--headless", action="store_true",
+                        help="Run the browser(s) without a visible window.")
+    parser.add_argument("--max-pages-per-driver", type=int, default=DRIVER_MAX_PAGES,
+                        help=f"Restart each browser after this many page loads (default {DRIVER_MAX_PAGES}).")
+    parser.add_argument("--max-driver-rss-mb", type=int, default=DRIVER_MAX_RSS_MB,
+                        help=f"Restart a browser once its processes use this much memory (default {DRIVER_MAX_RSS_MB}).")
+    parser.add_argument("--profile-template", default=FIREFOX_PROFILE_TEMPLATE,
+                        help="Pre-warmed Firefox profile directory to copy for each browser.")
+    parser.add_argument("--control-port", type=int, default=DEFAULT_CONTROL_PORT,
+                        help=f"Local port for pause/resume/throttle/workers commands (default {DEFAULT_CONTROL_PORT}, "
+                             "0 disables).")
+    args = parser.parse_args(argv)
+    driver_settings = {
+        "max_pages": args.max_pages_per_driver,
+        "max_rss_mb": args.max_driver_rss_mb,
+        "profile_template": args.profile_template,
+    }
 
-    # Establish a PostgreSQL connection for Supabase
-    conn = get_db_connection()
-    #create_table(conn)
+    if args.metrics_port is not None:
+        start_metrics_server(args.metrics_port)
+    metrics_log = JsonLinesExporter(args.metrics_log, args.metrics_interval) if args.metrics_log else None
 
     # Load cities and ZIP codes from file.
     city_data = load_data_from_file(CITY_ZIP_FILE)
     if not city_data:
         print("❌ No cities found in the file. Exiting.")
-        driver.quit()
-        conn.close()
-        exit()
-
-    for city, zip_codes in city_data.items():
-        print(f"\n🚀 Starting Airbnb Scraping for {city}")
-        for zip_code in zip_codes:
-            print(f"\n🚀 Processing {city} (ZIP: {zip_code})")
-            listings = scrape_zipcode(city, zip_code)
-            process_listings_for_zipcode(city, zip_code, listings, conn)
-
-    driver.quit()
-    conn.close()
+        return 1
+
+    # Progress is checkpointed locally so a crashed or killed run resumes where it stopped.
+    crawl_state = CrawlState(args.state_file, ttl_hours=args.ttl_hours)
+    if args.restart:
+        crawl_state.reset_zipcodes()
+
+    # Scraped records are written to Supabase in the background from a connection pool, or to a
+    # local file that database_modules/local_store.py syncs later.
+    writer = open_listing_store(args.storage, local_path=args.local_store)
+    card_mode = args.mode == "cards"
+    # Listings shared between neighbouring ZIPs are only detail-parsed once per crawl.
+    seen_index = SeenListingIndex(crawl_state)
+    if args.order == "yield":
+        from scraper_modules.crawl_scheduler import schedule_crawl
+        city_data = schedule_crawl(city_data, crawl_state, writer, page_budget=args.page_budget,
+                                   expand=args.expand_zipcodes, card_mode=card_mode)
+
+    # Pause, resume, throttle and pool size are controlled over a local HTTP endpoint (see control.py).
+    control = CrawlControl(workers=args.workers, resizable=args.backend == "selenium" and args.workers > 1)
+    activate(control)
+    control_server = None
+    if args.control_port:
+        try:
+            control_server = start_control_server(control, args.control_port)
+        except OSError as e:
+            print(f"⚠️ Crawl control not available on port {args.control_port}: {e}")
+
+    try:
+        if args.backend == "http":
+            from scraper_modules.http_fetcher import run_http_backend
+            run_http_backend(city_data, writer, concurrency=args.concurrency, headless=True,
+                             card_mode=card_mode, crawl_state=crawl_state, seen_index=seen_index,
+                             driver_settings=driver_settings)
+        elif args.workers > 1:
+            from scraper_modules.worker_pool import run_pool
+            run_pool(city_data, writer, workers=args.workers, headless=True,
+                     card_mode=card_mode, crawl_state=crawl_state, seen_index=seen_index,
+                     driver_settings=driver_settings, control=control)
+        else:
+            driver = setup_driver(headless=args.headless, **driver_settings)
+            try:
+                for city, zip_codes in city_data.items():
+                    print(f"\n🚀 Starting Airbnb Scraping for {city}")
+                    process_city(driver, city, zip_codes, writer, card_mode, crawl_state, seen_index)
+            finally:
+                driver.quit()
+    finally:
+        try:
+            writer.close()
+        finally:
+            crawl_state.close()
+            if metrics_log:
+                metrics_log.stop()
+            if control_server:
+                control_server.shutdown()
+    seen_index.report()
     print("🏁 Scraping complete. All data pushed to the database.")
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
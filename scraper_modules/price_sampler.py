@@ -0,0 +1,184 @@
+"""
+price_sampler.py
+
+Multi-window nightly price sampling for listing pages.
+
+Loading a listing with random dates often lands on booked nights or breaks the
+host's minimum stay, so the price breakdown never renders and the scraper waits
+out the full price timeout for a null price. Instead:
+- the listing's availability calendar is read once, from the page already
+  loaded for the listing details; that page is loaded for a random window, and
+  its price, when the breakdown rendered, counts as one of the samples (or the
+  only one when the page has no calendar),
+- a few more bookable windows spread across the calendar are picked (minimum
+  stays respected),
+- a window is priced straight from the calendar when it carries day prices, and
+  otherwise by loading the listing for that window, where the breakdown is
+  known to render,
+- every (listing, window) price found is cached, in the crawl state when
+  there is one, so re-runs within the TTL don't load it again.
+
+The listing's price is the median of its window prices; the samples are kept on
+the details as "price_samples" so the spread is available too.
+"""
+
+import asyncio
+import threading
+import statistics
+from collections import OrderedDict
+from datetime import date, timedelta
+
+# Windows sampled per listing and nights per window (longer if the host's minimum stay requires it).
+PRICE_WINDOWS = 3
+WINDOW_NIGHTS = 3
+# Windows whose minimum stay is longer than this are monthly rentals; skip them.
+MAX_WINDOW_NIGHTS = 28
+# Window prices MemoryPriceCache keeps before evicting the least recently used.
+MEMORY_CACHE_SIZE = 20_000
+
+
+class MemoryPriceCache:
+    """
+    In-process stand-in for CrawlState's price sample cache, used when there is no crawl state.
+    Thread-safe, and holds at most max_size window prices (least recently used go first).
+    """
+
+    def __init__(self, max_size=MEMORY_CACHE_SIZE):
+        self.max_size = max_size
+        self.samples = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_price_sample(self, listing_id, check_in, check_out):
+        key = (listing_id, check_in, check_out)
+        with self._lock:
+            if key not in self.samples:
+                return False, None
+            self.samples.move_to_end(key)
+            return True, self.samples[key]
+
+    def put_price_sample(self, listing_id, check_in, check_out, price):
+        with self._lock:
+            key = (listing_id, check_in, check_out)
+            self.samples[key] = price
+            self.samples.move_to_end(key)
+            while len(self.samples) > self.max_size:
+                self.samples.popitem(last=False)
+
+
+def choose_price_windows(availability, count=PRICE_WINDOWS, nights=WINDOW_NIGHTS, today=None):
+    """
+    Picks up to `count` bookable (check_in, check_out) windows from an availability calendar
+    (see listing_extractor.extract_availability), spread evenly from the first to the last
+    bookable start date. Returns ISO date pairs.
+    """
+    today = today or date.today()
+    open_days = {}
+    for day, info in availability.items():
+        if info["available"]:
+            open_days[date.fromisoformat(day)] = info
+    candidates = []
+    for start in sorted(d for d in open_days if d > today):
+        stay = max(nights, open_days[start].get("min_nights") or 0)
+        if stay > MAX_WINDOW_NIGHTS:
+            continue
+        if all(start + timedelta(days=i) in open_days for i in range(1, stay)):
+            candidates.append((start, start + timedelta(days=stay)))
+    if len(candidates) > count:
+        step = (len(candidates) - 1) / (count - 1) if count > 1 else 0
+        candidates = [candidates[round(i * step)] for i in range(count)]
+    return [(check_in.isoformat(), check_out.isoformat()) for check_in, check_out in candidates]
+
+def window_bookable(availability, check_in, check_out):
+    """True if the calendar has every night of the window open and the stay meets the minimum."""
+    start, end = date.fromisoformat(check_in), date.fromisoformat(check_out)
+    first = availability.get(check_in)
+    if not first or (first.get("min_nights") or 0) > (end - start).days:
+        return False
+    return all(availability.get((start + timedelta(days=i)).isoformat(), {}).get("available")
+               for i in range((end - start).days))
+
+def plan_listing_windows(listing_id, page_window, page_price, availability, cache):
+    """
+    The windows to sample for a listing whose details page was loaded for page_window and showed
+    page_price (None if the breakdown didn't render). A page price is cached and sampled as one of
+    the windows, so that window is never loaded again; without a calendar it is the only one.
+    """
+    if page_price is not None:
+        cache.put_price_sample(listing_id, *page_window, page_price)
+    if not availability:
+        return [page_window] if page_price is not None else []
+    if page_price is None:
+        return choose_price_windows(availability)
+    return list(dict.fromkeys([page_window] + choose_price_windows(availability, count=PRICE_WINDOWS - 1)))
+
+def calendar_window_price(availability, check_in, check_out):
+    """Average nightly price of a window from the calendar's day prices, or None if any night lacks one."""
+    start, end = date.fromisoformat(check_in), date.fromisoformat(check_out)
+    prices = []
+    for i in range((end - start).days):
+        price = availability.get((start + timedelta(days=i)).isoformat(), {}).get("price")
+        if price is None:
+            return None
+        prices.append(price)
+    return round(sum(prices) / len(prices), 2) if prices else None
+
+def plan_price_samples(listing_id, windows, availability, cache):
+    """
+    Fills in every window that the cache or the calendar can price. Returns (samples, to_load),
+    where samples maps each window to its price (None until loaded) and to_load lists the windows
+    that still need a page load.
+    """
+    samples = {}
+    to_load = []
+    for window in windows:
+        found, price = cache.get_price_sample(listing_id, *window)
+        if not found:
+            price = calendar_window_price(availability, *window)
+            if price is None:
+                to_load.append(window)
+            else:
+                cache.put_price_sample(listing_id, *window, price)
+        samples[window] = price
+    return samples, to_load
+
+def store_price_samples(cache, listing_id, loaded):
+    """Caches the window prices that loaded; windows whose load failed are retried next time."""
+    for window, price in loaded.items():
+        if price is not None:
+            cache.put_price_sample(listing_id, *window, price)
+
+def apply_price_samples(listing_data, samples):
+    """Sets price to the median of the sampled window prices and keeps the samples alongside."""
+    listing_data["price_samples"] = [
+        {"check_in": check_in, "check_out": check_out, "price": price}
+        for (check_in, check_out), price in samples.items()
+    ]
+    prices = [price for price in samples.values() if price is not None]
+    if prices:
+        listing_data["price"] = round(statistics.median(prices), 2)
+    return listing_data
+
+def sample_listing_prices(listing_data, windows, availability, cache, load_window_price):
+    """
+    Prices `windows` for one listing and applies the result to listing_data. load_window_price
+    (check_in, check_out) loads the listing for one window and returns its nightly price or None.
+    """
+    listing_id = listing_data["listing_id"]
+    samples, to_load = plan_price_samples(listing_id, windows, availability, cache)
+    loaded = {window: load_window_price(*window) for window in to_load}
+    store_price_samples(cache, listing_id, loaded)
+    samples.update(loaded)
+    return apply_price_samples(listing_data, samples)
+
+async def sample_listing_prices_async(listing_data, windows, availability, cache, load_window_price):
+    """
+    sample_listing_prices for an async load_window_price; the window loads run concurrently.
+    Cache reads and writes run in a thread, since the crawl state's cache is a SQLite file.
+    """
+    listing_id = listing_data["listing_id"]
+    samples, to_load = await asyncio.to_thread(plan_price_samples, listing_id, windows, availability, cache)
+    prices = await asyncio.gather(*(load_window_price(*window) for window in to_load))
+    loaded = dict(zip(to_load, prices))
+    await asyncio.to_thread(store_price_samples, cache, listing_id, loaded)
+    samples.update(loaded)
+    return apply_price_samples(listing_data, samples)
@@ -0,0 +1,135 @@
+"""
+rate_control.py
+
+Adaptive request pacing for the scrapers.
+
+Each host gets a token bucket whose refill rate is tuned AIMD-style from what
+the server is doing:
+- a fast, clean response adds a little to the rate (additive increase),
+- a slow response or an error page halves it (multiplicative decrease),
+- a captcha / block page cuts it to a quarter and pauses the host for a
+  cool-down period.
+
+Callers ask the controller how long to wait before a request (`wait` for
+threads, `wait_async` for asyncio), then report the latency and outcome with
+`record`. This replaces the fixed 1-3 s randomize_sleep between pages.
+
+A controller can also take a `scale` callable whose value multiplies every
+pacer's rate at each request; the crawl control's throttle and the browser
+pool's per-worker share come in this way, so they apply without touching the
+AIMD state.
+"""
+
+import time
+import random
+import asyncio
+import threading
+from urllib.parse import urlparse
+
+OUTCOME_OK = "ok"
+OUTCOME_ERROR = "error"
+OUTCOME_BLOCKED = "blocked"
+
+DEFAULT_INITIAL_RATE = 0.5
+DEFAULT_MAX_RATE = 4.0
+
+
+class HostPacer:
+    """Token bucket for one host with an AIMD-controlled refill rate (requests/sec)."""
+
+    def __init__(self, initial_rate=DEFAULT_INITIAL_RATE, min_rate=0.02, max_rate=DEFAULT_MAX_RATE, burst=1.0,
+                 increase_step=0.05, decrease_factor=0.5, block_factor=0.25,
+                 latency_target=5.0, block_cooldown=180.0, jitter=0.3):
+        self.rate = min(initial_rate, max_rate)
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.burst = burst
+        self.increase_step = increase_step
+        self.decrease_factor = decrease_factor
+        self.block_factor = block_factor
+        self.latency_target = latency_target
+        self.block_cooldown = block_cooldown
+        self.jitter = jitter
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self, scale=1.0):
+        """Takes one token and returns how many seconds the caller must wait before using it.
+        scale multiplies the refill rate for this reservation."""
+        with self._lock:
+            now = time.monotonic()
+            rate = self.rate * scale
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * rate)
+            self.updated = now
+            self.tokens -= 1
+            wait = max(0.0, -self.tokens / rate)
+            wait = max(wait, self.blocked_until - now)
+        if wait and self.jitter:
+            wait *= random.uniform(1.0, 1.0 + self.jitter)
+        return wait
+
+    def record(self, latency, outcome=OUTCOME_OK):
+        """Adjusts the rate from one observed response. Returns the new rate."""
+        with self._lock:
+            if outcome == OUTCOME_BLOCKED:
+                self.rate = max(self.min_rate, self.rate * self.block_factor)
+                self.blocked_until = time.monotonic() + self.block_cooldown
+                self.tokens = min(self.tokens, 0.0)
+            elif outcome == OUTCOME_ERROR or latency > self.latency_target:
+                self.rate = max(self.min_rate, self.rate * self.decrease_factor)
+            else:
+                self.rate = min(self.max_rate, self.rate + self.increase_step)
+            return self.rate
+
+
+class RateController:
+    """Per-host pacers, created on first use.
+
+    Pacers live in one process. When several processes hit the same host, pass
+    each a `scale` that returns its share of the budget (e.g. 1/N for N workers)
+    so they add up to the same overall rate.
+    """
+
+    def __init__(self, scale=None, **pacer_settings):
+        self.scale = scale
+        self.pacer_settings = pacer_settings
+        self.pacers = {}
+        self._lock = threading.Lock()
+
+    def pacer(self, url):
+        host = urlparse(url).netloc or url
+        with self._lock:
+            if host not in self.pacers:
+                self.pacers[host] = HostPacer(**self.pacer_settings)
+            return self.pacers[host]
+
+    def reserve(self, url):
+        return self.pacer(url).reserve(self.scale() if self.scale else 1.0)
+
+    def wait(self, url):
+        """Blocks the calling thread until a request to url's host is allowed."""
+        delay = self.reserve(url)
+        if delay:
+            time.sleep(delay)
+        return delay
+
+    async def wait_async(self, url):
+        """Awaits until a request to url's host is allowed without blocking the event loop."""
+        delay = self.reserve(url)
+        if delay:
+            await asyncio.sleep(delay)
+        return delay
+
+    def record(self, url, latency, outcome=OUTCOME_OK):
+        pacer = self.pacer(url)
+        old_rate = pacer.rate
+        new_rate = pacer.record(latency, outcome)
+        if outcome == OUTCOME_BLOCKED:
+            print(f"🛑 Blocked by {urlparse(url).netloc}; cooling down {pacer.block_cooldown:.0f}s, "
+                  f"rate {old_rate:.2f} -> {new_rate:.2f} req/s")
+        elif new_rate < old_rate:
+            print(f"🐢 Slowing down {urlparse(url).netloc}: {old_rate:.2f} -> {new_rate:.2f} req/s "
+                  f"({outcome}, {latency:.1f}s)")
+        return new_rate
@@ -0,0 +1,381 @@
+"""
+worker_pool.py
+
+Runs the listing scraper across several independent browser processes.
+
+Each worker process owns one headless Firefox and pulls tasks from a shared
+work queue. A task is either one search result page of a ZIP code (addressed
+by offset, so several pages of the same ZIP can load on different workers at
+once) or a single listing URL (parse its detail page). Every result goes back over one
+shared results queue, and the parent process hands the records to the
+write-behind writer. Each result also carries the metrics the worker recorded
+since its last one, which the parent merges into its own, so the exported
+metrics cover page loads in every worker.
+
+Each worker writes the id of the task it takes to a shared-memory slot before
+running it, so the parent knows what every worker is busy with. If a worker
+process dies mid-task (the browser took it down, or it was killed), that task
+comes back as a failed result instead of leaving the crawl waiting for it.
+"""
+
+import os
+import sys
+import time
+import queue
+import multiprocessing as mp
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from metrics import merge_deltas, reset as reset_metrics, take_deltas
+from scraper_modules import listing_scraper
+from scraper_modules.listing_scraper import (
+    MAX_SEARCH_PAGES,
+    setup_driver,
+    generate_random_search_params,
+    load_search_page,
+    merge_search_page,
+    parse_listing_details,
+    ZipcodeJob,
+)
+from scraper_modules.control import CrawlControl, activate
+from scraper_modules.crawl_state import CrawlState
+from scraper_modules.rate_control import RateController
+
+TASK_SEARCH_PAGE = "search_page"
+TASK_LISTING = "listing"
+
+# How often the parent checks that workers are still alive while waiting for results.
+RESULT_POLL_SECONDS = 30
+# How often the parent applies worker count changes and idle workers check whether they were retired.
+WORKER_POLL_SECONDS = 1.0
+
+# Each worker opens its own connection to the crawl state for cached window prices.
+price_cache = None
+
+
+def _run_search_page_task(driver, city, zip_code, search_params, page):
+    print(f"🔍 Scraping {city} (ZIP: {zip_code}), Page {page}")
+    return load_search_page(driver, zip_code, search_params, page)
+
+def _run_listing_task(driver, city, zip_code, listing_url):
+    return parse_listing_details(driver, listing_url, price_cache)
+
+TASK_HANDLERS = {
+    TASK_SEARCH_PAGE: _run_search_page_task,
+    TASK_LISTING: _run_listing_task,
+}
+
+def _worker_main(worker_id, task_queue, result_queue, headless, control, stop, current_task, driver_settings,
+                 state_settings):
+    """Worker loop: start a private driver, then run tasks until the None sentinel arrives or the
+    pool retires this worker (stop is set). current_task holds the id of the last task taken."""
+    global price_cache
+    # A forked worker starts with a copy of the parent's series; only its own are sent back.
+    reset_metrics()
+    # All workers hit the same host, so each paces itself with its share of the (throttled) budget.
+    activate(control)
+    listing_scraper.rate_controller = RateController(scale=control.worker_share)
+    if state_settings:
+        price_cache = CrawlState(**state_settings)
+    try:
+        driver = setup_driver(headless=headless, **driver_settings)
+    except Exception as e:
+        print(f"❌ Worker {worker_id} could not start a browser: {e}")
+        return
+    print(f"🧵 Worker {worker_id} ready (pid {os.getpid()})")
+    try:
+        while not stop.is_set():
+            control.wait_while_paused()
+            try:
+                task = task_queue.get(timeout=WORKER_POLL_SECONDS)
+            except queue.Empty:
+                continue
+            if task is None:
+                break
+            task_id, kind, args = task
+            # Shared memory, so the parent sees it even if this process dies before the next line.
+            current_task.value = task_id
+            try:
+                result, error = TASK_HANDLERS[kind](driver, *args), None
+            except Exception as e:
+                result, error = None, repr(e)
+            result_queue.put((task_id, kind, args, result, error, take_deltas()))
+    finally:
+        driver.quit()
+    if stop.is_set():
+        print(f"🧵 Worker {worker_id} retired")
+
+
+class BrowserPool:
+    """Browser worker processes fed from one task queue, resized to follow control.workers."""
+
+    def __init__(self, workers, headless=True, driver_settings=None, state_settings=None, control=None):
+        self.headless = headless
+        self.driver_settings = driver_settings or {}
+        self.state_settings = state_settings
+        self.control = control or CrawlControl(workers=workers, resizable=True)
+        self.task_queue = mp.Queue()
+        self.result_queue = mp.Queue()
+        self.processes = []  # (process, stop event) for every worker started, retired ones included
+        self.workers = {}  # worker id -> (process, shared id of the last task it took)
+        self.tasks = {}  # task id -> (kind, args) for every task submitted and not yet returned
+        self.pending = 0
+        self._next_task_id = 0
+        self._next_worker_id = 0
+        self._target = self.control.workers
+
+    def running_workers(self):
+        """(process, stop) for the workers currently running and not retiring."""
+        return [(p, stop) for p, stop in self.processes if p.is_alive() and not stop.is_set()]
+
+    def _start_worker(self):
+        stop = mp.Event()
+        current_task = mp.Value("q", -1, lock=False)
+        p = mp.Process(
+            target=_worker_main,
+            args=(self._next_worker_id, self.task_queue, self.result_queue, self.headless, self.control, stop,
+                  current_task, self.driver_settings, self.state_settings),
+            daemon=True,
+        )
+        p.start()
+        self.workers[self._next_worker_id] = (p, current_task)
+        self._next_worker_id += 1
+        self.processes.append((p, stop))
+
+    def start(self):
+        for _ in range(self.control.workers):
+            self._start_worker()
+        return self
+
+    def resize(self):
+        """
+        Starts or retires workers once control.workers changes. Retiring workers finish their current
+        task first. Workers that died on their own are not replaced.
+        """
+        target = self.control.workers
+        if target == self._target:
+            return
+        self._target = target
+        running = self.running_workers()
+        if target > len(running):
+            print(f"🧵 Growing the pool from {len(running)} to {target} workers")
+            for _ in range(target - len(running)):
+                self._start_worker()
+        elif target < len(running):
+            print(f"🧵 Shrinking the pool from {len(running)} to {target} workers")
+            for _, stop in running[target:]:
+                stop.set()
+
+    def submit(self, kind, *args):
+        """Queues a task and returns its id."""
+        task_id = self._next_task_id
+        self._next_task_id += 1
+        self.tasks[task_id] = (kind, args)
+        self.task_queue.put((task_id, kind, args))
+        self.pending += 1
+        return task_id
+
+    def _finish(self, task_id, kind, args, result, error):
+        del self.tasks[task_id]
+        self.pending -= 1
+        self.resize()
+        return task_id, kind, args, result, error
+
+    def _dead_worker_tasks(self):
+        """{worker id: task id} for the workers that exited with their last task still unreturned."""
+        return {worker_id: current_task.value for worker_id, (p, current_task) in self.workers.items()
+                if current_task.value in self.tasks and not p.is_alive()}
+
+    def next_result(self):
+        """
+        Blocks until any worker finishes a task and returns (task_id, kind, args, result, error).
+        The worker's metrics that came with it are merged into this process's. A task whose worker
+        died before returning it comes back with an error.
+        """
+        last_check = time.monotonic()
+        # Workers seen dead with a task out. A worker's results are all in the queue by the time it
+        # has exited, so if the queue then stays empty for a whole poll, the task's result never came.
+        dead = {}
+        while True:
+            try:
+                item = self.result_queue.get(timeout=WORKER_POLL_SECONDS)
+            except queue.Empty:
+                self.resize()
+                for worker_id, task_id in dead.items():
+                    if task_id in self.tasks:
+                        exitcode = self.workers[worker_id][0].exitcode
+                        print(f"❌ Worker {worker_id} exited (code {exitcode}) while running task {task_id}")
+                        return self._finish(task_id, *self.tasks[task_id], None,
+                                            f"worker {worker_id} exited with code {exitcode}")
+                dead = self._dead_worker_tasks()
+                if time.monotonic() - last_check >= RESULT_POLL_SECONDS:
+                    last_check = time.monotonic()
+                    if not dead and not any(p.is_alive() for p, _ in self.processes):
+                        raise RuntimeError("All browser workers have exited with tasks still pending.")
+                continue
+            *item, deltas = item
+            merge_deltas(deltas)
+            if item[0] not in self.tasks:
+                # Already returned as lost: the worker's result was still in flight when it exited.
+                continue
+            return self._finish(*item)
+
+    def close(self):
+        for _ in self.running_workers():
+            self.task_queue.put(None)
+        for p, _ in self.processes:
+            p.join(timeout=60)
+            if p.is_alive():
+                p.terminate()
+        self.processes = []
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class ZipcodePagination:
+    """Tracks the windowed, out-of-order pagination of one ZIP code across workers."""
+
+    def __init__(self, city, zip_code, window, max_pages=MAX_SEARCH_PAGES, crawl_state=None):
+        self.city = city
+        self.zip_code = zip_code
+        self.window = window
+        self.max_pages = max_pages
+        self.crawl_state = crawl_state
+        self.search_params = generate_random_search_params()
+        self.listings = {}
+        self.next_page = 1
+        self.window_results = {}
+        self.window_pages = []
+        self.done = False
+        self.failed = False
+
+    def next_window(self):
+        """Returns the page numbers to submit next (empty once pagination is finished)."""
+        if self.done or self.next_page > self.max_pages:
+            self.done = True
+            return []
+        last = min(self.next_page + self.window, self.max_pages + 1)
+        self.window_pages = list(range(self.next_page, last))
+        self.window_results = {}
+        self.next_page = last
+        return self.window_pages
+
+    def add_page(self, page, page_listings):
+        """
+        Records one finished page; page_listings is None if the page failed (blocked, or the
+        worker errored). Returns True once the whole current window is in. Pagination ends at
+        the first failed page and the ZIP is flagged as failed.
+        """
+        self.window_results[page] = page_listings
+        if len(self.window_results) < len(self.window_pages):
+            return False
+        for page_number in self.window_pages:
+            page_listings = self.window_results[page_number]
+            if page_listings is None:
+                print(f"⚠️ {self.city} (ZIP {self.zip_code}): page {page_number} failed to load")
+                self.done = True
+                self.failed = True
+                break
+            new_count = merge_search_page(self.listings, page_listings)
+            if self.crawl_state:
+                self.crawl_state.record_page(self.city, self.zip_code, page_number, len(page_listings), new_count)
+            if new_count == 0:
+                print(f"⏹️ {self.city} (ZIP {self.zip_code}): page {page_number} added no new listings")
+                self.done = True
+                break
+        return True
+
+
+def run_pool(city_data, writer, workers=4, headless=True, card_mode=False, page_window=None, crawl_state=None,
+             seen_index=None, driver_settings=None, control=None):
+    """
+    Scrapes every city/ZIP in city_data with a pool of browser workers.
+
+    Search result pages are addressed by offset and submitted `page_window`
+    at a time per ZIP (default: one per worker); a ZIP stops paginating after
+    the first page that adds no new listing IDs, and its listings are queued
+    for detail parsing once pagination is done.
+
+    With card_mode, records are built from the search cards in the parent and
+    only listings that need a detail page are sent to the workers.
+
+    With a crawl_state, finished ZIPs are skipped, listings within the TTL are
+    not re-parsed, and a ZIP is checkpointed as done once its last listing task
+    has come back, unless one of its search pages failed. With a seen_index, listings another ZIP already claimed are
+    not parsed again.
+
+    ZIPs are started lazily (at most one per worker paginating at a time) so
+    listing tasks from finished ZIPs get interleaved with new searches instead
+    of waiting behind the whole ZIP list.
+
+    With a control (see control.py), the pool pauses, throttles and grows or
+    shrinks while running; the page window stays as it was at the start.
+    """
+    page_window = page_window or workers
+    zip_tasks = iter([(city, zip_code) for city, zip_codes in city_data.items() for zip_code in zip_codes])
+    paginating = {}
+    jobs = {}
+    queued = 0
+
+    def submit_window(state):
+        for page in state.next_window():
+            pool.submit(TASK_SEARCH_PAGE, state.city, state.zip_code, state.search_params, page)
+
+    def feed_zipcodes():
+        while len(paginating) < pool.control.workers:
+            next_zip = next(zip_tasks, None)
+            if next_zip is None:
+                return
+            job = ZipcodeJob(*next_zip, writer, card_mode, crawl_state, seen_index)
+            if not job.start():
+                continue
+            jobs[next_zip] = job
+            state = ZipcodePagination(*next_zip, window=page_window, crawl_state=crawl_state)
+            paginating[next_zip] = state
+            submit_window(state)
+
+    def finish_job(job):
+        nonlocal queued
+        del jobs[(job.city, job.zip_code)]
+        queued += job.queued
+
+    def finish_zipcode(state):
+        print(f"📊 Total unique listings found in {state.city} (ZIP {state.zip_code}): {len(state.listings)}")
+        job = jobs[(state.city, state.zip_code)]
+        detail_urls = job.plan(state.listings, complete=not state.failed)
+        for listing_url in detail_urls:
+            pool.submit(TASK_LISTING, state.city, state.zip_code, listing_url)
+        if not detail_urls:
+            finish_job(job)
+
+    state_settings = None
+    if crawl_state:
+        state_settings = {"path": crawl_state.path, "ttl_hours": crawl_state.ttl_seconds / 3600}
+    with BrowserPool(workers, headless=headless, driver_settings=driver_settings,
+                     state_settings=state_settings, control=control) as pool:
+        feed_zipcodes()
+        while pool.pending:
+            task_id, kind, args, result, error = pool.next_result()
+            if kind == TASK_SEARCH_PAGE:
+                city, zip_code, _, page = args
+                state = paginating[(city, zip_code)]
+                if error:
+                    print(f"❌ Search page {page} failed for {city} (ZIP {zip_code}): {error}")
+                if state.add_page(page, None if error else result):
+                    submit_window(state)
+                    if state.done:
+                        del paginating[(city, zip_code)]
+                        finish_zipcode(state)
+                        feed_zipcodes()
+            else:
+                city, zip_code, listing_url = args
+                if error:
+                    print(f"❌ Listing task failed for {listing_url}: {error}")
+                job = jobs[(city, zip_code)]
+                if job.add_details(listing_url, None if error else result):
+                    finish_job(job)
+
+    print(f"🏁 Worker pool finished: {queued} listings queued with {workers} workers.")
+    return queued
@@ -0,0 +1,151 @@
+"""
+zip_index.py
+
+Offline geospatial index of ZIP code centroids.
+
+calculate_distance and get_postal_codes_within_radius in zipcodebase_extended
+make an API call per query, which is far too slow for coverage planning that
+needs thousands of ZIP-to-ZIP distances. This module keeps a local centroid
+table, populated once through lookup_zip_codes, and answers:
+- haversine distance matrices between any two lists of ZIPs, vectorized in NumPy,
+- radius queries through a BallTree on the sphere (haversine metric),
+with the same return shapes as the API functions (distances in km).
+
+    python scraper_modules/zip_index.py            # build from cities_and_zipcodes.json
+"""
+
+import os
+import sys
+import csv
+import json
+import numpy as np
+from sklearn.neighbors import BallTree
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from scraper_modules.zipcodebase_extended import lookup_zip_codes
+
+ZIP_CENTROIDS_FILE = os.path.join(os.path.dirname(__file__), "zip_centroids.csv")
+CITY_ZIP_FILE = os.path.join(os.path.dirname(__file__), "cities_and_zipcodes.json")
+EARTH_RADIUS_KM = 6371.0088
+CENTROID_COLUMNS = ["postal_code", "latitude", "longitude", "city", "state"]
+
+
+def haversine_matrix(lat1, lon1, lat2, lon2):
+    """Great-circle distances in km between every (lat1, lon1) point and every (lat2, lon2) point,
+    as a len(lat1) x len(lat2) array. Inputs are in degrees."""
+    lat1, lon1 = np.radians(lat1)[:, None], np.radians(lon1)[:, None]
+    lat2, lon2 = np.radians(lat2)[None, :], np.radians(lon2)[None, :]
+    h = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(h, 0.0, 1.0)))
+
+
+class ZipIndex:
+    """ZIP centroids held as NumPy arrays, with a haversine BallTree for radius queries."""
+
+    def __init__(self, codes, latitudes, longitudes, cities=None, states=None):
+        self.codes = list(codes)
+        self.positions = {code: i for i, code in enumerate(self.codes)}
+        self.latitudes = np.asarray(latitudes, dtype=float)
+        self.longitudes = np.asarray(longitudes, dtype=float)
+        self.cities = list(cities) if cities is not None else [None] * len(self.codes)
+        self.states = list(states) if states is not None else [None] * len(self.codes)
+        self.tree = BallTree(np.radians(np.column_stack([self.latitudes, self.longitudes])), metric="haversine")
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __contains__(self, code):
+        return code in self.positions
+
+    # --- Building and storage ---
+
+    @classmethod
+    def build(cls, codes, country="US", lookup=lookup_zip_codes):
+        """Looks the codes up once through the ZipcodeBase API (chunked and cached by the client)."""
+        response = lookup(list(codes), country)
+        if response is None:
+            raise RuntimeError("ZIP lookup failed; cannot build the centroid index.")
+        rows = []
+        for code in codes:
+            places = response["results"].get(code)
+            if not places:
+                print(f"⚠️ No centroid for ZIP {code}; leaving it out of the index")
+                continue
+            place = places[0]
+            rows.append((code, float(place["latitude"]), float(place["longitude"]),
+                         place.get("city"), place.get("state_code") or place.get("state")))
+        return cls.from_rows(rows)
+
+    @classmethod
+    def from_rows(cls, rows):
+        if not rows:
+            raise ValueError("A ZIP index needs at least one centroid.")
+        codes, latitudes, longitudes, cities, states = zip(*rows)
+        return cls(codes, latitudes, longitudes, cities, states)
+
+    @classmethod
+    def load(cls, path=ZIP_CENTROIDS_FILE):
+        with open(path, newline="") as f:
+            rows = [(r["postal_code"], float(r["latitude"]), float(r["longitude"]), r["city"] or None,
+                     r["state"] or None) for r in csv.DictReader(f)]
+        return cls.from_rows(rows)
+
+    def save(self, path=ZIP_CENTROIDS_FILE):
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(CENTROID_COLUMNS)
+            for i, code in enumerate(self.codes):
+                writer.writerow([code, f"{self.latitudes[i]:.6f}", f"{self.longitudes[i]:.6f}",
+                                 self.cities[i] or "", self.states[i] or ""])
+
+    # --- Queries ---
+
+    def _positions_of(self, codes):
+        missing = [code for code in codes if code not in self.positions]
+        if missing:
+            raise KeyError(f"ZIP codes not in the index: {', '.join(missing[:10])}")
+        return np.fromiter((self.positions[code] for code in codes), dtype=np.intp, count=len(codes))
+
+    def distance_matrix(self, from_codes, to_codes=None):
+        """Haversine distances in km, shape (len(from_codes), len(to_codes)); to_codes defaults to from_codes."""
+        rows = self._positions_of(list(from_codes))
+        cols = rows if to_codes is None else self._positions_of(list(to_codes))
+        return haversine_matrix(self.latitudes[rows], self.longitudes[rows],
+                                self.latitudes[cols], self.longitudes[cols])
+
+    def radius_query(self, codes, radius_km):
+        """For each code, (positions, distances_km) of every indexed ZIP within radius_km, nearest first."""
+        rows = self._positions_of(list(codes))
+        points = np.radians(np.column_stack([self.latitudes[rows], self.longitudes[rows]]))
+        positions, distances = self.tree.query_radius(points, r=radius_km / EARTH_RADIUS_KM,
+                                                      return_distance=True, sort_results=True)
+        return [(p, d * EARTH_RADIUS_KM) for p, d in zip(positions, distances)]
+
+    # --- Drop-in versions of the API functions ---
+
+    def calculate_distance(self, from_zip, to_zip, country="US"):
+        """Same shape as zipcodebase_extended.calculate_distance: {"query": ..., "results": {code: km}}."""
+        compare = list(to_zip) if isinstance(to_zip, list) else [to_zip]
+        distances = self.distance_matrix([from_zip], compare)[0]
+        return {"query": {"code": from_zip, "compare": compare, "country": country, "unit": "km"},
+                "results": {code: round(float(d), 3) for code, d in zip(compare, distances)}}
+
+    def get_postal_codes_within_radius(self, zip_code, radius, country="US"):
+        """Same shape as zipcodebase_extended.get_postal_codes_within_radius (radius in km)."""
+        positions, distances = self.radius_query([zip_code], radius)[0]
+        results = [{"code": self.codes[p], "city": self.cities[p], "state": self.states[p],
+                    "distance": round(float(d), 3)} for p, d in zip(positions, distances)]
+        return {"query": {"code": zip_code, "radius": radius, "country": country}, "results": results}
+
+
+def build_from_city_file(city_file=CITY_ZIP_FILE, path=ZIP_CENTROIDS_FILE):
+    """Builds the centroid table for every ZIP in the city file and saves it."""
+    with open(city_file) as f:
+        city_data = json.load(f)
+    codes = list(dict.fromkeys(code for zip_codes in city_data.values() for code in zip_codes))
+    index = ZipIndex.build(codes)
+    index.save(path)
+    print(f"🗺️ Saved {len(index)} ZIP centroids to {path}")
+    return index
+
+if __name__ == "__main__":
+    build_from_city_file()
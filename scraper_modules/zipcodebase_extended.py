@@ -12,30 +12,267 @@ Endpoints covered:
 - Postal codes by city (/city)
 - Postal codes by state (/state)
 - Provinces/States of a country (/states)
+
+Requests go through ZipcodebaseClient, which keeps one pooled session with
+retries, caches answers on disk with a TTL (they almost never change, and every
+call costs credits), splits long `codes` lists into API-sized chunks and sends
+the chunks concurrently under a rate limit. The module-level functions wrap a
+shared default client. Set ZIPCODEBASE_BASE_URL to point it at a local stub
+(see benchmarks/zipcodebase_stub.py).
 """
 
+import os
+import json
+import time
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import sys
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from scraper_modules.rate_control import OUTCOME_ERROR, OUTCOME_OK, RateController
+
 # if ur going to use this class then ingest from .env file
-API_KEY = ""
-BASE_URL = "https://app.zipcodebase.com/api/v1/"
+API_KEY = os.environ.get("ZIPCODEBASE_API_KEY", "")
+BASE_URL = os.environ.get("ZIPCODEBASE_BASE_URL", "https://app.zipcodebase.com/api/v1/").rstrip("/") + "/"
+
+ZIPCODEBASE_CACHE_FILE = os.path.join(os.path.dirname(__file__), "zipcodebase_cache.sqlite3")
+DEFAULT_CACHE_TTL_HOURS = 24 * 30
+# Most codes the API accepts in one `codes` / `compare` parameter.
+MAX_CODES_PER_REQUEST = 100
+MAX_CONCURRENT_REQUESTS = 4
+REQUEST_TIMEOUT_SECONDS = 15
+
+
+class ResponseCache:
+    """On-disk JSON cache with a TTL, keyed by request or by single postal code."""
+
+    def __init__(self, path=ZIPCODEBASE_CACHE_FILE, ttl_hours=DEFAULT_CACHE_TTL_HOURS):
+        self.path = path
+        self.ttl_seconds = ttl_hours * 3600
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, body TEXT NOT NULL, fetched_at REAL NOT NULL)"
+        )
+        self.conn.commit()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Returns the cached value for key, or None if missing or older than the TTL."""
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT body FROM responses WHERE key = ? AND fetched_at >= ?",
+                (key, time.time() - self.ttl_seconds),
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put_many(self, items):
+        """Stores {key: value}."""
+        now = time.time()
+        with self._lock:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO responses (key, body, fetched_at) VALUES (?, ?, ?)",
+                [(key, json.dumps(value), now) for key, value in items.items()],
+            )
+            self.conn.commit()
+
+    def put(self, key, value):
+        self.put_many({key: value})
+
+    def close(self):
+        self.conn.close()
+
+
+def chunked(items, size):
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+class ZipcodebaseClient:
+    """
+    ZipcodeBase client with a pooled, retrying session, an on-disk TTL cache and chunked,
+    concurrent, rate-limited requests. Pass cache_path=None to disable the cache.
+    """
+
+    def __init__(self, api_key=API_KEY, base_url=BASE_URL, cache_path=ZIPCODEBASE_CACHE_FILE,
+                 ttl_hours=DEFAULT_CACHE_TTL_HOURS, max_workers=MAX_CONCURRENT_REQUESTS,
+                 requests_per_second=5.0, chunk_size=MAX_CODES_PER_REQUEST):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/") + "/"
+        self.chunk_size = chunk_size
+        self.max_workers = max_workers
+        self.cache = ResponseCache(cache_path, ttl_hours) if cache_path else None
+        self.rate_controller = RateController(initial_rate=requests_per_second, max_rate=requests_per_second)
+        self.session = requests.Session()
+        retry = Retry(total=3, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504),
+                      allowed_methods=("GET",))
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers, max_retries=retry)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.stats = {"requests": 0, "cache_hits": 0}
+        # Chunks are fetched from a thread pool, so the counters need a lock.
+        self._stats_lock = threading.Lock()
+
+    def close(self):
+        self.session.close()
+        if self.cache:
+            self.cache.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _count(self, name):
+        with self._stats_lock:
+            self.stats[name] += 1
+
+    # --- Transport ---
+
+    def _request(self, path, params):
+        """GETs one endpoint under the rate limit. Returns the JSON body, or raises requests.RequestException."""
+        url = self.base_url + path
+        self.rate_controller.wait(url)
+        started = time.monotonic()
+        try:
+            response = self.session.get(url, params={"apikey": self.api_key, **params},
+                                        timeout=REQUEST_TIMEOUT_SECONDS)
+            response.raise_for_status()
+            body = response.json()
+        except requests.RequestException:
+            self.rate_controller.record(url, time.monotonic() - started, OUTCOME_ERROR)
+            raise
+        self.rate_controller.record(url, time.monotonic() - started, OUTCOME_OK)
+        self._count("requests")
+        return body
+
+    def _cached_request(self, path, params, error_label):
+        """One request, answered from the cache when possible. Returns None on error."""
+        key = path + "?" + "&".join(f"{k}={params[k]}" for k in sorted(params))
+        if self.cache:
+            cached = self.cache.get(key)
+            if cached is not None:
+                self._count("cache_hits")
+                return cached
+        try:
+            body = self._request(path, params)
+        except requests.RequestException as e:
+            print(f"Error {error_label}: {e}")
+            return None
+        if self.cache:
+            self.cache.put(key, body)
+        return body
+
+    def _per_code_request(self, path, codes, key_prefix, build_params, error_label):
+        """
+        Resolves each code's entry of the response "results" from the cache, fetches the rest in
+        chunks of chunk_size (concurrently), and caches every code that came back, including codes
+        the API had no result for. Returns {code: result}, or None if nothing could be resolved.
+        """
+        results = {}
+        missing = []
+        for code in dict.fromkeys(codes):
+            cached = self.cache.get(key_prefix + code) if self.cache else None
+            if cached is None:
+                missing.append(code)
+                continue
+            self._count("cache_hits")
+            # [] marks a code the API had no result for.
+            if cached != []:
+                results[code] = cached
+        failed = False
+
+        def fetch(chunk):
+            try:
+                return chunk, self._request(path, build_params(chunk))
+            except requests.RequestException as e:
+                print(f"Error {error_label}: {e}")
+                return chunk, None
+
+        chunks = chunked(missing, self.chunk_size)
+        if not chunks:
+            return results
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(chunks))) as executor:
+            for chunk, body in executor.map(fetch, chunks):
+                if body is None:
+                    failed = True
+                    continue
+                chunk_results = body.get("results") or {}
+                if isinstance(chunk_results, list):
+                    # The API answers with an empty list instead of an object when nothing matched.
+                    chunk_results = {}
+                results.update(chunk_results)
+                if self.cache:
+                    self.cache.put_many({key_prefix + code: chunk_results.get(code, []) for code in chunk})
+        if failed and not results:
+            return None
+        return results
+
+    # --- Endpoints ---
+
+    def lookup_zip_codes(self, codes, country="US"):
+        """Location information for any number of postal codes, in the API's response shape."""
+        codes = list(codes)
+        results = self._per_code_request(
+            "search", codes, f"search:{country}:",
+            lambda chunk: {"codes": ",".join(chunk), "country": country},
+            "fetching zip code data",
+        )
+        if results is None:
+            return None
+        return {"query": {"codes": codes, "country": country}, "results": results}
+
+    def calculate_distance(self, from_zip, to_zip, country="US"):
+        """Distances from from_zip to one or more postal codes, in the API's response shape."""
+        compare = list(to_zip) if isinstance(to_zip, list) else [to_zip]
+        results = self._per_code_request(
+            "distance", compare, f"distance:{country}:{from_zip}:",
+            lambda chunk: {"country": country, "code": from_zip, "compare": ",".join(chunk)},
+            "calculating distance",
+        )
+        if results is None:
+            return None
+        return {"query": {"code": from_zip, "compare": compare, "country": country}, "results": results}
+
+    def get_postal_codes_within_radius(self, zip_code, radius, country="US"):
+        return self._cached_request("radius", {"country": country, "code": zip_code, "radius": radius},
+                                    "fetching postal codes within radius")
+
+    def get_postal_codes_by_city(self, city, country="US", state_name=None, limit=None):
+        params = {"city": city, "country": country}
+        if state_name:
+            params["state_name"] = state_name
+        if limit:
+            params["limit"] = limit
+        return self._cached_request("code/city", params, "fetching postal codes by city")
+
+    def get_postal_codes_by_state(self, state, country="US", limit=None):
+        params = {"state_name": state, "country": country}
+        if limit:
+            params["limit"] = limit
+        return self._cached_request("code/state", params, "fetching postal codes by state")
+
+    def get_states(self, country="US"):
+        return self._cached_request("country/province", {"country": country}, "fetching states")
+
+
+_default_client = None
+
+def default_client():
+    """The shared client behind the module-level functions, created on first use."""
+    global _default_client
+    if _default_client is None:
+        _default_client = ZipcodebaseClient()
+    return _default_client
 
 def lookup_zip_codes(codes, country="US"):
     """
     Lookup location information for a list of postal codes.
     """
-    endpoint = BASE_URL + "search"
-    params = {
-        "apikey": API_KEY,
-        "codes": ",".join(codes),
-        "country": country
-    }
-    try:
-        response = requests.get(endpoint, params=params)
-        response.raise_for_status()
-        return response.json()
-    except requests.RequestException as e:
-        print(f"Error fetching zip code data: {e}")
-        return None
+    return default_client().lookup_zip_codes(codes, country)
 
 def calculate_distance(from_zip, to_zip, country="US"):
     """
@@ -49,29 +286,7 @@ def calculate_distance(from_zip, to_zip, country="US"):
     Returns:
         dict: JSON response from the API.
     """
-    endpoint = BASE_URL + "distance"
-    
-    # If to_zip is a list, join it into a comma-separated string
-    if isinstance(to_zip, list):
-        compare_value = ",".join(to_zip)
-    else:
-        compare_value = to_zip
-    
-    params = {
-        "apikey": API_KEY,
-        "country": country,
-        "code": from_zip,
-        "compare": compare_value
-    }
-    
-    try:
-        response = requests.get(endpoint, params=params)
-        response.raise_for_status()
-        return response.json()
-    except requests.RequestException as e:
-        print(f"Error calculating distance: {e}")
-        return None
-
+    return default_client().calculate_distance(from_zip, to_zip, country)
 
 def get_postal_codes_within_radius(zip_code, radius, country="US"):
     """
@@ -82,20 +297,7 @@ def get_postal_codes_within_radius(zip_code, radius, country="US"):
         radius (int or float): The search radius (units as defined by the API, e.g. miles or km).
         country (str): Country code (default "US").
     """
-    endpoint = BASE_URL + "radius"
-    params = {
-        "apikey": API_KEY,
-        "country": country,
-        "code": zip_code,
-        "radius": radius
-    }
-    try:
-        response = requests.get(endpoint, params=params)
-        response.raise_for_status()
-        return response.json()
-    except requests.RequestException as e:
-        print(f"Error fetching postal codes within radius: {e}")
-        return None
+    return default_client().get_postal_codes_within_radius(zip_code, radius, country)
 
 def get_postal_codes_by_city(city, country="US", state_name=None, limit=None):
     """
@@ -115,25 +317,7 @@ def get_postal_codes_by_city(city, country="US", state_name=None, limit=None):
     Returns:
         dict: JSON response from the API, or None if an error occurs.
     """
-    endpoint = BASE_URL + "code/city"
-    params = {
-        "apikey": API_KEY,
-        "city": city,
-        "country": country
-    }
-    if state_name:
-        params["state_name"] = state_name
-    if limit:
-        params["limit"] = limit
-        
-    try:
-        response = requests.get(endpoint, params=params)
-        response.raise_for_status()
-        return response.json()
-    except requests.RequestException as e:
-        print(f"Error fetching postal codes by city: {e}")
-        return None
-
+    return default_client().get_postal_codes_by_city(city, country, state_name, limit)
 
 def get_postal_codes_by_state(state, country="US", limit=None):
     """
@@ -152,39 +336,13 @@ def get_postal_codes_by_state(state, country="US", limit=None):
     Returns:
         dict: JSON response from the API, or None if an error occurs.
     """
-    endpoint = BASE_URL + "code/state"
-    params = {
-        "apikey": API_KEY,
-        "state_name": state,
-        "country": country
-    }
-    if limit:
-        params["limit"] = limit
-    try:
-        response = requests.get(endpoint, params=params)
-        response.raise_for_status()
-        return response.json()
-    except requests.RequestException as e:
-        print(f"Error fetching postal codes by state: {e}")
-        return None
-
+    return default_client().get_postal_codes_by_state(state, country, limit)
 
 def get_states(country="US"):
     """
     Retrieve a list of provinces/states for a given country.
     """
-    endpoint = BASE_URL + "country/province"
-    params = {
-        "apikey": API_KEY,
-        "country": country
-    }
-    try:
-        response = requests.get(endpoint, params=params)
-        response.raise_for_status()
-        return response.json()
-    except requests.RequestException as e:
-        print(f"Error fetching states: {e}")
-        return None
+    return default_client().get_states(country)
 
 if __name__ == "__main__":
     # Example usage:
@@ -0,0 +1,37 @@
+"""Shared test setup: the repository root on sys.path, and a scratch Postgres schema for storage tests."""
+
+import os
+import sys
+import uuid
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+
+@pytest.fixture
+def pg_conn():
+    """
+    A connection to BENCH_DATABASE_URL (see benchmarks/bench_bulk_insert.py) with the tables created
+    in a scratch schema that is dropped afterwards. Skips the test when no server is reachable.
+    """
+    psycopg2 = pytest.importorskip("psycopg2")
+    from benchmarks.bench_bulk_insert import DEFAULT_DSN
+    from database_modules.database import create_table
+    try:
+        conn = psycopg2.connect(os.environ.get("BENCH_DATABASE_URL", DEFAULT_DSN), connect_timeout=2)
+    except psycopg2.OperationalError as e:
+        pytest.skip(f"no Postgres to test against: {str(e).strip()}")
+    schema = f"test_{uuid.uuid4().hex[:8]}"
+    cur = conn.cursor()
+    cur.execute(f"CREATE SCHEMA {schema}")
+    cur.execute(f"SET search_path TO {schema}")
+    conn.commit()
+    create_table(conn)
+    try:
+        yield conn
+    finally:
+        conn.rollback()
+        cur.execute(f"DROP SCHEMA {schema} CASCADE")
+        conn.commit()
+        conn.close()
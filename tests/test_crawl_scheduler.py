@@ -0,0 +1,32 @@
+"""ZIP expansion in crawl_scheduler against benchmarks/zipcodebase_stub.py."""
+
+import json
+
+import pytest
+
+pytest.importorskip("requests")
+pytest.importorskip("selenium")
+
+from benchmarks.zipcodebase_stub import start_zipcodebase_stub
+from scraper_modules.crawl_scheduler import expand_city_zipcodes
+from scraper_modules.zipcodebase_extended import ZipcodebaseClient
+
+
+def test_expansion_stays_in_the_citys_state(tmp_path):
+    city_file = tmp_path / "cities.json"
+    city_file.write_text(json.dumps({
+        "Portland, OR": ["97201", "97202", "97203"],
+        "Portland, ME": ["04101", "04102"],
+    }))
+    server, base_url = start_zipcodebase_stub(city_file=str(city_file))
+    try:
+        with ZipcodebaseClient(api_key="test", base_url=base_url, cache_path=None,
+                               requests_per_second=1e6) as client:
+            expanded = expand_city_zipcodes({"Portland, OR": ["97203"], "Portland, ME": []},
+                                            lookup=client.get_postal_codes_by_city)
+    finally:
+        server.shutdown()
+    assert expanded == {
+        "Portland, OR": ["97203", "97201", "97202"],
+        "Portland, ME": ["04101", "04102"],
+    }
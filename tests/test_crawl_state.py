@@ -0,0 +1,62 @@
+"""CrawlState checkpoints across a restart, and which listings the freshness TTL skips."""
+
+import time
+
+from scraper_modules.crawl_state import (
+    OUTCOME_FAILED,
+    OUTCOME_FROM_CARD,
+    OUTCOME_NO_PRICE,
+    OUTCOME_OK,
+    CrawlState,
+)
+
+
+def test_a_restarted_run_skips_only_the_zipcodes_that_finished(tmp_path):
+    path = str(tmp_path / "state.sqlite3")
+    state = CrawlState(path)
+    state.mark_zipcode_started("Test City", "10001")
+    state.mark_zipcode_done("Test City", "10001", 40)
+    # Killed while this one was in progress.
+    state.mark_zipcode_started("Test City", "10002")
+    state.record_page("Test City", "10002", 1, 18, 18)
+    state.close()
+
+    state = CrawlState(path)
+    assert state.is_zipcode_done("Test City", "10001")
+    assert not state.is_zipcode_done("Test City", "10002")
+    assert not state.is_zipcode_done("Test City", "10003")
+    assert list(state.zipcode_history()) == [("Test City", "10001")]
+    state.close()
+
+
+def test_restart_walks_every_zipcode_again_but_keeps_their_history(tmp_path):
+    state = CrawlState(str(tmp_path / "state.sqlite3"))
+    state.mark_zipcode_done("Test City", "10001", 40)
+    state.add_seen_ids([1, 2], "Test City", "10001")
+    state.reset_zipcodes()
+    assert not state.is_zipcode_done("Test City", "10001")
+    assert state.load_seen_ids() == set()
+    history = state.zipcode_history()[("Test City", "10001")]
+    assert history["listings_found"] == 40
+    assert history["claimed"] is None
+
+
+def test_only_listings_stored_within_the_ttl_are_fresh(tmp_path):
+    state = CrawlState(str(tmp_path / "state.sqlite3"), ttl_hours=72)
+    outcomes = {"1": OUTCOME_OK, "2": OUTCOME_FROM_CARD, "3": OUTCOME_NO_PRICE, "4": OUTCOME_FAILED, "5": OUTCOME_OK}
+    for listing_id, outcome in outcomes.items():
+        state.record_listing(listing_id, outcome, "Test City", "10001")
+    # Scraped four days ago, past the 72-hour TTL.
+    state.conn.execute("UPDATE listings SET last_scraped = ? WHERE listing_id = '5'", (time.time() - 96 * 3600,))
+    assert state.fresh_listing_ids(["1", "2", "3", "4", "5", "6"]) == {"1", "2"}
+    # A retry that now finds the price makes the listing fresh.
+    state.record_listing("3", OUTCOME_OK, "Test City", "10001")
+    assert state.fresh_listing_ids(["3"]) == {"3"}
+
+
+def test_fresh_listing_ids_looks_up_more_ids_than_one_statement_can_bind(tmp_path):
+    state = CrawlState(str(tmp_path / "state.sqlite3"))
+    for listing_id in range(0, 1200, 100):
+        state.record_listing(str(listing_id), OUTCOME_OK)
+    assert state.fresh_listing_ids(str(listing_id) for listing_id in range(1200)) == {
+        str(listing_id) for listing_id in range(0, 1200, 100)}
@@ -0,0 +1,63 @@
+"""What database.py writes for a listing record, from the scraper through the local outbox."""
+
+import json
+
+import pytest
+
+pytest.importorskip("psycopg2")
+pytest.importorskip("selenium")
+
+from database_modules.database import fetch_zipcode_stats, insert_listings_bulk, snapshot_row
+from database_modules.local_store import LocalListingStore
+from scraper_modules.listing_scraper import build_listing_record
+
+SAMPLES = [
+    {"check_in": "2026-11-02", "check_out": "2026-11-05", "price": 140.0},
+    {"check_in": "2026-12-07", "check_out": "2026-12-10", "price": None},
+]
+
+
+def listing_details(**overrides):
+    details = {"listing_id": "41870231", "room_type": None, "bedroom_count": 2,
+               "bathroom_count": 1.5, "price": 140.0, "price_samples": SAMPLES}
+    details.update(overrides)
+    return details
+
+
+def test_snapshot_row_keeps_price_samples_through_the_outbox(tmp_path):
+    record = build_listing_record(listing_details(), "Test City", "10001",
+                                  "https://www.airbnb.com/rooms/41870231")
+    with LocalListingStore(str(tmp_path / "store.sqlite3")) as store:
+        store.put(record)
+        store.flush()
+        (queued,) = store.conn.execute("SELECT record FROM outbox").fetchone()
+    row = snapshot_row(json.loads(queued))
+    assert row[:7] == ("41870231", "Test City", "10001", None, 2, 1.5, 140.0)
+    assert row[7].adapted == SAMPLES
+
+
+def test_snapshot_row_without_price_samples_is_null():
+    record = build_listing_record(listing_details(price_samples=None), "Test City", "10001",
+                                  "https://www.airbnb.com/rooms/41870231")
+    assert snapshot_row(record)[7] is None
+
+
+def test_zipcode_stats_count_studios_by_room_type(pg_conn):
+    rows = [
+        # A studio's bedroom_count comes from its bed count.
+        ("1", "Studio", 1, 100.0),
+        ("2", None, 1, 150.0),
+        ("3", None, 2, 200.0),
+        ("4", None, 5, 400.0),
+    ]
+    records = [build_listing_record(listing_details(listing_id=listing_id, room_type=room_type,
+                                                    bedroom_count=bedrooms, price=price),
+                                    "Test City", "10001", f"https://www.airbnb.com/rooms/{listing_id}")
+               for listing_id, room_type, bedrooms, price in rows]
+    assert insert_listings_bulk(pg_conn, records)["inserted"] == 4
+    stats = fetch_zipcode_stats(pg_conn, "Test City", "10001")[("Test City", "10001")]
+    assert {key: stats[key] for key in ("listings", "snapshots", "studios", "one_bedroom", "two_bedroom",
+                                         "three_bedroom", "four_plus_bedroom")} == {
+        "listings": 4, "snapshots": 4, "studios": 1, "one_bedroom": 1, "two_bedroom": 1,
+        "three_bedroom": 0, "four_plus_bedroom": 1}
+    assert stats["median_price"] == 175.0
@@ -0,0 +1,78 @@
+"""The Parquet feature cache in regression_model_modules/features.py."""
+
+import os
+from datetime import datetime, timedelta
+
+import pytest
+
+pytest.importorskip("pyarrow")
+pytest.importorskip("psycopg2")
+
+from regression_model_modules.features import load_features, load_model_features, read_watermark, refresh_feature_cache
+
+NOW = datetime(2026, 10, 16, 12, 0, 0)
+
+
+def insert_listing(conn, listing_id, written_at, price=100.0, timestamp=None):
+    """Writes a listings row as the upserts would, with written_at pinned for the test."""
+    cur = conn.cursor()
+    cur.execute("""
+        INSERT INTO listings (listing_id, city, zipcode, listing_url, bedroom_count, bathroom_count, price,
+                              timestamp, written_at)
+        VALUES (%s, 'Test City', '10001', %s, 1, 1, %s, %s, %s)
+        ON CONFLICT (listing_id) DO UPDATE
+        SET price = EXCLUDED.price, timestamp = EXCLUDED.timestamp, written_at = EXCLUDED.written_at;
+    """, (listing_id, f"https://www.airbnb.com/rooms/{listing_id}", price, timestamp or written_at, written_at))
+    conn.commit()
+    cur.close()
+
+
+def test_empty_cache_loads_as_an_empty_frame(tmp_path):
+    # refresh_feature_cache creates the directory even when no rows came back.
+    assert load_features(["city"], str(tmp_path)).columns.tolist() == ["city", "listing_id", "timestamp"]
+    scraped = load_model_features(["city"], str(tmp_path))
+    assert scraped.empty
+    assert scraped.columns.tolist() == ["city", "Nightly Price", "Bedrooms", "Bathrooms"]
+
+
+def test_missing_cache_loads_as_an_empty_frame(tmp_path):
+    assert load_model_features(["city"], str(tmp_path / "missing")).empty
+
+
+def test_refresh_reads_rows_only_once_and_resumes_from_the_watermark(pg_conn, tmp_path):
+    cache_dir = str(tmp_path / "cache")
+    for n in range(5):
+        insert_listing(pg_conn, str(n), NOW + timedelta(seconds=n))
+    assert refresh_feature_cache(pg_conn, cache_dir, chunk_rows=2) == 5
+    assert read_watermark(cache_dir) == ((NOW + timedelta(seconds=4)).isoformat(), "4")
+    assert refresh_feature_cache(pg_conn, cache_dir) == 0
+    # A re-scraped listing is read again and the loader keeps its newest row.
+    insert_listing(pg_conn, "2", NOW + timedelta(seconds=10), price=250.0)
+    assert refresh_feature_cache(pg_conn, cache_dir) == 1
+    features = load_features(["price"], cache_dir)
+    assert len(features) == 5
+    assert features.set_index("listing_id")["price"]["2"] == 250.0
+
+
+def test_refresh_picks_up_rows_that_commit_behind_the_watermark(pg_conn, tmp_path):
+    cache_dir = str(tmp_path / "cache")
+    insert_listing(pg_conn, "1", NOW)
+    assert refresh_feature_cache(pg_conn, cache_dir) == 1
+    # Stamped by NOW() when its transaction started, but committed after the refresh above.
+    insert_listing(pg_conn, "2", NOW - timedelta(seconds=30))
+    assert refresh_feature_cache(pg_conn, cache_dir) == 1
+    assert refresh_feature_cache(pg_conn, cache_dir) == 0
+    assert sorted(load_features(["price"], cache_dir)["listing_id"]) == ["1", "2"]
+    assert read_watermark(cache_dir) == (NOW.isoformat(), "1")
+
+
+def test_a_synced_row_is_cached_under_its_scrape_date(pg_conn, tmp_path):
+    cache_dir = str(tmp_path / "cache")
+    insert_listing(pg_conn, "1", NOW)
+    assert refresh_feature_cache(pg_conn, cache_dir) == 1
+    # Scraped two days ago into the local store, written to Postgres only now.
+    insert_listing(pg_conn, "2", NOW + timedelta(minutes=1), timestamp=NOW - timedelta(days=2))
+    assert refresh_feature_cache(pg_conn, cache_dir) == 1
+    assert sorted(os.listdir(cache_dir)) == ["_watermark.json", "date=2026-10-14", "date=2026-10-16"]
+    features = load_features(["price"], cache_dir).set_index("listing_id")
+    assert features["timestamp"]["2"] == NOW - timedelta(days=2)
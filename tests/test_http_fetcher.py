@@ -0,0 +1,172 @@
+"""The HTTP backend crawling benchmarks/standin_server.py into a local store."""
+
+import asyncio
+import os
+import shutil
+import sqlite3
+
+import pytest
+
+pytest.importorskip("aiohttp")
+pytest.importorskip("selenium")
+
+from benchmarks.standin_server import PAGES_DIR, start_standin_server
+from database_modules.local_store import LocalListingStore
+from scraper_modules import http_fetcher, listing_scraper
+from scraper_modules.crawl_state import CrawlState
+from scraper_modules.listing_dedup import SeenListingIndex
+from scraper_modules.rate_control import RateController
+
+CITY = "Test City"
+
+
+def serve(monkeypatch, pages_dir=PAGES_DIR):
+    server, base_url = start_standin_server(pages_dir=pages_dir)
+    monkeypatch.setattr(listing_scraper, "AIRBNB_BASE_URL", base_url)
+    monkeypatch.setattr(http_fetcher, "rate_controller",
+                        RateController(initial_rate=1e9, max_rate=1e9, burst=1e9, block_cooldown=0))
+    return server
+
+
+def crawl(tmp_path, city_data, run_fallback=False):
+    store = LocalListingStore(str(tmp_path / "store.sqlite3"))
+    crawl_state = CrawlState(str(tmp_path / "state.sqlite3"))
+    try:
+        seen_index = SeenListingIndex(crawl_state)
+        fallback = asyncio.run(http_fetcher.crawl(city_data, store, concurrency=4, crawl_state=crawl_state,
+                                                  seen_index=seen_index))
+        if run_fallback:
+            http_fetcher.run_selenium_fallback(*fallback, store, crawl_state=crawl_state, seen_index=seen_index)
+        store.close()
+        statuses = dict(crawl_state.conn.execute("SELECT zipcode, status FROM zipcodes").fetchall())
+        fresh = crawl_state.fresh_listing_ids(listing_scraper.listing_id_from_url(url)
+                                              for url in listing_urls(tmp_path))
+    finally:
+        crawl_state.close()
+    return fallback, statuses, fresh
+
+
+def search_pages(tmp_path):
+    with sqlite3.connect(str(tmp_path / "state.sqlite3")) as conn:
+        return conn.execute("SELECT zipcode, page, listings_found, new_listings FROM pages ORDER BY page").fetchall()
+
+
+def listing_urls(tmp_path):
+    with sqlite3.connect(str(tmp_path / "store.sqlite3")) as conn:
+        return [row[0] for row in conn.execute("SELECT listing_url FROM listings")]
+
+
+def stored_rows(tmp_path):
+    with sqlite3.connect(str(tmp_path / "store.sqlite3")) as conn:
+        conn.row_factory = sqlite3.Row
+        return [dict(row) for row in conn.execute(
+            "SELECT listing_id, zipcode, bedroom_count, bathroom_count, price FROM listings ORDER BY listing_id")]
+
+
+def test_crawl_writes_every_listing_and_checkpoints_the_zipcode(tmp_path, monkeypatch):
+    server = serve(monkeypatch)
+    try:
+        (fallback_zipcodes, fallback_listings), statuses, fresh = crawl(tmp_path, {CITY: ["10001"]})
+    finally:
+        server.shutdown()
+    rows = stored_rows(tmp_path)
+    # search/10001.html has 18 cards; every /rooms/<id> falls back to listings/default.html.
+    assert len(rows) == 18
+    assert rows[0] == {"listing_id": "51870231", "zipcode": "10001", "bedroom_count": 2,
+                       "bathroom_count": 1.5, "price": 1245.0}
+    assert {row["price"] for row in rows} == {1245.0}
+    assert (fallback_zipcodes, fallback_listings) == ([], [])
+    assert statuses == {"10001": "done"}
+    assert fresh == {row["listing_id"] for row in rows}
+    # One full page, then a page that adds nothing, logged for the scheduler and the market estimator.
+    assert search_pages(tmp_path) == [("10001", 1, 18, 18), ("10001", 2, 18, 0)]
+
+
+def test_zipcodes_share_listings_only_once(tmp_path, monkeypatch):
+    server = serve(monkeypatch)
+    try:
+        # Both ZIPs are served search/default.html, so the second finds only listings the first claimed.
+        _, statuses, _ = crawl(tmp_path, {CITY: ["20001", "20002"]})
+    finally:
+        server.shutdown()
+    rows = stored_rows(tmp_path)
+    assert len(rows) == 18
+    assert len({row["zipcode"] for row in rows}) == 1
+    assert statuses == {"20001": "done", "20002": "done"}
+
+
+def test_blocked_search_goes_to_the_fallback_unfinished(tmp_path, monkeypatch):
+    pages_dir = tmp_path / "pages"
+    shutil.copytree(PAGES_DIR, pages_dir)
+    shutil.copy(os.path.join(PAGES_DIR, "blocked", "captcha.html"), pages_dir / "search" / "30001.html")
+    server = serve(monkeypatch, str(pages_dir))
+    try:
+        (fallback_zipcodes, fallback_listings), statuses, _ = crawl(tmp_path, {CITY: ["30001", "10001"]})
+    finally:
+        server.shutdown()
+    assert fallback_zipcodes == [(CITY, "30001")]
+    assert fallback_listings == []
+    assert statuses == {"30001": "in_progress", "10001": "done"}
+    assert {row["zipcode"] for row in stored_rows(tmp_path)} == {"10001"}
+
+
+def test_a_page_the_extractor_raises_on_goes_to_the_fallback(tmp_path, monkeypatch):
+    server = serve(monkeypatch)
+    extract_listing_page = http_fetcher.extract_listing_page
+    extract_search_cards = http_fetcher.extract_search_cards
+
+    def broken_listing(page_html, url):
+        if url.endswith("/51870231"):
+            raise UnicodeDecodeError("utf-8", b"\xff", 0, 1, "invalid start byte")
+        return extract_listing_page(page_html, url)
+
+    def broken_search(page_html):
+        cards = extract_search_cards(page_html)
+        if "51870231" not in cards:
+            raise ValueError("unexpected search page layout")
+        return cards
+
+    monkeypatch.setattr(http_fetcher, "extract_listing_page", broken_listing)
+    monkeypatch.setattr(http_fetcher, "extract_search_cards", broken_search)
+    try:
+        # 10001 has its own search page; 20001 gets search/default.html, which the broken extractor rejects.
+        (fallback_zipcodes, fallback_listings), statuses, _ = crawl(tmp_path, {CITY: ["10001", "20001"]})
+    finally:
+        server.shutdown()
+    assert fallback_zipcodes == [(CITY, "20001")]
+    assert [listing_url.rsplit("/", 1)[1] for _, listing_url in fallback_listings] == ["51870231"]
+    assert len(stored_rows(tmp_path)) == 17
+    # 10001 is not checkpointed while one of its listings waits for the fallback.
+    assert statuses == {"10001": "in_progress", "20001": "in_progress"}
+
+
+class NoDriver:
+    def quit(self):
+        pass
+
+
+def test_a_zipcode_is_checkpointed_once_the_fallback_has_its_listings(tmp_path, monkeypatch):
+    server = serve(monkeypatch)
+    extract_listing_page = http_fetcher.extract_listing_page
+
+    def broken_listing(page_html, url):
+        if url.endswith("/51870231"):
+            raise ValueError("unexpected listing page layout")
+        return extract_listing_page(page_html, url)
+
+    def fallback_details(driver, listing_url, price_cache=None):
+        return {"listing_id": listing_url.rsplit("/", 1)[1], "room_type": None, "bedroom_count": 2,
+                "bathroom_count": 1.0, "price": 99.0}
+
+    monkeypatch.setattr(http_fetcher, "extract_listing_page", broken_listing)
+    monkeypatch.setattr(http_fetcher, "setup_driver", lambda headless=True, **settings: NoDriver())
+    monkeypatch.setattr(http_fetcher, "parse_listing_details", fallback_details)
+    try:
+        _, statuses, fresh = crawl(tmp_path, {CITY: ["10001"]}, run_fallback=True)
+    finally:
+        server.shutdown()
+    rows = stored_rows(tmp_path)
+    assert len(rows) == 18
+    assert [row["price"] for row in rows if row["listing_id"] == "51870231"] == [99.0]
+    assert statuses == {"10001": "done"}
+    assert "51870231" in fresh
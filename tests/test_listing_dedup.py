@@ -0,0 +1,44 @@
+"""SeenListingIndex: each listing is claimed by one ZIP per crawl, including across a resume."""
+
+from scraper_modules.crawl_state import CrawlState
+from scraper_modules.listing_dedup import SeenListingIndex
+
+
+def search_results(*listing_ids):
+    """{listing_url: card} as a search page yields it."""
+    return {f"https://www.airbnb.com/rooms/{listing_id}?check_in=2026-11-02": {"price": 100.0}
+            for listing_id in listing_ids}
+
+
+def claimed_ids(listings):
+    return sorted(url.split("/rooms/")[1].split("?")[0] for url in listings)
+
+
+def test_a_listing_is_claimed_by_the_first_zipcode_that_finds_it():
+    index = SeenListingIndex()
+    assert claimed_ids(index.claim(search_results(1, 2, 3), "Test City", "10001")) == ["1", "2", "3"]
+    assert claimed_ids(index.claim(search_results(2, 3, 4), "Test City", "10002")) == ["4"]
+    assert index.duplicate_rate("Test City") == 2 / 6
+    assert index.duplicate_rate("Other City") == 0.0
+
+
+def test_links_without_a_listing_id_are_not_claimed():
+    index = SeenListingIndex()
+    listings = {"https://www.airbnb.com/experiences/123": {}, **search_results(1)}
+    assert claimed_ids(index.claim(listings, "Test City", "10001")) == ["1"]
+    assert index.city_stats["Test City"] == (1, 0)
+
+
+def test_a_resumed_crawl_keeps_only_the_claims_of_finished_zipcodes(tmp_path):
+    path = str(tmp_path / "state.sqlite3")
+    state = CrawlState(path)
+    index = SeenListingIndex(state)
+    index.claim(search_results(1, 2), "Test City", "10001")
+    state.mark_zipcode_done("Test City", "10001", 2)
+    # Killed while 10002 was being scraped: it is searched again and must get its listings back.
+    index.claim(search_results(2, 3), "Test City", "10002")
+    state.close()
+
+    index = SeenListingIndex(CrawlState(path))
+    assert index.seen == {1, 2}
+    assert claimed_ids(index.claim(search_results(2, 3), "Test City", "10002")) == ["3"]
@@ -0,0 +1,129 @@
+"""Field-level checks of listing_extractor against the saved pages in benchmarks/fixtures/pages."""
+
+import os
+
+from scraper_modules.listing_extractor import (
+    extract_availability,
+    extract_listing_page,
+    extract_search_cards,
+    is_block_page,
+)
+
+PAGES_DIR = os.path.join(os.path.dirname(__file__), "..", "benchmarks", "fixtures", "pages")
+
+
+def read_page(kind, name):
+    with open(os.path.join(PAGES_DIR, kind, f"{name}.html"), encoding="utf-8") as f:
+        return f.read()
+
+
+def test_listing_page_from_rendered_summary():
+    listing_data, found_summary = extract_listing_page(read_page("listings", "default"),
+                                                       "https://www.airbnb.com/rooms/41870231?adults=2")
+    assert found_summary
+    assert listing_data == {
+        "listing_id": "41870231",
+        "title": "Sunny loft near the park",
+        "room_type": None,
+        "bedroom_count": 2,
+        "bathroom_count": 1.5,
+        "price": 1245.0,
+    }
+
+
+def test_listing_page_from_embedded_state():
+    listing_data, found_summary = extract_listing_page(read_page("listings", "50000001"),
+                                                       "https://www.airbnb.com/rooms/50000001")
+    assert found_summary
+    assert listing_data["listing_id"] == "50000001"
+    assert listing_data["title"] is None
+    assert listing_data["room_type"] == "Studio"
+    assert listing_data["bedroom_count"] is None
+    assert listing_data["bathroom_count"] == 1.0
+    assert listing_data["price"] == 189.0
+
+
+def test_listing_page_without_price():
+    listing_data, found_summary = extract_listing_page(read_page("listings", "50000002"),
+                                                       "https://www.airbnb.com/rooms/50000002")
+    assert found_summary
+    assert listing_data["title"] == "Garden duplex with parking"
+    assert listing_data["bedroom_count"] == 3
+    assert listing_data["bathroom_count"] == 2.5
+    assert listing_data["price"] is None
+
+
+def test_listing_page_accepts_bytes():
+    page = read_page("listings", "default")
+    assert extract_listing_page(page.encode("utf-8")) == extract_listing_page(page)
+
+
+def test_listing_page_without_summary():
+    listing_data, found_summary = extract_listing_page("<html><body><div id='root'></div></body></html>",
+                                                       "https://www.airbnb.com/rooms/1")
+    assert not found_summary
+    assert listing_data["listing_id"] == "1"
+    assert listing_data["price"] is None
+
+
+def test_search_cards():
+    cards = extract_search_cards(read_page("search", "10001"))
+    assert len(cards) == 18
+    assert list(cards)[:3] == ["51870231", "51871208", "51872185"]
+    assert cards["51870231"] == {
+        "listing_id": "51870231",
+        "title": "Sunny loft near the park",
+        "room_type": None,
+        "bedroom_count": 1,
+        "bathroom_count": None,
+        "price": 120.0,
+    }
+    assert cards["51886840"]["bedroom_count"] == 3
+    assert cards["51886840"]["price"] == 375.0
+    assert all(card["bathroom_count"] is None for card in cards.values())
+
+
+def test_search_cards_differ_by_zipcode():
+    assert set(extract_search_cards(read_page("search", "default"))).isdisjoint(
+        extract_search_cards(read_page("search", "10001")))
+
+
+def test_search_link_outside_a_card_keeps_only_its_id():
+    cards = extract_search_cards('<a href="/rooms/123?adults=1">Somewhere</a>')
+    assert cards == {"123": {"listing_id": "123", "title": None, "room_type": None,
+                             "bedroom_count": None, "bathroom_count": None, "price": None}}
+
+
+def test_availability_from_calendar_cells():
+    days = extract_availability(read_page("listings", "50000002"))
+    assert len(days) == 10
+    assert days["2030-01-08"] == {"available": True, "min_nights": None, "price": None}
+    assert not days["2030-01-13"]["available"]
+    assert not days["2030-01-14"]["available"]
+    assert days["2030-01-15"]["available"]
+
+
+def test_availability_from_embedded_state():
+    page = ('<script type="application/json">{"calendarMonths": [{"days": ['
+            '{"calendarDate": "2030-02-01", "available": true, "minNights": 2, "price": {"localPriceFormatted": "$1,010"}},'
+            '{"calendarDate": "2030-02-02", "bookable": false, "price": 95}]}]}</script>')
+    assert extract_availability(page) == {
+        "2030-02-01": {"available": True, "min_nights": 2, "price": 1010.0},
+        "2030-02-02": {"available": False, "min_nights": None, "price": 95.0},
+    }
+
+
+def test_availability_missing():
+    assert extract_availability(read_page("listings", "default")) == {}
+
+
+def test_block_page():
+    assert is_block_page(read_page("blocked", "captcha"))
+    assert is_block_page(read_page("blocked", "captcha").encode("utf-8"))
+    assert is_block_page("<html><head><title>Are you a human?</title></head></html>")
+
+
+def test_content_pages_are_not_block_pages():
+    for kind, name in [("search", "default"), ("search", "10001"), ("listings", "default"),
+                       ("listings", "50000001"), ("listings", "50000002")]:
+        assert not is_block_page(read_page(kind, name)), name
@@ -0,0 +1,89 @@
+"""LocalListingStore and its sync into Postgres (the sync tests need BENCH_DATABASE_URL, see conftest.py)."""
+
+import sqlite3
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+pytest.importorskip("psycopg2")
+
+from database_modules import local_store
+from database_modules.database import insert_listings_bulk
+from database_modules.local_store import LocalListingStore, sync_to_postgres
+
+
+def listing(listing_id, price=100.0, **fields):
+    record = {"listing_id": listing_id, "city": "Test City", "zipcode": "10001",
+              "listing_url": f"https://www.airbnb.com/rooms/{listing_id}", "room_type": None,
+              "bedroom_count": 1, "bathroom_count": 1.0, "price": price}
+    record.update(fields)
+    return record
+
+
+def stored(conn, query, *params):
+    cur = conn.cursor()
+    cur.execute(query, params)
+    rows = cur.fetchall()
+    cur.close()
+    return rows
+
+
+def test_a_buffered_record_is_committed_without_another_put(tmp_path):
+    path = str(tmp_path / "store.sqlite3")
+    written = []
+    with LocalListingStore(path, flush_interval=0.1) as store:
+        store.put(listing("1"), on_written=written.append)
+        deadline = time.monotonic() + 5
+        while not written and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert written == [True]
+        with sqlite3.connect(path) as local:
+            assert local.execute("SELECT listing_id FROM listings").fetchall() == [("1",)]
+
+
+def test_synced_rows_keep_the_time_they_were_stored_locally(pg_conn, tmp_path):
+    path = str(tmp_path / "store.sqlite3")
+    with LocalListingStore(path) as store:
+        store.put(listing("1"))
+    # As if the crawl ran offline two days before the sync.
+    with sqlite3.connect(path) as local:
+        local.execute("UPDATE outbox SET written_at = written_at - ?", (timedelta(days=2).total_seconds(),))
+    sync_to_postgres(path, conn=pg_conn)
+    ((scraped, written), ) = stored(pg_conn, "SELECT timestamp, written_at FROM listings")
+    ((snapshot, ), ) = stored(pg_conn, "SELECT timestamp FROM listing_snapshots")
+    assert written - scraped > timedelta(days=2) - timedelta(minutes=1)
+    assert snapshot == scraped
+
+
+def test_a_late_sync_does_not_overwrite_a_newer_row(pg_conn):
+    insert_listings_bulk(pg_conn, [listing("1", price=200.0)])
+    insert_listings_bulk(pg_conn, [listing("1", price=100.0, timestamp=datetime(2020, 1, 1))])
+    assert stored(pg_conn, "SELECT price FROM listings") == [(200,)]
+    # The older scrape is still kept in the history.
+    assert sorted(price for (price,) in stored(pg_conn, "SELECT price FROM listing_snapshots")) == [100, 200]
+
+
+def test_a_sync_killed_after_postgres_committed_does_not_write_the_batch_twice(pg_conn, tmp_path, monkeypatch):
+    path = str(tmp_path / "store.sqlite3")
+    with LocalListingStore(path) as store:
+        for listing_id in ("1", "2", "3"):
+            store.put(listing(listing_id))
+
+    def insert_then_die(conn, records, **kwargs):
+        insert_listings_bulk(conn, records, **kwargs)
+        raise KeyboardInterrupt
+
+    # Postgres has the first batch, but the local file never heard back.
+    monkeypatch.setattr(local_store, "insert_listings_bulk", insert_then_die)
+    with pytest.raises(KeyboardInterrupt):
+        sync_to_postgres(path, conn=pg_conn, batch_size=2)
+    monkeypatch.undo()
+
+    totals = sync_to_postgres(path, conn=pg_conn, batch_size=2)
+    assert (totals["batches"], totals["skipped"], totals["inserted"]) == (2, 1, 1)
+    assert stored(pg_conn, "SELECT COUNT(*) FROM listing_snapshots") == [(3,)]
+    assert stored(pg_conn, "SELECT COUNT(*) FROM sync_batches") == [(2,)]
+    assert sync_to_postgres(path, conn=pg_conn, batch_size=2)["batches"] == 0
+    with sqlite3.connect(path) as local:
+        assert local.execute("SELECT COUNT(*) FROM outbox").fetchone() == (0,)
@@ -0,0 +1,65 @@
+"""Chapman estimates from search-pass sightings and the bootstrap intervals in market_estimator."""
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from regression_model_modules.market_estimator import capture_counts, chapman, estimate_market
+
+# Newest pass first, as CrawlState.latest_search_passes returns them.
+PASSES = {
+    ("Test City", "10001"): [{1, 2, 3}, {2, 3, 4}],
+    ("Test City", "10002"): [{3, 5}, {5, 6}],
+    ("Test City", "10003"): [{7}],
+}
+
+
+def test_chapman():
+    assert chapman(50, 50, 25) == pytest.approx(51 * 51 / 26 - 1)
+    assert chapman(np.array([10, 20]), np.array([10, 20]), np.array([9, 19])).tolist() == pytest.approx(
+        [11 * 11 / 10 - 1, 21 * 21 / 20 - 1])
+
+
+def test_a_city_counts_listings_shared_by_its_zipcodes_once():
+    zipcodes, cities = capture_counts(PASSES)
+    assert zipcodes == {("Test City", "10001"): (3, 3, 2), ("Test City", "10002"): (2, 2, 1)}
+    # First occasion {2, 3, 4, 5, 6}, second {1, 2, 3, 5}; listing 3 is in both ZIPs.
+    assert cities == {"Test City": (5, 4, 3)}
+
+
+def passes_for(city, population, seen_by_both, only_first, only_second):
+    listings = list(range(population))
+    both = set(listings[:seen_by_both])
+    first = both | set(listings[seen_by_both:seen_by_both + only_first])
+    second = both | set(listings[seen_by_both + only_first:seen_by_both + only_first + only_second])
+    return {(city, "00000"): [second, first]}
+
+
+def test_intervals_bracket_the_estimates_and_repeat_with_the_same_seed():
+    passes = {**passes_for("A", 400, 60, 40, 50), **passes_for("B", 400, 30, 30, 20)}
+    values = {"A": np.linspace(100_000, 300_000, 50)}
+    result = estimate_market(passes, values, default_values=[150_000.0], resamples=400, workers=1, seed=7)
+    a = result["cities"]["A"]
+    assert a["estimated_listings"] == pytest.approx(chapman(100, 110, 60))
+    assert a["listings_ci"][0] < a["estimated_listings"] < a["listings_ci"][1]
+    assert a["value"] == pytest.approx(a["estimated_listings"] * 200_000)
+    assert a["value_ci"][0] < a["value"] < a["value_ci"][1]
+    assert result["cities"]["B"]["mean_value"] == 150_000.0
+    assert result["total_value"] == pytest.approx(a["value"] + result["cities"]["B"]["value"])
+    assert estimate_market(passes, values, default_values=[150_000.0], resamples=400, workers=1, seed=7) == result
+
+
+def test_parallel_blocks_give_the_same_estimates():
+    passes = passes_for("A", 400, 60, 40, 50)
+    serial = estimate_market(passes, {"A": [200_000.0]}, resamples=400, workers=1)
+    parallel = estimate_market(passes, {"A": [200_000.0]}, resamples=400, workers=2)
+    assert parallel["cities"]["A"]["estimated_listings"] == serial["cities"]["A"]["estimated_listings"]
+    low, high = parallel["total_listings_ci"]
+    assert low < parallel["total_listings"] < high
+
+
+def test_without_values_cities_get_listing_counts_only():
+    result = estimate_market(PASSES, {})
+    assert set(result["cities"]["Test City"]) == {"observed", "estimated_listings"}
+    assert result["cities"]["Test City"]["observed"] == 6
+    assert "total_value" not in result
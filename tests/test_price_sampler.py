@@ -0,0 +1,121 @@
+"""Date window selection and per-window pricing in price_sampler, and the page loads it costs."""
+
+from datetime import date, timedelta
+
+import pytest
+
+from scraper_modules.price_sampler import (
+    MemoryPriceCache,
+    choose_price_windows,
+    plan_listing_windows,
+    sample_listing_prices,
+    window_bookable,
+)
+
+TODAY = date(2026, 10, 16)
+
+
+def calendar(days, start=TODAY + timedelta(days=1), booked=(), min_nights=None, price=None):
+    """{"YYYY-MM-DD": {...}} like listing_extractor.extract_availability, `days` days from `start`."""
+    return {
+        (start + timedelta(days=i)).isoformat(): {
+            "available": i not in booked, "min_nights": min_nights, "price": price,
+        }
+        for i in range(days)
+    }
+
+
+def test_windows_are_spread_across_the_bookable_dates():
+    windows = choose_price_windows(calendar(30), count=3, nights=3, today=TODAY)
+    assert windows == [("2026-10-17", "2026-10-20"), ("2026-10-31", "2026-11-03"), ("2026-11-13", "2026-11-16")]
+
+
+def test_windows_respect_booked_nights_and_minimum_stays():
+    # Only the first 5 days are open, and every stay must be at least 4 nights.
+    windows = choose_price_windows(calendar(10, booked=range(5, 10), min_nights=4), nights=3, today=TODAY)
+    assert windows == [("2026-10-17", "2026-10-21"), ("2026-10-18", "2026-10-22")]
+    assert choose_price_windows(calendar(10, min_nights=30), today=TODAY) == []
+
+
+def test_window_bookable():
+    availability = calendar(10, booked=[4], min_nights=2)
+    assert window_bookable(availability, "2026-10-17", "2026-10-20")
+    assert not window_bookable(availability, "2026-10-19", "2026-10-22")  # 2026-10-21 is booked
+    assert not window_bookable(availability, "2026-10-17", "2026-10-18")  # shorter than the minimum stay
+    assert not window_bookable(availability, "2027-01-01", "2027-01-04")  # outside the calendar
+
+
+def test_the_page_window_price_is_one_of_the_samples():
+    # plan_listing_windows picks windows after the real today.
+    availability = calendar(30, start=date.today() + timedelta(days=1))
+    cache = MemoryPriceCache()
+    check_in = date.today() + timedelta(days=5)
+    page_window = (check_in.isoformat(), (check_in + timedelta(days=5)).isoformat())
+    windows = plan_listing_windows("1", page_window, 120.0, availability, cache)
+    assert windows[0] == page_window
+    assert len(windows) == 3
+    loaded = []
+
+    def load(check_in, check_out):
+        loaded.append((check_in, check_out))
+        return 150.0
+
+    details = sample_listing_prices({"listing_id": "1", "price": 120.0}, windows, availability, cache, load)
+    assert page_window not in loaded
+    assert len(loaded) == 2
+    assert details["price"] == 150.0
+    assert details["price_samples"][0] == {"check_in": page_window[0], "check_out": page_window[1], "price": 120.0}
+
+
+def test_without_a_calendar_the_page_price_is_the_only_sample():
+    cache = MemoryPriceCache()
+    page_window = ("2026-10-17", "2026-10-20")
+    assert plan_listing_windows("1", page_window, 120.0, {}, cache) == [page_window]
+    assert cache.get_price_sample("1", *page_window) == (True, 120.0)
+    # No calendar and no price on the page: nothing to sample, rather than loading the same window again.
+    assert plan_listing_windows("2", page_window, None, {}, cache) == []
+
+
+def test_cached_and_calendar_priced_windows_are_not_loaded():
+    cache = MemoryPriceCache()
+    cache.put_price_sample("1", "2026-10-17", "2026-10-20", 90.0)
+    windows = [("2026-10-17", "2026-10-20"), ("2026-10-20", "2026-10-23")]
+
+    def load(check_in, check_out):
+        raise AssertionError(f"loaded {check_in} - {check_out}")
+
+    details = sample_listing_prices({"listing_id": "1"}, windows, calendar(10, price=110.0), cache, load)
+    assert [sample["price"] for sample in details["price_samples"]] == [90.0, 110.0]
+    assert details["price"] == 100.0
+
+
+class PageDriver:
+    """Just enough of a WebDriver for parse_listing_details: serves one saved page for every URL."""
+
+    def __init__(self, page_source):
+        self.page_source = page_source
+        self.urls = []
+
+    def get(self, url):
+        self.urls.append(url)
+
+    def find_element(self, by, value):
+        return object()
+
+
+def test_a_listing_without_a_calendar_is_loaded_once(monkeypatch):
+    pytest.importorskip("selenium")
+    from benchmarks.standin_server import PAGES_DIR
+    from scraper_modules import listing_scraper
+    from scraper_modules.rate_control import RateController
+
+    monkeypatch.setattr(listing_scraper, "rate_controller",
+                        RateController(initial_rate=1e9, max_rate=1e9, burst=1e9, block_cooldown=0))
+    with open(f"{PAGES_DIR}/listings/default.html", encoding="utf-8") as f:
+        driver = PageDriver(f.read())
+    details = listing_scraper.parse_listing_details(driver, "https://www.airbnb.com/rooms/41870231",
+                                                    MemoryPriceCache())
+    assert len(driver.urls) == 1
+    assert "check_in=" in driver.urls[0]
+    assert details["price"] == 1245.0
+    assert len(details["price_samples"]) == 1
@@ -0,0 +1,56 @@
+"""HostPacer's AIMD rate changes and token-bucket waits, and RateController's per-host pacers."""
+
+import pytest
+
+from scraper_modules.rate_control import (
+    OUTCOME_BLOCKED,
+    OUTCOME_ERROR,
+    OUTCOME_OK,
+    HostPacer,
+    RateController,
+)
+
+
+def test_clean_responses_raise_the_rate_a_step_at_a_time_up_to_the_maximum():
+    pacer = HostPacer(initial_rate=1.0, max_rate=1.1, increase_step=0.05)
+    assert pacer.record(0.5, OUTCOME_OK) == pytest.approx(1.05)
+    assert pacer.record(0.5, OUTCOME_OK) == pytest.approx(1.1)
+    assert pacer.record(0.5, OUTCOME_OK) == pytest.approx(1.1)
+
+
+def test_slow_responses_and_errors_halve_the_rate_down_to_the_minimum():
+    pacer = HostPacer(initial_rate=1.0, min_rate=0.2, latency_target=5.0)
+    assert pacer.record(6.0, OUTCOME_OK) == pytest.approx(0.5)
+    assert pacer.record(0.5, OUTCOME_ERROR) == pytest.approx(0.25)
+    assert pacer.record(0.5, OUTCOME_ERROR) == pytest.approx(0.2)
+
+
+def test_a_block_page_quarters_the_rate_and_pauses_the_host():
+    pacer = HostPacer(initial_rate=2.0, block_cooldown=60.0, jitter=0)
+    assert pacer.record(0.5, OUTCOME_BLOCKED) == pytest.approx(0.5)
+    assert pacer.reserve() == pytest.approx(60.0, abs=0.1)
+
+
+def test_requests_are_spaced_by_the_rate_once_the_burst_is_spent():
+    pacer = HostPacer(initial_rate=2.0, burst=2.0, jitter=0)
+    assert pacer.reserve() == 0.0
+    assert pacer.reserve() == 0.0
+    assert pacer.reserve() == pytest.approx(0.5, abs=0.01)
+    assert pacer.reserve() == pytest.approx(1.0, abs=0.01)
+
+
+def test_scale_stretches_the_wait_without_changing_the_rate():
+    pacer = HostPacer(initial_rate=2.0, burst=1.0, jitter=0)
+    pacer.reserve()
+    assert pacer.reserve(scale=0.5) == pytest.approx(1.0, abs=0.01)
+    assert pacer.rate == 2.0
+
+
+def test_each_host_has_its_own_pacer():
+    controller = RateController(initial_rate=1.0, jitter=0, scale=lambda: 0.5)
+    controller.record("https://www.airbnb.com/s/homes", 0.5, OUTCOME_ERROR)
+    assert controller.pacer("https://www.airbnb.com/rooms/1").rate == pytest.approx(0.5)
+    assert controller.pacer("https://app.zipcodebase.com/api/v1/search").rate == 1.0
+    # A fresh pacer starts with a full burst; the next request waits 1 / (1.0 * 0.5) seconds.
+    assert controller.reserve("https://app.zipcodebase.com/api/v1/search") == 0.0
+    assert controller.reserve("https://app.zipcodebase.com/api/v1/search") == pytest.approx(2.0, abs=0.01)
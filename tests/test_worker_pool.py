@@ -0,0 +1,60 @@
+"""BrowserPool bookkeeping, with worker processes that run stand-in tasks instead of a browser."""
+
+import os
+
+import pytest
+
+pytest.importorskip("selenium")
+
+from scraper_modules import worker_pool
+from scraper_modules.control import CrawlControl
+
+
+class NoDriver:
+    def quit(self):
+        pass
+
+
+def echo_task(driver, value):
+    return value
+
+
+def crash_task(driver):
+    # Like the process being killed: no exception handling, nothing flushed.
+    os._exit(3)
+
+
+@pytest.fixture
+def pool_tasks(monkeypatch):
+    # Workers are forked, so they inherit these patches.
+    monkeypatch.setattr(worker_pool, "setup_driver", lambda headless=True, **settings: NoDriver())
+    monkeypatch.setattr(worker_pool, "WORKER_POLL_SECONDS", 0.1)
+    monkeypatch.setitem(worker_pool.TASK_HANDLERS, "echo", echo_task)
+    monkeypatch.setitem(worker_pool.TASK_HANDLERS, "crash", crash_task)
+
+
+def drain(pool):
+    results = {}
+    while pool.pending:
+        task_id, kind, args, result, error = pool.next_result()
+        results[task_id] = (kind, result, error)
+    return results
+
+
+def test_results_come_back_for_every_task(pool_tasks):
+    with worker_pool.BrowserPool(2, control=CrawlControl(workers=2, resizable=True)) as pool:
+        task_ids = [pool.submit("echo", n) for n in range(5)]
+        results = drain(pool)
+    assert {task_id: results[task_id][1] for task_id in task_ids} == dict(zip(task_ids, range(5)))
+    assert not pool.tasks
+
+
+def test_a_task_whose_worker_dies_comes_back_as_an_error(pool_tasks):
+    with worker_pool.BrowserPool(2, control=CrawlControl(workers=2, resizable=True)) as pool:
+        crashed = pool.submit("crash")
+        echoed = [pool.submit("echo", n) for n in range(3)]
+        results = drain(pool)
+    kind, result, error = results[crashed]
+    assert (kind, result) == ("crash", None)
+    assert "exited with code 3" in error
+    assert [results[task_id][1] for task_id in echoed] == [0, 1, 2]
@@ -0,0 +1,118 @@
+"""WriteBehindWriter retries and spills, with insert_listings_bulk and the connection pool stood in."""
+
+import sqlite3
+
+import pytest
+
+psycopg2 = pytest.importorskip("psycopg2")
+
+from database_modules import write_behind
+from database_modules.write_behind import WriteBehindWriter
+
+
+def listing(listing_id):
+    return {"listing_id": listing_id, "city": "Test City", "zipcode": "10001",
+            "listing_url": f"https://www.airbnb.com/rooms/{listing_id}", "room_type": None,
+            "bedroom_count": 1, "bathroom_count": 1.0, "price": 100.0}
+
+
+class StubConnection:
+    closed = 0
+
+    def rollback(self):
+        pass
+
+
+class StubPool:
+    """Hands out stub connections and records the ones dropped with close=True."""
+
+    def __init__(self):
+        self.dropped = 0
+
+    def getconn(self):
+        return StubConnection()
+
+    def putconn(self, conn, close=False):
+        self.dropped += close
+
+    def closeall(self):
+        pass
+
+
+@pytest.fixture
+def bulk_insert(monkeypatch):
+    """Replaces insert_listings_bulk with one that raises the queued errors first, then succeeds."""
+    errors = []
+    calls = []
+
+    def insert(conn, records):
+        calls.append([record["listing_id"] for record in records])
+        if errors:
+            raise errors.pop(0)
+        return {"inserted": len(records), "rejected": []}
+
+    monkeypatch.setattr(write_behind, "create_table", lambda conn: None)
+    monkeypatch.setattr(write_behind, "insert_listings_bulk", insert)
+    return errors, calls
+
+
+def write(writer, listing_ids):
+    written = []
+    with writer:
+        for listing_id in listing_ids:
+            writer.put(listing(listing_id), on_written=written.append)
+    return written
+
+
+def spilled_ids(path):
+    with sqlite3.connect(path) as local:
+        return sorted(listing_id for (listing_id,) in local.execute("SELECT listing_id FROM listings"))
+
+
+def test_a_dropped_connection_is_replaced_and_the_batch_retried(bulk_insert, tmp_path):
+    errors, calls = bulk_insert
+    errors.append(psycopg2.OperationalError("server closed the connection unexpectedly"))
+    pool = StubPool()
+    writer = WriteBehindWriter(pool=pool, batch_size=2, retry_backoff=0, spill_path=str(tmp_path / "spill.sqlite3"))
+    assert write(writer, ["1", "2"]) == [True, True]
+    assert calls == [["1", "2"], ["1", "2"]]
+    assert pool.dropped == 1
+    assert (writer.stats["written"], writer.stats["reconnects"], writer.stats["spilled"]) == (2, 1, 0)
+    assert not (tmp_path / "spill.sqlite3").exists()
+
+
+def test_a_batch_that_keeps_failing_is_spilled(bulk_insert, tmp_path):
+    errors, calls = bulk_insert
+    errors.extend(psycopg2.OperationalError("could not connect") for _ in range(3))
+    spill_path = str(tmp_path / "spill.sqlite3")
+    writer = WriteBehindWriter(pool=StubPool(), batch_size=2, max_retries=3, retry_backoff=0, spill_path=spill_path)
+    # Spilled records count as written: they reach Postgres on the next sync.
+    assert write(writer, ["1", "2"]) == [True, True]
+    assert len(calls) == 3
+    assert (writer.stats["written"], writer.stats["spilled"]) == (0, 2)
+    assert spilled_ids(spill_path) == ["1", "2"]
+
+
+def test_an_error_that_is_not_the_connection_is_spilled_without_retrying(bulk_insert, tmp_path):
+    errors, calls = bulk_insert
+    errors.append(psycopg2.DataError("numeric field overflow"))
+    spill_path = str(tmp_path / "spill.sqlite3")
+    writer = WriteBehindWriter(pool=StubPool(), batch_size=2, retry_backoff=0, spill_path=spill_path)
+    assert write(writer, ["1", "2"]) == [True, True]
+    assert len(calls) == 1
+    assert (writer.stats["reconnects"], writer.stats["spilled"]) == (0, 2)
+    assert spilled_ids(spill_path) == ["1", "2"]
+
+
+def test_close_raises_when_a_batch_can_be_neither_written_nor_spilled(bulk_insert, tmp_path):
+    errors, _ = bulk_insert
+    errors.append(psycopg2.DataError("numeric field overflow"))
+    writer = WriteBehindWriter(pool=StubPool(), batch_size=2, retry_backoff=0,
+                               spill_path=str(tmp_path / "missing" / "spill.sqlite3"))
+    written = []
+    with pytest.raises(RuntimeError, match="2 listings could not be written"):
+        with writer:
+            writer.put(listing("1"), on_written=written.append)
+            writer.put(listing("2"), on_written=written.append)
+    assert written == [False, False]
+    assert writer.stats["failed"] == 2
@@ -0,0 +1,80 @@
+"""ZipcodebaseClient against benchmarks/zipcodebase_stub.py."""
+
+import pytest
+
+pytest.importorskip("requests")
+
+from benchmarks.zipcodebase_stub import build_centroids, haversine_km, load_city_zipcodes, start_zipcodebase_stub
+from scraper_modules.zipcodebase_extended import ZipcodebaseClient
+
+
+@pytest.fixture
+def stub():
+    server, base_url = start_zipcodebase_stub()
+    yield server.RequestHandlerClass.stats, base_url
+    server.shutdown()
+
+
+def make_client(base_url, tmp_path, **settings):
+    return ZipcodebaseClient(api_key="test", base_url=base_url, cache_path=str(tmp_path / "cache.sqlite3"),
+                             requests_per_second=1e6, **settings)
+
+
+def test_lookup_is_chunked_and_cached_per_code(stub, tmp_path):
+    stats, base_url = stub
+    codes = [f"{90000 + i}" for i in range(250)]
+    with make_client(base_url, tmp_path, chunk_size=100) as client:
+        first = client.lookup_zip_codes(codes)
+        assert stats["search"] == 3
+        assert first["query"] == {"codes": codes, "country": "US"}
+        assert set(first["results"]) == set(codes)
+        assert first["results"]["90000"][0]["postal_code"] == "90000"
+
+        # A repeat, plus one new code, costs a single request for the new code.
+        second = client.lookup_zip_codes(codes[:10] + ["99999"])
+        assert stats["search"] == 4
+        assert client.stats == {"requests": 4, "cache_hits": 10}
+        assert second["results"]["90003"] == first["results"]["90003"]
+
+
+def test_lookup_places_match_the_city_file(stub, tmp_path):
+    _, base_url = stub
+    centroids = build_centroids(load_city_zipcodes())
+    with make_client(base_url, tmp_path) as client:
+        place = client.lookup_zip_codes(["11201"])["results"]["11201"][0]
+    lat, lon, city, state_code = centroids["11201"]
+    assert (place["city"], place["state_code"]) == (city, state_code) == ("New York City", "NY")
+    assert float(place["latitude"]) == pytest.approx(lat)
+    assert float(place["longitude"]) == pytest.approx(lon)
+
+
+def test_distances(stub, tmp_path):
+    stats, base_url = stub
+    centroids = build_centroids(load_city_zipcodes())
+    with make_client(base_url, tmp_path) as client:
+        single = client.calculate_distance("11201", "11203")
+        many = client.calculate_distance("11201", ["11203", "11204"])
+    assert single["results"]["11203"] == pytest.approx(haversine_km(centroids["11201"], centroids["11203"]), abs=1e-3)
+    assert many["query"]["compare"] == ["11203", "11204"]
+    assert many["results"]["11204"] == pytest.approx(haversine_km(centroids["11201"], centroids["11204"]), abs=1e-3)
+    # 11203 came from the cache on the second call; only 11204 went out.
+    assert stats["distance"] == 2
+
+
+def test_city_lookup_is_cached_across_clients(stub, tmp_path):
+    stats, base_url = stub
+    with make_client(base_url, tmp_path) as client:
+        codes = client.get_postal_codes_by_city("New York City")["results"]
+    assert "11201" in codes
+    with make_client(base_url, tmp_path) as client:
+        assert client.get_postal_codes_by_city("New York City")["results"] == codes
+        assert client.stats["cache_hits"] == 1
+    assert stats["code/city"] == 1
+
+
+def test_no_cache(stub, tmp_path):
+    stats, base_url = stub
+    with ZipcodebaseClient(api_key="test", base_url=base_url, cache_path=None, requests_per_second=1e6) as client:
+        client.get_states()
+        assert client.get_states()["results"]
+    assert stats["country/province"] == 2